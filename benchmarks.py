@@ -0,0 +1,330 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from dfa import DFA
+from generate_nfa_files import generate_improved_nfa
+from max_theoretical_generator import generate_automaton
+from nfa import NFA
+from nfa_parser import parse_nfa_file
+from nth_from_last_generator import generate_nfa_text
+
+BENCHMARK_FORMAT_VERSION = 1
+ENGINES = ("tuple", "bitset", "compact", "brzozowski")
+CORPORA = ("generated_nfas", "improved_nfas", "max_nfa_output", "nfa_nth_from_last")
+
+
+def measure(function, *args):
+    '''
+    Runs a function once while tracking wall-clock time and peak Python memory
+    :param function: function to run
+    :param args: arguments for the function
+    :return: (result of the function, elapsed seconds, peak traced bytes)
+    '''
+    tracemalloc.start()
+    try:
+        start_time = time.perf_counter()
+        result = function(*args)
+        elapsed_time = time.perf_counter() - start_time
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed_time, peak_bytes
+
+
+def load_nfa(file_path):
+    '''
+    :param file_path: path of an NFA text file
+    :return: NFA read from the file
+    '''
+    nfa_tuple = parse_nfa_file(file_path)
+    return NFA(nfa_tuple[0], nfa_tuple[2], nfa_tuple[3], nfa_tuple[4], nfa_tuple[1])
+
+
+def subset_then_hopcroft(nfa):
+    '''
+    :param nfa: NFA to determinize
+    :return: minimal DFA built by bitset subset construction followed by Hopcroft
+    '''
+    return DFA(nfa, engine="bitset").minimize()
+
+
+def brzozowski(nfa):
+    '''
+    :param nfa: NFA to determinize
+    :return: minimal DFA built by Brzozowski's algorithm
+    '''
+    return DFA(nfa, engine="brzozowski")
+
+
+def compare_minimal_construction(file_path):
+    '''
+    Builds the minimal DFA of one NFA file twice: subset construction followed by Hopcroft, and Brzozowski.
+    Each run gets a freshly parsed NFA so neither profits from the other's closure index.
+    :param file_path: path of an NFA text file
+    :return: dict with the minimal DFA size and the time and peak memory of both methods
+    '''
+    result = {"filename": os.path.basename(file_path)}
+    for name, construction in (("hopcroft", subset_then_hopcroft), ("brzozowski", brzozowski)):
+        nfa = load_nfa(file_path)
+        dfa, elapsed_time, peak_bytes = measure(construction, nfa)
+        result[name + "_time_sec"] = elapsed_time
+        result[name + "_peak_bytes"] = peak_bytes
+        result["minimal_dfa_states"] = dfa.table_source.state_count()
+    return result
+
+
+def compare_minimal_construction_on_folder(nfa_folder_path, limit=None):
+    '''
+    Runs compare_minimal_construction on every NFA file of a folder, in file name order
+    :param nfa_folder_path: folder holding NFA text files
+    :param limit: only compare the first limit files
+    :return: list of result dicts
+    '''
+    filenames = sorted(f for f in os.listdir(nfa_folder_path) if f.endswith(".txt"))
+    if limit is not None:
+        filenames = filenames[:limit]
+    return [compare_minimal_construction(os.path.join(nfa_folder_path, f)) for f in filenames]
+
+
+def compare_trimming(file_path, engine="bitset"):
+    '''
+    Builds the DFA of one NFA file with and without trim=True. How many subsets trimming saves can only be
+    counted against the untrimmed construction, which DFA(nfa, trim=True) does not run, so this is where
+    the saving is measured.
+    :param file_path: path of an NFA text file
+    :param engine: DFA engine
+    :return: dict with the DFA size and time of both constructions, the subsets saved and the trim_statistics
+    '''
+    result = {"filename": os.path.basename(file_path)}
+    for name, trim in (("untrimmed", False), ("trimmed", True)):
+        nfa = load_nfa(file_path)
+        start_time = time.perf_counter()
+        dfa = DFA(nfa, engine=engine, trim=trim)
+        result[name + "_time_sec"] = time.perf_counter() - start_time
+        result[name + "_dfa_states"] = dfa.get_transition_table().state_count()
+    result["subsets_saved"] = result["untrimmed_dfa_states"] - result["trimmed_dfa_states"]
+    result.update(dfa.trim_statistics or {})
+    return result
+
+
+def compare_trimming_on_folder(nfa_folder_path, engine="bitset", limit=None):
+    '''
+    Runs compare_trimming on every NFA file of a folder, in file name order
+    :param nfa_folder_path: folder holding NFA text files
+    :param engine: DFA engine
+    :param limit: only compare the first limit files
+    :return: list of result dicts
+    '''
+    filenames = sorted(f for f in os.listdir(nfa_folder_path) if f.endswith(".txt"))
+    if limit is not None:
+        filenames = filenames[:limit]
+    return [compare_trimming(os.path.join(nfa_folder_path, f), engine) for f in filenames]
+
+
+def generate_family_files(directory, quick=False):
+    '''
+    Writes the NFAs of the generator families to a directory. Sizes and seeds are fixed, so every run
+    benchmarks the same automata.
+    :param directory: where to write the files
+    :param quick: only write the small sizes
+    :return: list of (family, file path) pairs
+    '''
+    max_sizes = range(2, 9) if quick else range(2, 13)
+    nth_sizes = range(2, 8) if quick else range(2, 13)
+    improved_sizes = [5, 10, 15] if quick else [5, 10, 15, 20, 25, 30]
+    files = []
+    # the generators print every file they write
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in max_sizes:
+            generate_automaton(n, directory)
+            files.append(("max_theoretical", os.path.join(directory, f"automaton_n{n}.txt")))
+        for n in nth_sizes:
+            generate_nfa_text(n, directory)
+            files.append(("nth_from_last", os.path.join(directory, f"nfa_nth_from_last_n{n}.txt")))
+    for n in improved_sizes:
+        rng = random.Random(n)
+        text = generate_improved_nfa(n, epsilon_density=rng.uniform(0.3, 0.5), rng=rng)
+        file_path = os.path.join(directory, f"improved_seed{n}_n{n}.txt")
+        with open(file_path, "w") as file:
+            file.write(text)
+        files.append(("improved", file_path))
+    return files
+
+
+def get_corpus_files(per_corpus):
+    '''
+    :param per_corpus: number of files to take from each checked-in corpus, the first ones in name order
+    :return: list of (corpus name, file path) pairs
+    '''
+    files = []
+    for corpus in CORPORA:
+        if os.path.isdir(corpus):
+            filenames = sorted(f for f in os.listdir(corpus) if f.endswith(".txt"))[:per_corpus]
+            files.extend((corpus, os.path.join(corpus, f)) for f in filenames)
+    return files
+
+
+def time_construction(file_path, engine, warmups, repeats):
+    '''
+    Times the DFA construction of one NFA file. Every run gets a freshly parsed NFA so no run reuses the
+    epsilon closures of another, and parsing is not timed. Warmup runs are discarded. Peak memory is taken
+    from one extra run under tracemalloc, which would slow down the timed runs.
+    :param file_path: NFA text file
+    :param engine: DFA engine
+    :param warmups: untimed runs before the timed ones
+    :param repeats: timed runs
+    :return: dict with the DFA size, every timed run and summary statistics
+    '''
+    times = []
+    dfa = None
+    for run in range(warmups + repeats):
+        nfa = load_nfa(file_path)
+        start_time = time.perf_counter()
+        dfa = DFA(nfa, engine=engine)
+        elapsed_time = time.perf_counter() - start_time
+        if run >= warmups:
+            times.append(elapsed_time)
+    _, _, peak_bytes = measure(DFA, load_nfa(file_path), engine)
+    table = dfa.get_transition_table()
+    return {
+        "dfa_states": table.state_count(),
+        "times_sec": times,
+        "min_sec": min(times),
+        "median_sec": statistics.median(times),
+        "mean_sec": statistics.fmean(times),
+        "stdev_sec": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "peak_bytes": peak_bytes,
+    }
+
+
+def get_metadata(warmups, repeats):
+    '''
+    :return: dict describing the machine, the interpreter and the commit the benchmark ran on
+    '''
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "warmups": warmups,
+        "repeats": repeats,
+    }
+
+
+def run_benchmarks(engines=ENGINES, warmups=1, repeats=5, per_corpus=5, quick=False):
+    '''
+    Benchmarks every engine on the generator families and on the first files of each corpus
+    :param engines: DFA engines to compare
+    :param warmups: untimed runs per case
+    :param repeats: timed runs per case
+    :param per_corpus: number of files taken from each corpus
+    :param quick: only use the small generator sizes
+    :return: dict with "metadata" and "results", one result per (file, engine) in a fixed order
+    '''
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        cases = generate_family_files(directory, quick) + get_corpus_files(per_corpus)
+        for family, file_path in cases:
+            nfa_states = len(load_nfa(file_path).states)
+            for engine in engines:
+                result = {"family": family, "name": os.path.basename(file_path), "engine": engine, "nfa_states": nfa_states}
+                result.update(time_construction(file_path, engine, warmups, repeats))
+                results.append(result)
+    return {"metadata": get_metadata(warmups, repeats), "results": results}
+
+
+def write_benchmarks(benchmarks, output_path):
+    '''
+    :param benchmarks: output of run_benchmarks
+    :param output_path: JSON file to write
+    :return: Void
+    '''
+    with open(output_path, "w") as file:
+        json.dump(benchmarks, file, indent=1)
+
+
+def compare_benchmarks(baseline_path, current_path, tolerance=1.25, min_seconds=0.001):
+    '''
+    Finds the cases that got slower, or changed DFA size, between two benchmark files
+    :param baseline_path: JSON file of an earlier run
+    :param current_path: JSON file of a later run
+    :param tolerance: ratio of median times above which a case counts as a regression
+    :param min_seconds: cases faster than this in both runs are too noisy to compare times
+    :return: list of dicts, one per regression
+    '''
+    with open(baseline_path) as file:
+        baseline = {(r["family"], r["name"], r["engine"]): r for r in json.load(file)["results"]}
+    with open(current_path) as file:
+        current = json.load(file)["results"]
+
+    regressions = []
+    for result in current:
+        before = baseline.get((result["family"], result["name"], result["engine"]))
+        if before is None:
+            continue
+        ratio = result["median_sec"] / before["median_sec"] if before["median_sec"] > 0 else float("inf")
+        slower = ratio > tolerance and max(result["median_sec"], before["median_sec"]) >= min_seconds
+        if slower or result["dfa_states"] != before["dfa_states"]:
+            regressions.append({
+                "family": result["family"], "name": result["name"], "engine": result["engine"],
+                "baseline_median_sec": before["median_sec"], "median_sec": result["median_sec"], "ratio": ratio,
+                "baseline_dfa_states": before["dfa_states"], "dfa_states": result["dfa_states"],
+            })
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark subset construction engines")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated engines")
+    parser.add_argument("--warmups", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--per-corpus", type=int, default=5, help="files taken from each corpus")
+    parser.add_argument("--quick", action="store_true", help="only the small generator sizes")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier JSON file to check for regressions")
+    parser.add_argument("--minimal", action="store_true", help="compare Hopcroft and Brzozowski on generated_nfas instead")
+    parser.add_argument("--trimming", action="store_true", help="compare DFAs of trimmed and untrimmed NFAs on improved_nfas instead")
+    arguments = parser.parse_args()
+
+    if arguments.minimal:
+        for result in compare_minimal_construction_on_folder("generated_nfas", limit=50):
+            print(f"{result['filename']} → Minimal DFA States: {result['minimal_dfa_states']}, "
+                  f"Hopcroft: {result['hopcroft_time_sec']:.6f}s {result['hopcroft_peak_bytes']} B, "
+                  f"Brzozowski: {result['brzozowski_time_sec']:.6f}s {result['brzozowski_peak_bytes']} B")
+    elif arguments.trimming:
+        results = compare_trimming_on_folder("improved_nfas")
+        for result in results:
+            print(f"{result['filename']} → DFA States: {result['untrimmed_dfa_states']} → {result['trimmed_dfa_states']}, "
+                  f"NFA states dropped: {result['unreachable_states']} unreachable, {result['dead_states']} dead, "
+                  f"Time: {result['untrimmed_time_sec']:.6f}s → {result['trimmed_time_sec']:.6f}s")
+        print(f"Subsets saved: {sum(result['subsets_saved'] for result in results)}")
+    else:
+        benchmarks = run_benchmarks(arguments.engines.split(","), arguments.warmups, arguments.repeats,
+                                    arguments.per_corpus, arguments.quick)
+        write_benchmarks(benchmarks, arguments.output)
+        for result in benchmarks["results"]:
+            print(f"{result['family']:>18} {result['name']:<32} {result['engine']:<10} DFA States: {result['dfa_states']:>6}, "
+                  f"Median: {result['median_sec']:.6f}s, Peak: {result['peak_bytes']} B")
+        print(f"Results written to {arguments.output}")
+        if arguments.compare:
+            for regression in compare_benchmarks(arguments.compare, arguments.output):
+                print(f"Regression: {regression['family']} {regression['name']} {regression['engine']} "
+                      f"{regression['baseline_median_sec']:.6f}s → {regression['median_sec']:.6f}s, "
+                      f"DFA States {regression['baseline_dfa_states']} → {regression['dfa_states']}")
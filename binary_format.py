@@ -0,0 +1,263 @@
+'''
+Binary files for NFAs and DFAs. A file is a fixed header, a directory of named arrays, and the arrays
+themselves, each starting on an 8 byte boundary:
+
+    magic "SUBSETBN", format version, kind (1 for an NFA, 2 for a DFA)
+    state count, symbol count, initial state id (-1 for none), number of arrays
+    per array: name, NumPy dtype string, byte offset, element count
+    array data
+
+Everything is little-endian. Loading maps the file with numpy.memmap and hands out views into the
+mapping, so nothing is copied, opening is instant, and processes that load the same file share its pages.
+'''
+
+import struct
+
+import numpy as np
+
+from compact_nfa import CompactNFA
+from compiled_dfa import CompiledDFA
+from nfa import NFA
+from transition_table import NULL_STATE
+
+MAGIC = b"SUBSETBN"
+VERSION = 1
+NFA_KIND = 1
+DFA_KIND = 2
+
+HEADER = struct.Struct("<8sII")
+META = struct.Struct("<qqqq")
+DIRECTORY_ENTRY = struct.Struct("<16s8sqq")
+ALIGNMENT = 8
+
+# "epsilon" in the symbol table of an NFA file
+EPSILON_SYMBOL = np.iinfo(np.int64).min
+
+# kinds of DFA state labels: a tuple of NFA states, a single int, or the "Null set" sink
+TUPLE_LABEL = 0
+INT_LABEL = 1
+NULL_LABEL = 2
+
+
+class BinaryFormatError(ValueError):
+    '''
+    Raised when a file is not in the binary format, has an unknown version or holds the wrong kind of automaton
+    '''
+    pass
+
+
+def save_nfa(nfa, file_path):
+    '''
+    Writes an NFA in the binary format. Transitions are stored CSR style as in CompactNFA: the offsets of
+    all symbols back to back, then the targets of all symbols back to back.
+    :param nfa: CompactNFA, or NFA with int states and letters
+    :param file_path: where to write
+    '''
+    if isinstance(nfa, NFA):
+        nfa = CompactNFA.from_nfa(nfa)
+    target_starts = np.zeros(len(nfa.symbols) + 1, dtype=np.int64)
+    np.cumsum([len(symbol_targets) for symbol_targets in nfa.targets], out=target_starts[1:])
+    empty_offsets = np.zeros(0, dtype=np.int64)
+    empty_targets = np.zeros(0, dtype=np.int32)
+    arrays = [
+        ("states", np.asarray(nfa.states, dtype="<i8")),
+        ("symbols", encode_symbols(nfa.symbols, True)),
+        ("accepting", np.asarray(nfa.accepting, dtype="<i4")),
+        ("offsets", np.concatenate([empty_offsets] + list(nfa.offsets)).astype("<i8")),
+        ("target_starts", target_starts.astype("<i8")),
+        ("targets", np.concatenate([empty_targets] + list(nfa.targets)).astype("<i4")),
+    ]
+    write_file(file_path, NFA_KIND, (nfa.state_count(), len(nfa.symbols), nfa.initial), arrays)
+
+
+def load_nfa(file_path):
+    '''
+    :param file_path: file written by save_nfa
+    :return: CompactNFA whose arrays are read-only views of the mapped file
+    '''
+    (state_count, symbol_count, initial), arrays = read_file(file_path, NFA_KIND)
+    offsets = arrays["offsets"]
+    target_starts = arrays["target_starts"].tolist()
+    row = state_count + 1
+    return CompactNFA(
+        arrays["states"],
+        decode_symbols(arrays["symbols"]),
+        [offsets[j * row:(j + 1) * row] for j in range(symbol_count)],
+        [arrays["targets"][target_starts[j]:target_starts[j + 1]] for j in range(symbol_count)],
+        initial,
+        arrays["accepting"],
+    )
+
+
+def save_dfa(dfa, file_path):
+    '''
+    Writes a complete DFA in the binary format. State names are stored too when they are tuples of int
+    NFA states, ints or "Null set", as subset construction and minimization make them; other names are
+    dropped and a loaded DFA names those states by id.
+    :param dfa: CompiledDFA, or DFA which is compiled first. Symbol classes are expanded to one column per letter.
+    :param file_path: where to write
+    '''
+    if not isinstance(dfa, CompiledDFA):
+        dfa = dfa.compile()
+    arrays = [
+        ("alphabet", encode_symbols(dfa.alphabet, False)),
+        ("transitions", np.asarray(dfa.get_full_transitions(), dtype="<i4").ravel()),
+        ("accepting", np.asarray(dfa.accepting, dtype=np.uint8)),
+    ]
+    if dfa.labels is not None or dfa.label_source is not None:
+        arrays.extend(encode_labels([dfa.label(state_id) for state_id in range(dfa.state_count())]))
+    write_file(file_path, DFA_KIND, (dfa.state_count(), len(dfa.alphabet), int(dfa.start)), arrays)
+
+
+def load_dfa(file_path):
+    '''
+    :param file_path: file written by save_dfa
+    :return: CompiledDFA whose transition matrix and accepting flags are read-only views of the mapped file
+    '''
+    (state_count, symbol_count, start), arrays = read_file(file_path, DFA_KIND)
+    transitions = arrays["transitions"].reshape(state_count, symbol_count)
+    accepting = arrays["accepting"].view(bool)
+    label_source = None
+    if "label_kinds" in arrays:
+        label_source = StoredLabels(arrays["label_kinds"], arrays["label_offsets"], arrays["label_members"])
+    return CompiledDFA(decode_symbols(arrays["alphabet"]), transitions, accepting, start, label_source=label_source)
+
+
+class StoredLabels:
+    '''
+    DFA state names read from a file, CSR style: the members of state i are members[offsets[i]:offsets[i + 1]].
+    Names are only turned into Python objects when asked for.
+    '''
+    def __init__(self, kinds, offsets, members):
+        self.kinds = kinds
+        self.offsets = offsets
+        self.members = members
+
+    def label(self, state_id):
+        '''
+        :param state_id: id of a DFA state
+        :return: the name the state had when it was saved
+        '''
+        kind = self.kinds[state_id]
+        members = self.members[self.offsets[state_id]:self.offsets[state_id + 1]].tolist()
+        if kind == NULL_LABEL:
+            return NULL_STATE
+        if kind == INT_LABEL:
+            return members[0]
+        return tuple(members)
+
+
+def encode_labels(labels):
+    '''
+    :param labels: DFA state names in state order
+    :return: list of (name, array) pairs for the file, empty when a name cannot be stored
+    '''
+    kinds = []
+    offsets = [0]
+    members = []
+    for label in labels:
+        if label == NULL_STATE:
+            kinds.append(NULL_LABEL)
+        elif isinstance(label, (int, np.integer)) and not isinstance(label, bool):
+            kinds.append(INT_LABEL)
+            members.append(int(label))
+        elif isinstance(label, tuple) and all(isinstance(member, (int, np.integer)) for member in label):
+            kinds.append(TUPLE_LABEL)
+            members.extend(int(member) for member in label)
+        else:
+            return []
+        offsets.append(len(members))
+    return [
+        ("label_kinds", np.array(kinds, dtype=np.uint8)),
+        ("label_offsets", np.array(offsets, dtype="<i8")),
+        ("label_members", np.array(members, dtype="<i8")),
+    ]
+
+
+def encode_symbols(symbols, allow_epsilon):
+    '''
+    :param symbols: list of int letters, and "epsilon" for NFAs
+    :param allow_epsilon: whether "epsilon" may appear
+    :return: int64 array of the symbol table
+    '''
+    table = []
+    for symbol in symbols:
+        if allow_epsilon and symbol == "epsilon":
+            table.append(EPSILON_SYMBOL)
+        elif isinstance(symbol, (int, np.integer)) and not isinstance(symbol, bool) and symbol != EPSILON_SYMBOL:
+            table.append(int(symbol))
+        else:
+            raise ValueError("Only int letters can be stored, got " + repr(symbol))
+    return np.array(table, dtype="<i8")
+
+
+def decode_symbols(table):
+    '''
+    :param table: int64 array of the symbol table
+    :return: list of symbols
+    '''
+    return ["epsilon" if symbol == EPSILON_SYMBOL else symbol for symbol in table.tolist()]
+
+
+def write_file(file_path, kind, meta, arrays):
+    '''
+    :param file_path: where to write
+    :param kind: NFA_KIND or DFA_KIND
+    :param meta: (state count, symbol count, initial state id)
+    :param arrays: list of (name, NumPy array) pairs
+    '''
+    position = HEADER.size + META.size + DIRECTORY_ENTRY.size * len(arrays)
+    directory = []
+    for name, values in arrays:
+        position = align(position)
+        directory.append(DIRECTORY_ENTRY.pack(name.encode(), values.dtype.str.encode(), position, values.size))
+        position += values.nbytes
+
+    with open(file_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, kind))
+        file.write(META.pack(meta[0], meta[1], meta[2], len(arrays)))
+        file.write(b"".join(directory))
+        for name, values in arrays:
+            file.write(b"\0" * (align(file.tell()) - file.tell()))
+            file.write(np.ascontiguousarray(values).tobytes())
+
+
+def read_file(file_path, kind):
+    '''
+    :param file_path: file to map
+    :param kind: NFA_KIND or DFA_KIND
+    :return: ((state count, symbol count, initial state id), dict of array name to read-only array view)
+    :raises BinaryFormatError: when the header does not match
+    '''
+    raw = np.memmap(file_path, dtype=np.uint8, mode="r")
+    if raw.size < HEADER.size + META.size:
+        raise BinaryFormatError(str(file_path) + " is too short to be an automaton file")
+    magic, version, file_kind = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC:
+        raise BinaryFormatError(str(file_path) + " is not an automaton file")
+    if version != VERSION:
+        raise BinaryFormatError(str(file_path) + " has format version " + str(version) + ", expected " + str(VERSION))
+    if file_kind != kind:
+        raise BinaryFormatError(str(file_path) + " holds " + ("an NFA" if file_kind == NFA_KIND else "a DFA"))
+    state_count, symbol_count, initial, array_count = META.unpack_from(raw, HEADER.size)
+
+    arrays = {}
+    position = HEADER.size + META.size
+    for _ in range(array_count):
+        if position + DIRECTORY_ENTRY.size > raw.size:
+            raise BinaryFormatError(str(file_path) + " is truncated")
+        name, dtype, offset, count = DIRECTORY_ENTRY.unpack_from(raw, position)
+        position += DIRECTORY_ENTRY.size
+        dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        if offset + count * dtype.itemsize > raw.size:
+            raise BinaryFormatError(str(file_path) + " is truncated")
+        arrays[name.rstrip(b"\0").decode()] = raw[offset:offset + count * dtype.itemsize].view(dtype)
+    return (state_count, symbol_count, initial), arrays
+
+
+def align(position):
+    '''
+    :param position: byte offset
+    :return: the next offset that is a multiple of ALIGNMENT
+    '''
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
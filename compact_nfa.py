@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+import numpy as np
+
+from nfa import NFA
+
+
+class CompactNFA:
+    '''
+    NFA stored as arrays. States are renumbered 0..n-1 in sorted order of their names, and the
+    transitions of every symbol are kept CSR style: the targets of state s on symbol j are
+    targets[j][offsets[j][s]:offsets[j][s + 1]]. Symbols are the alphabet in order, followed by
+    "epsilon" when the NFA has epsilon transitions.
+    '''
+    def __init__(self, states, symbols, offsets, targets, initial, accepting):
+        '''
+        :param states: int64 array of state names, state i is named states[i]
+        :param symbols: list of symbols
+        :param offsets: one int64 array of length n + 1 per symbol
+        :param targets: one int32 array per symbol
+        :param initial: id of the initial state, -1 when there is none
+        :param accepting: int32 array of accepting state ids
+        '''
+        self.states = states
+        self.symbols = symbols
+        self.offsets = offsets
+        self.targets = targets
+        self.initial = initial
+        self.accepting = accepting
+
+    @classmethod
+    def from_edges(cls, states, symbols, sources, targets, initial, accepting):
+        '''
+        Builds the CSR arrays from edge lists
+        :param states: int64 array of sorted state names
+        :param symbols: list of symbols
+        :param sources: one array of source ids per symbol
+        :param targets: one array of target ids per symbol, parallel to sources
+        :param initial: id of the initial state, -1 when there is none
+        :param accepting: array of accepting state ids
+        :return: CompactNFA
+        '''
+        state_count = len(states)
+        all_offsets = []
+        all_targets = []
+        for symbol_sources, symbol_targets in zip(sources, targets):
+            symbol_sources = np.asarray(symbol_sources, dtype=np.int64)
+            order = np.argsort(symbol_sources, kind="stable")
+            counts = np.bincount(symbol_sources, minlength=state_count)
+            offsets = np.zeros(state_count + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            all_offsets.append(offsets)
+            all_targets.append(np.asarray(symbol_targets, dtype=np.int32)[order])
+        return cls(states, list(symbols), all_offsets, all_targets, initial, np.asarray(accepting, dtype=np.int32))
+
+    @classmethod
+    def from_nfa(cls, nfa):
+        '''
+        :param nfa: NFA whose states are ints
+        :return: CompactNFA of the same automaton
+        '''
+        names = set(nfa.states)
+        for targets in nfa.delta_transition.values():
+            names.update(targets)
+        states = np.array(sorted(names), dtype=np.int64)
+        id_of = {int(name): i for i, name in enumerate(states)}
+
+        symbols = list(nfa.alphabet)
+        has_epsilon = any(symbol == "epsilon" and len(targets) > 0 for (_, symbol), targets in nfa.delta_transition.items())
+        if has_epsilon:
+            symbols.append("epsilon")
+        symbol_id = {symbol: j for j, symbol in enumerate(symbols)}
+
+        sources = [[] for _ in symbols]
+        targets = [[] for _ in symbols]
+        for (state, symbol), symbol_targets in nfa.delta_transition.items():
+            j = symbol_id.get(symbol)
+            if j is None:
+                continue
+            for target in symbol_targets:
+                sources[j].append(id_of[state])
+                targets[j].append(id_of[target])
+
+        initial = id_of.get(nfa.initial_state, -1)
+        accepting = sorted(id_of[state] for state in nfa.accepting_states if state in id_of)
+        return cls.from_edges(states, symbols, sources, targets, initial, accepting)
+
+    def state_count(self):
+        '''
+        :return: number of states
+        '''
+        return len(self.states)
+
+    def transition_count(self):
+        '''
+        :return: number of (state, symbol, target) edges
+        '''
+        return sum(len(symbol_targets) for symbol_targets in self.targets)
+
+    def successors(self, state, symbol_index):
+        '''
+        :param state: state id
+        :param symbol_index: position of the symbol in symbols
+        :return: array of target ids, a view into targets
+        '''
+        offsets = self.offsets[symbol_index]
+        return self.targets[symbol_index][offsets[state]:offsets[state + 1]]
+
+    def to_nfa(self):
+        '''
+        Converts back to an NFA with the original state names, in the shape parse_nfa_file produces
+        :return: NFA
+        '''
+        names = self.states.tolist()
+        delta_transition = defaultdict(list)
+        for symbol, offsets, symbol_targets in zip(self.symbols, self.offsets, self.targets):
+            offsets = offsets.tolist()
+            symbol_targets = symbol_targets.tolist()
+            for state, name in enumerate(names):
+                start, end = offsets[state], offsets[state + 1]
+                if start < end:
+                    delta_transition[(name, symbol)] = [names[target] for target in symbol_targets[start:end]]
+
+        alphabet = [symbol for symbol in self.symbols if symbol != "epsilon"]
+        initial_state = names[self.initial] if self.initial >= 0 else None
+        accepting_states = {names[state] for state in self.accepting.tolist()}
+        return NFA(set(names), delta_transition, initial_state, accepting_states, alphabet)
@@ -0,0 +1,316 @@
+import numpy as np
+
+from minimization import hopcroft_minimize
+from transition_table import TransitionTable
+
+
+class CompiledDFA:
+    '''
+    Dense form of a complete DFA: states are 0..n-1, letters are 0..k-1 in alphabet order, and
+    transitions[state, letter] is the next state. Accepting states are marked in a bool array.
+    State names are only kept for reporting; labels is either a list or None, in which case
+    label_source, when set, names the states on request.
+
+    With columns, the matrix has one column per symbol class instead of one per letter, and the
+    letter at position i of the alphabet reads column columns[i], see SymbolClasses.
+    '''
+    def __init__(self, alphabet, transitions, accepting, start, labels=None, label_source=None, columns=None):
+        self.alphabet = list(alphabet)
+        self.columns = columns
+        if columns is None:
+            columns = range(len(self.alphabet))
+        self.symbol_index = {letter: column for letter, column in zip(self.alphabet, columns)}
+        self.text_index = {str(letter): column for letter, column in zip(self.alphabet, columns)}
+        self.letter_count = transitions.shape[1]
+        self.transitions = transitions
+        self.accepting = accepting
+        self.start = start
+        self.labels = labels
+        self.label_source = label_source
+        self.letter_lookup = self.build_letter_lookup()
+        self.flat_transitions = None
+        self.dead = None
+
+    @classmethod
+    def from_transition_table(cls, transition_table, symbol_classes=None):
+        '''
+        :param transition_table: TransitionTable to compile
+        :param symbol_classes: SymbolClasses when the table has one column per class, or None
+        :return: CompiledDFA with the same state numbering
+        '''
+        state_count = transition_table.state_count()
+        letter_count = transition_table.letter_count
+        table = np.frombuffer(transition_table.table, dtype=np.dtype(transition_table.table.typecode))
+        transitions = table.astype(np.int32).reshape(state_count, letter_count)
+        accepting = np.frombuffer(bytes(transition_table.accepting), dtype=np.uint8).astype(bool)
+        start = -1 if transition_table.initial is None else transition_table.initial
+        alphabet = transition_table.alphabet
+        columns = None
+        if symbol_classes is not None:
+            alphabet = symbol_classes.alphabet
+            columns = symbol_classes.columns
+        if transition_table.labels is not None:
+            return cls(alphabet, transitions, accepting, start, list(transition_table.labels), columns=columns)
+        return cls(alphabet, transitions, accepting, start, label_source=transition_table, columns=columns)
+
+    def build_letter_lookup(self):
+        '''
+        Maps raw input values to letter indexes, or to class columns when there are symbol classes. Returns
+        None when the alphabet is 0..k-1 in order and has no classes, since inputs can then be used as indexes
+        as they are; otherwise returns an array indexed by letter value, holding -1 for values outside the
+        alphabet. Alphabets that are not small non-negative ints get no lookup, and their inputs have to go
+        through encode.
+        :return: int32 NumPy array or None
+        '''
+        if self.columns is None and self.alphabet == list(range(len(self.alphabet))):
+            return None
+        if not all(isinstance(letter, int) and 0 <= letter < 1 << 16 for letter in self.alphabet):
+            return None
+        lookup = np.full(max(self.alphabet, default=-1) + 1, -1, dtype=np.int32)
+        for letter, column in self.symbol_index.items():
+            lookup[letter] = column
+        return lookup
+
+    def state_count(self):
+        '''
+        :return: number of DFA states
+        '''
+        return self.transitions.shape[0]
+
+    def label(self, state_id):
+        '''
+        :param state_id: id of a DFA state
+        :return: the name of the state in the DFA it was compiled from, or its id when there is none
+        '''
+        if self.labels is not None:
+            return self.labels[state_id]
+        if self.label_source is not None:
+            return self.label_source.label(state_id)
+        return state_id
+
+    def get_full_transitions(self):
+        '''
+        :return: transition matrix with one column per letter, expanding the class columns if there are any
+        '''
+        if self.columns is None:
+            return self.transitions
+        return self.transitions[:, self.columns]
+
+    def to_transition_table(self):
+        '''
+        :return: TransitionTable with the same states and one column per letter, for minimization and the
+        tuple keyed view
+        '''
+        labels = self.labels
+        if labels is None and self.label_source is not None:
+            labels = [self.label(state_id) for state_id in range(self.state_count())]
+        table = TransitionTable(self.alphabet, labels=labels)
+        table.table.frombytes(self.get_full_transitions().astype(np.dtype(table.table.typecode)).tobytes())
+        table.accepting = bytearray(self.accepting.astype(np.uint8).tobytes())
+        table.initial = None if self.start < 0 else int(self.start)
+        return table
+
+    def minimize(self):
+        '''
+        :return: CompiledDFA of the minimal equivalent DFA, see hopcroft_minimize. Symbol classes are kept,
+        so the minimization works on one column per class.
+        '''
+        if self.columns is None:
+            return CompiledDFA.from_transition_table(hopcroft_minimize(self.to_transition_table()))
+        representatives = {}
+        for letter, column in zip(self.alphabet, self.columns):
+            representatives.setdefault(column, letter)
+        class_dfa = CompiledDFA([representatives[column] for column in range(self.letter_count)], self.transitions,
+                                self.accepting, self.start, self.labels, self.label_source)
+        minimal = class_dfa.minimize()
+        return CompiledDFA(self.alphabet, minimal.transitions, minimal.accepting, minimal.start, minimal.labels,
+                           minimal.label_source, self.columns)
+
+    def encode(self, word):
+        '''
+        Translates letters of the alphabet to their indexes
+        :param word: iterable of letters
+        :return: int32 array of letter indexes
+        :raises ValueError: when a letter is not in the alphabet
+        '''
+        symbol_index = self.symbol_index
+        try:
+            return np.fromiter((symbol_index[letter] for letter in word), dtype=np.int32)
+        except KeyError as error:
+            raise ValueError("Letter " + repr(error.args[0]) + " is not in the alphabet") from None
+
+    def as_letter_indexes(self, word):
+        '''
+        Turns one input into an array of letter indexes. bytes, bytearray, memoryview and integer
+        ndarrays are read as raw letter values and are not copied when the alphabet is 0..k-1.
+        Strings are read character by character.
+        :param word: input to translate
+        :return: NumPy array of letter indexes
+        :raises ValueError: when the input holds a letter outside the alphabet
+        '''
+        if isinstance(word, (bytes, bytearray, memoryview)):
+            word = np.frombuffer(word, dtype=np.uint8)
+        elif isinstance(word, str):
+            text_index = self.text_index
+            try:
+                return np.fromiter((text_index[letter] for letter in word), dtype=np.int32)
+            except KeyError as error:
+                raise ValueError("Letter " + repr(error.args[0]) + " is not in the alphabet") from None
+        elif not isinstance(word, np.ndarray):
+            return self.encode(word)
+        return self.check_letter_indexes(word)
+
+    def check_letter_indexes(self, letters):
+        '''
+        Translates an array of raw letter values to letter indexes, failing on values outside the alphabet
+        :param letters: integer NumPy array of raw letter values
+        :return: array of letter indexes, the input itself when no translation is needed
+        '''
+        if letters.size == 0:
+            return letters
+        if self.letter_lookup is not None:
+            if letters.min() < 0 or letters.max() >= len(self.letter_lookup):
+                raise ValueError("Input holds values outside the alphabet " + str(self.alphabet))
+            letters = self.letter_lookup[letters]
+        elif self.columns is not None:
+            if letters.min() < 0 or letters.max() >= len(self.alphabet):
+                raise ValueError("Input holds values outside the alphabet " + str(self.alphabet))
+            letters = np.asarray(self.columns, dtype=np.int32)[letters]
+        if letters.min() < 0 or letters.max() >= self.letter_count:
+            raise ValueError("Input holds values outside the alphabet " + str(self.alphabet))
+        return letters
+
+    def get_flat_transitions(self):
+        '''
+        :return: transitions as a flat Python list, which is faster than NumPy for one letter at a time
+        '''
+        if self.flat_transitions is None:
+            self.flat_transitions = self.transitions.ravel().tolist()
+        return self.flat_transitions
+
+    def get_dead_states(self):
+        '''
+        Finds the states from which no accepting state can be reached, so matching can stop early
+        :return: bool NumPy array indexed by state
+        '''
+        if self.dead is None:
+            state_count = self.state_count()
+            letter_count = self.letter_count
+            sources = np.repeat(np.arange(state_count, dtype=np.int32), letter_count)
+            targets = self.transitions.ravel()
+            order = np.argsort(targets, kind="stable")
+            offsets = np.searchsorted(targets[order], np.arange(state_count + 1))
+            sources = sources[order].tolist()
+            offsets = offsets.tolist()
+
+            live = self.accepting.copy()
+            worklist = np.flatnonzero(live).tolist()
+            while worklist:
+                state = worklist.pop()
+                for source in sources[offsets[state]:offsets[state + 1]]:
+                    if not live[source]:
+                        live[source] = True
+                        worklist.append(source)
+            self.dead = ~live
+        return self.dead
+
+    def accepts(self, word):
+        '''
+        Runs the DFA over one input
+        :param word: letters, or raw letter values as bytes or ndarray, see as_letter_indexes
+        :return: whether the DFA accepts the input
+        '''
+        stream = self.stream()
+        stream.feed(word)
+        return stream.accepts()
+
+    def accepts_many(self, batch, length=None):
+        '''
+        Runs the DFA over many inputs at once. Inputs of equal length advance in lock step, one NumPy
+        fancy-indexing step per position, so the Python overhead is per position instead of per letter.
+        :param batch: 2-D integer ndarray with one input per row, bytes-like data holding inputs of the
+        given length back to back, or a list of inputs of any lengths
+        :param length: length of each input when batch is bytes-like
+        :return: bool NumPy array, one entry per input
+        '''
+        if isinstance(batch, (bytes, bytearray, memoryview)):
+            if length is None:
+                raise ValueError("length is needed to split bytes into inputs")
+            letters = np.frombuffer(batch, dtype=np.uint8)
+            return self.run_lock_step(self.check_letter_indexes(letters).reshape(-1, length))
+        if isinstance(batch, np.ndarray):
+            return self.run_lock_step(self.check_letter_indexes(batch))
+
+        results = np.zeros(len(batch), dtype=bool)
+        positions_by_length = {}
+        words = [self.as_letter_indexes(word) for word in batch]
+        for position, word in enumerate(words):
+            positions_by_length.setdefault(len(word), []).append(position)
+        for word_length, positions in positions_by_length.items():
+            letters = np.array([words[position] for position in positions], dtype=np.int32).reshape(len(positions), word_length)
+            results[positions] = self.run_lock_step(letters)
+        return results
+
+    def run_lock_step(self, letters):
+        '''
+        :param letters: 2-D array of letter indexes, one input per row
+        :return: bool NumPy array, one entry per row
+        '''
+        if letters.ndim != 2:
+            raise ValueError("Expected one input per row, got an array of shape " + str(letters.shape))
+        if self.start < 0:
+            return np.zeros(letters.shape[0], dtype=bool)
+        flat_transitions = self.transitions.ravel()
+        letter_count = self.letter_count
+        states = np.full(letters.shape[0], self.start, dtype=np.int64)
+        for column in range(letters.shape[1]):
+            states = flat_transitions[states * letter_count + letters[:, column]]
+        return self.accepting[states]
+
+    def stream(self):
+        '''
+        :return: MatchStream at the start state, for inputs that arrive in chunks
+        '''
+        return MatchStream(self)
+
+
+class MatchStream:
+    '''
+    Runs a CompiledDFA over an input that arrives in chunks. Once the run reaches a state that cannot
+    lead to acceptance, the rest of the chunk and later chunks are still checked and counted but not run.
+    '''
+    def __init__(self, compiled_dfa):
+        self.compiled_dfa = compiled_dfa
+        self.flat_transitions = compiled_dfa.get_flat_transitions()
+        self.dead = compiled_dfa.get_dead_states().tolist()
+        self.letter_count = compiled_dfa.letter_count
+        self.state = compiled_dfa.start
+        self.letters_read = 0
+
+    def feed(self, chunk):
+        '''
+        Advances the run over the next part of the input
+        :param chunk: letters, or raw letter values as bytes or ndarray
+        :return: self
+        :raises ValueError: when the chunk holds a letter outside the alphabet, whether or not the run is dead
+        '''
+        letters = self.compiled_dfa.as_letter_indexes(chunk)
+        self.letters_read += len(letters)
+        if self.state < 0 or self.dead[self.state]:
+            return self
+        flat_transitions = self.flat_transitions
+        dead = self.dead
+        letter_count = self.letter_count
+        state = self.state
+        for letter in letters.tolist():
+            state = flat_transitions[state * letter_count + letter]
+            if dead[state]:
+                break
+        self.state = state
+        return self
+
+    def accepts(self):
+        '''
+        :return: whether the input read so far is accepted
+        '''
+        return self.state >= 0 and bool(self.compiled_dfa.accepting[self.state])
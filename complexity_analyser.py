@@ -3,15 +3,19 @@ import time
 import re
 import matplotlib.pyplot as plt
 import numpy as np
-from nfa import NFA
-from dfa import DFA
-from nfa_parser import parse_nfa_file
+from construction_budget import ConstructionBudget
+from dfa_cache import DeterminizationCache
+from parallel_analysis import analyze_nfa_file
 
 def extract_state_count(filename):
     match = re.search(r'nfa_(\d+)_states\.txt', filename)
     return int(match.group(1)) if match else float('inf')  # 'inf' pushes unknowns to end
 
-def analyze_dfa_complexity(nfa_folder_path):
+def analyze_dfa_complexity(nfa_folder_path, cache=None, budget=None, profile=False):
+    # With a DeterminizationCache, NFAs seen on an earlier run are loaded instead of determinized,
+    # and construction_time_sec is the time taken to load them. With a ConstructionBudget, NFAs whose
+    # DFA is too big are recorded as "exceeded budget" with the counts reached when they stopped.
+    # With profile, each construction's phase timings and counters are printed under its line.
     results = []
 
     # Properly sort by number of states in the filename
@@ -23,50 +27,24 @@ def analyze_dfa_complexity(nfa_folder_path):
     for filename in filenames:
         filepath = os.path.join(nfa_folder_path, filename)
 
-        # Parse NFA
-        nfa_tuple = parse_nfa_file(filepath)
-        nfa = NFA(nfa_tuple[0], nfa_tuple[2], nfa_tuple[3], nfa_tuple[4], nfa_tuple[1])
-
-        # Count total transitions and epsilon transitions
-        total_transitions = 0
-        epsilon_transitions = 0
-        for key, value in nfa_tuple[2].items():
-            if key[1] == "epsilon":
-                epsilon_transitions += len(value)
-            total_transitions += len(value)
-
-        # Calculate transition density (transitions per state)
-        transition_density = total_transitions / len(nfa_tuple[0])
-        epsilon_density = epsilon_transitions / total_transitions if total_transitions > 0 else 0
-
-        # Measure time for subset construction
-        start_time = time.time()
-        dfa = DFA(nfa)
-        elapsed_time = time.time() - start_time
-
-        num_dfa_states = len(dfa.states)
-
-        num_dfa_transitions = len(dfa.delta_transition)
-
-        # Calculate theoretical maximum (2^n)
-        theoretical_max = 2 ** len(nfa_tuple[0])
-
-        results.append({
-            "filename": filename,
-            "nfa_states": len(nfa_tuple[0]),
-            "dfa_states": num_dfa_states,
-            "dfa_transitions": num_dfa_transitions,
-            "construction_time_sec": elapsed_time,
-            "transition_density": transition_density,
-            "epsilon_density": epsilon_density,
-            "theoretical_max": theoretical_max,
-            "percentage_of_theoretical": (num_dfa_states / theoretical_max) * 100 if theoretical_max > 0 else 0
-        })
-
-        print(f"{filename} → NFA States: {len(nfa_tuple[0])}, DFA States: {num_dfa_states}, "
-              f"Transitions: {num_dfa_transitions}, Time: {elapsed_time:.6f}s, "
-              f"Transition Density: {transition_density:.2f}, Epsilon Density: {epsilon_density:.2f}")
-
+        # Parse, determinize and measure the NFA
+        result = analyze_nfa_file(filepath, cache, budget=budget, profile=profile)
+        results.append(result)
+
+        print(f"{filename} → NFA States: {result['nfa_states']}, DFA States: {result['dfa_states']}, "
+              f"Transitions: {result['dfa_transitions']}, Time: {result['construction_time_sec']:.6f}s, "
+              f"Transition Density: {result['transition_density']:.2f}, Epsilon Density: {result['epsilon_density']:.2f}"
+              f"{' (cached)' if result['cache_hit'] else ''}"
+              f"{' (exceeded budget, ' + str(result['frontier_states']) + ' frontier states)' if result['status'] != 'ok' else ''}")
+        if result['profile'] is not None and result['profile']['phases']:
+            phases = ", ".join(f"{phase} {seconds:.6f}s" for phase, seconds in result['profile']['phases'].items())
+            counters = ", ".join(f"{counter} {value}" for counter, value in result['profile']['counters'].items())
+            print(f"    phases: {phases}; {counters}")
+
+    if cache is not None:
+        statistics = cache.get_statistics()
+        print(f"DFA cache: {statistics['hits']} hits, {statistics['misses']} misses, "
+              f"{statistics['evictions']} evictions, {statistics['bytes']} bytes in {statistics['entries']} entries")
     return results
 
 def plot_enhanced_complexity(results):
@@ -125,43 +103,45 @@ def plot_enhanced_complexity(results):
     plt.savefig("nfa_dfa_complexity_analysis.png")
     plt.show()
 
-# Run the analysis on the improved NFAs
-improved_nfa_dir = "max_nfa_output"  # Directory containing improved NFAs
-
-print("Analyzing improved NFAs...")
-improved_results = analyze_dfa_complexity(improved_nfa_dir)
-plot_enhanced_complexity(improved_results)
-
-# # If you want to compare with the original NFAs:
-# original_nfa_dir = "generated"  # Directory containing original NFAs
-# if os.path.exists(original_nfa_dir):
-#     print("\nAnalyzing original NFAs for comparison...")
-#     # Just analyze a small sample of the original NFAs for comparison
-#     sample_original_results = analyze_dfa_complexity(original_nfa_dir)
-    
-#     # Create comparison plot
-#     plt.figure(figsize=(12, 6))
-    
-#     # Get data
-#     orig_nfa_sizes = [r["nfa_states"] for r in sample_original_results]
-#     orig_dfa_states = [r["dfa_states"] for r in sample_original_results]
-#     improved_nfa_sizes = [r["nfa_states"] for r in improved_results]
-#     improved_dfa_states = [r["dfa_states"] for r in improved_results]
-    
-#     # Plot comparison
-#     plt.plot(orig_nfa_sizes, orig_dfa_states, marker='o', label='Original NFAs')
-#     plt.plot(improved_nfa_sizes, improved_dfa_states, marker='x', label='Improved NFAs')
-    
-#     # Add theoretical maximum line for reference
-#     x_range = range(1, max(max(orig_nfa_sizes), max(improved_nfa_sizes)) + 1)
-#     theoretical = [2**x for x in x_range]
-#     plt.plot(x_range, theoretical, linestyle='--', label='Theoretical Max (2^n)')
-    
-#     plt.yscale('log')
-#     plt.xlabel("Number of NFA States")
-#     plt.ylabel("Number of DFA States (log scale)")
-#     plt.title("Comparison: Original vs Improved NFA-DFA Relationship")
-#     plt.legend()
-#     plt.grid(True)
-#     plt.savefig("nfa_dfa_comparison.png")
-#     plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    # Run the analysis on the improved NFAs
+    improved_nfa_dir = "max_nfa_output"  # Directory containing improved NFAs
+
+    print("Analyzing improved NFAs...")
+    improved_results = analyze_dfa_complexity(improved_nfa_dir, DeterminizationCache(),
+                                              ConstructionBudget(max_states=1000000, deadline_seconds=600))
+    plot_enhanced_complexity(improved_results)
+
+    # # If you want to compare with the original NFAs:
+    # original_nfa_dir = "generated"  # Directory containing original NFAs
+    # if os.path.exists(original_nfa_dir):
+    #     print("\nAnalyzing original NFAs for comparison...")
+    #     # Just analyze a small sample of the original NFAs for comparison
+    #     sample_original_results = analyze_dfa_complexity(original_nfa_dir)
+
+    #     # Create comparison plot
+    #     plt.figure(figsize=(12, 6))
+
+    #     # Get data
+    #     orig_nfa_sizes = [r["nfa_states"] for r in sample_original_results]
+    #     orig_dfa_states = [r["dfa_states"] for r in sample_original_results]
+    #     improved_nfa_sizes = [r["nfa_states"] for r in improved_results]
+    #     improved_dfa_states = [r["dfa_states"] for r in improved_results]
+
+    #     # Plot comparison
+    #     plt.plot(orig_nfa_sizes, orig_dfa_states, marker='o', label='Original NFAs')
+    #     plt.plot(improved_nfa_sizes, improved_dfa_states, marker='x', label='Improved NFAs')
+
+    #     # Add theoretical maximum line for reference
+    #     x_range = range(1, max(max(orig_nfa_sizes), max(improved_nfa_sizes)) + 1)
+    #     theoretical = [2**x for x in x_range]
+    #     plt.plot(x_range, theoretical, linestyle='--', label='Theoretical Max (2^n)')
+
+    #     plt.yscale('log')
+    #     plt.xlabel("Number of NFA States")
+    #     plt.ylabel("Number of DFA States (log scale)")
+    #     plt.title("Comparison: Original vs Improved NFA-DFA Relationship")
+    #     plt.legend()
+    #     plt.grid(True)
+    #     plt.savefig("nfa_dfa_comparison.png")
+    #     plt.show()
@@ -0,0 +1,77 @@
+import time
+
+# Rough memory cost of one DFA state besides its subset, and of one transition, for each engine:
+# dict and list entries, the subset object and the transition table slot or dict entry
+BITSET_STATE_BYTES = 120
+BITSET_TRANSITION_BYTES = 8
+TUPLE_STATE_BYTES = 250
+TUPLE_TRANSITION_BYTES = 170
+
+REASONS = ("states", "transitions", "deadline", "memory")
+
+
+class ConstructionBudget:
+    '''
+    Limits on one subset construction. Any limit left as None is not checked. The engines ask the budget
+    before expanding each DFA state, and stop with a partial DFA once a limit is reached: the states found
+    so far, of which the frontier ones have no outgoing transitions yet.
+
+    Memory is not measured but estimated from the number of states, their subset sizes and the number of
+    transitions, so checking it costs nothing; it is a guard against runaway constructions, not an exact cap.
+    '''
+    def __init__(self, max_states=None, max_transitions=None, deadline_seconds=None, max_memory_bytes=None):
+        '''
+        :param max_states: most DFA states to discover
+        :param max_transitions: most DFA transitions to build
+        :param deadline_seconds: wall-clock seconds a construction may take
+        :param max_memory_bytes: most estimated bytes the construction may hold
+        '''
+        self.max_states = max_states
+        self.max_transitions = max_transitions
+        self.deadline_seconds = deadline_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.start_time = None
+
+    def start(self):
+        '''
+        Starts the clock of a new construction. A budget can be reused; each construction gets the full budget.
+        :return: self
+        '''
+        self.start_time = time.perf_counter()
+        return self
+
+    def exceeded(self, state_count, transition_count, memory_bytes):
+        '''
+        :param state_count: DFA states discovered so far
+        :param transition_count: DFA transitions built so far
+        :param memory_bytes: estimated bytes held so far
+        :return: the first limit that is reached, one of REASONS, or None
+        '''
+        if self.max_states is not None and state_count >= self.max_states:
+            return "states"
+        if self.max_transitions is not None and transition_count >= self.max_transitions:
+            return "transitions"
+        if self.deadline_seconds is not None and time.perf_counter() - self.start_time >= self.deadline_seconds:
+            return "deadline"
+        if self.max_memory_bytes is not None and memory_bytes >= self.max_memory_bytes:
+            return "memory"
+        return None
+
+    def get_statistics(self, reason, state_count, explored_count, transition_count, memory_bytes):
+        '''
+        :param reason: limit that stopped the construction, or None when it finished
+        :param state_count: DFA states discovered
+        :param explored_count: DFA states whose transitions were built
+        :param transition_count: DFA transitions built
+        :param memory_bytes: estimated bytes held
+        :return: dict describing the construction
+        '''
+        return {
+            "exceeded": reason,
+            "states": state_count,
+            "explored": explored_count,
+            "frontier": state_count - explored_count,
+            "transitions": transition_count,
+            "memory_bytes": memory_bytes,
+            "elapsed_sec": time.perf_counter() - self.start_time,
+        }
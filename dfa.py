@@ -1,50 +1,489 @@
-from collections import defaultdict
+import time
+from array import array
+from collections import defaultdict, deque
+
+from compact_subset import CompactSubsetEngine
+from compiled_dfa import CompiledDFA
+from construction_budget import TUPLE_STATE_BYTES, TUPLE_TRANSITION_BYTES
+from minimization import brzozowski_minimize, hopcroft_minimize
+from parallel_subset import ParallelSubsetEngine
+from subset_engine import BitsetSubsetEngine, ORDERS
+from symbol_classes import SymbolClasses
+from transition_table import NULL_STATE, TransitionTable
+
+ENGINES = ("tuple", "bitset", "brzozowski", "parallel", "compact")
+
 
 class DFA:
-    def __init__(self, nfa):
+    __slots__ = ("source_nfa", "nfa", "engine", "order", "remove_epsilons", "trim", "trim_statistics", "alphabet", "budget",
+                 "profile", "symbol_classes", "complete", "statistics", "subset_engine", "table_source", "_view_pending", "_states", "_state_order",
+                 "_delta_transition", "_initial_state", "_accepting_states")
+
+    def __init__(self, nfa, engine="tuple", order="bfs", remove_epsilons=False, budget=None, profile=None,
+                 compress_alphabet=False, trim=False):
+        '''
+        Builds the DFA of an NFA through subset construction.
+        :param nfa: the NFA to determinize
+        :param engine: "tuple" keeps every subset as a sorted tuple of NFA states, "bitset" stores subsets
+        as integer bitmasks and only builds states, delta_transition and accepting_states when first read,
+        "brzozowski" builds the minimal DFA directly, without the full subset DFA in between, "parallel" runs
+        the bitset construction across worker processes and gives the same DFA as "bitset" with "bfs",
+        "compact" gives the same DFA as "bitset" while keeping no Python object per state, see CompactSubsetEngine
+        :param order: "bfs" or "dfs", the order in which discovered subsets are expanded; "parallel" needs "bfs"
+        :param remove_epsilons: determinize nfa.remove_epsilon_transitions() instead of nfa itself. The
+        DFA states are then built from merged epsilon components, and self.nfa is the epsilon-free NFA.
+        :param budget: ConstructionBudget limiting the construction. When a limit is reached the construction
+        stops cleanly: complete is False, the DFA holds the states found so far, the frontier states among
+        them have no transitions yet, and statistics says which limit was hit. Not supported by "brzozowski".
+        :param profile: ConstructionProfile to record phase timings and counters in, or None to skip them
+        :param compress_alphabet: merge letters the NFA treats alike into SymbolClasses and determinize with
+        one letter per class. The construction and the compiled transition matrix then scale with the number
+        of classes rather than the alphabet; delta_transition still has every letter. self.nfa is the NFA
+        over the class representatives and symbol_classes holds the classes.
+        :param trim: determinize the trimmed NFA, see NFA.trim, so that states which are unreachable or
+        cannot reach an accepting state never enter a subset. Subsets differing only in such dead states
+        become one DFA state, and the language is unchanged. self.nfa is the trimmed NFA, and
+        trim_statistics counts the NFA states that were dropped.
+        '''
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine " + repr(engine) + ", expected one of " + str(ENGINES))
+        if order not in ORDERS:
+            raise ValueError("Unknown order " + repr(order) + ", expected one of " + str(ORDERS))
+        if engine == "parallel" and order != "bfs":
+            raise ValueError("The parallel engine expands subsets level by level and only supports \"bfs\"")
+        if engine == "brzozowski" and budget is not None:
+            raise ValueError("Budgets are not supported by the brzozowski engine, whose intermediate DFAs have no useful partial form")
+        self.source_nfa = nfa
+        if remove_epsilons and len(nfa.states) > 0:
+            nfa = nfa.remove_epsilon_transitions()
+        trim_statistics = None
+        if trim and len(nfa.states) > 0:
+            reachable, useful = nfa.get_useful_states()
+            trimmed_nfa = nfa.trim(useful)
+            trim_statistics = {
+                "nfa_states": len(nfa.states),
+                "unreachable_states": len(nfa.states - reachable),
+                "dead_states": len(reachable - useful),
+                "kept_states": len(trimmed_nfa.states),
+            }
+            nfa = trimmed_nfa
+        self.engine = engine
+        self.order = order
+        symbol_classes = None
+        if compress_alphabet:
+            symbol_classes = SymbolClasses.from_nfa(nfa)
+            nfa = symbol_classes.compress_nfa(nfa)
+        self.init_attributes(nfa, nfa.alphabet)
+        self.budget = budget.start() if budget is not None else None
+        self.profile = profile
+        self.remove_epsilons = remove_epsilons
+        self.trim = trim
+        self.trim_statistics = trim_statistics
+        if len(self.nfa.states) > 0:
+            if engine in ("bitset", "parallel", "compact"):
+                self.construct_with_bitsets()
+            elif engine == "brzozowski":
+                self.construct_minimal_from_nfa()
+            else:
+                self.construct_from_nfa()
+        if symbol_classes is not None:
+            self.symbol_classes = symbol_classes
+            self.alphabet = list(symbol_classes.alphabet)
+            if not self._view_pending:
+                self.expand_delta_transition()
+        if profile is not None:
+            profile.finish()
+
+    @classmethod
+    def from_transition_table(cls, transition_table, nfa=None, symbol_classes=None):
+        '''
+        Wraps an existing TransitionTable in a DFA without running subset construction
+        :param transition_table: TransitionTable holding the states and transitions
+        :param nfa: NFA the table was built from, if any
+        :param symbol_classes: SymbolClasses when the table has one column per class, or None
+        :return: DFA whose tuple keyed view is built from the table when first read
+        '''
+        dfa = cls.__new__(cls)
+        dfa.source_nfa = nfa
+        dfa.engine = "table"
+        dfa.order = None
+        dfa.init_attributes(nfa, transition_table.alphabet if symbol_classes is None else symbol_classes.alphabet)
+        dfa.symbol_classes = symbol_classes
+        dfa.table_source = transition_table
+        dfa._view_pending = transition_table.state_count() > 0
+        return dfa
+
+    def init_attributes(self, nfa, alphabet):
+        '''
+        Sets up an empty DFA
+        :param nfa: NFA being determinized
+        :param alphabet: letters of the DFA
+        :return: Void
+        '''
         self.nfa = nfa
+        self.remove_epsilons = False
+        self.trim = False
+        self.trim_statistics = None
+        self.budget = None
+        self.profile = None
+        self.symbol_classes = None
+        self.complete = True
+        self.statistics = None
+        self.subset_engine = None
+        self.table_source = None
+        self._view_pending = False
         self.states = set()
+        self.state_order = []
         self.delta_transition = defaultdict(tuple)
         self.initial_state = None
         self.accepting_states = set()
-        self.alphabet = nfa.alphabet.copy()
-        if len(self.nfa.states) > 0:
-            self.construct_from_nfa()
-    
+        self.alphabet = list(alphabet).copy()
+
+    @property
+    def states(self):
+        self.build_view()
+        return self._states
+
+    @states.setter
+    def states(self, states):
+        self._states = states
+
+    @property
+    def state_order(self):
+        self.build_view()
+        return self._state_order
+
+    @state_order.setter
+    def state_order(self, state_order):
+        self._state_order = state_order
+
+    @property
+    def delta_transition(self):
+        self.build_view()
+        return self._delta_transition
+
+    @delta_transition.setter
+    def delta_transition(self, delta_transition):
+        self._delta_transition = delta_transition
+
+    @property
+    def initial_state(self):
+        self.build_view()
+        return self._initial_state
+
+    @initial_state.setter
+    def initial_state(self, initial_state):
+        self._initial_state = initial_state
+
+    @property
+    def accepting_states(self):
+        self.build_view()
+        return self._accepting_states
+
+    @accepting_states.setter
+    def accepting_states(self, accepting_states):
+        self._accepting_states = accepting_states
+
+    def construct_with_bitsets(self):
+        '''
+        Runs subset construction on bitmasks. The tuple keyed view is left empty until it is read.
+        :return: Void
+        '''
+        profile = self.profile
+        start_time = time.perf_counter()
+        if self.engine == "parallel":
+            engine = ParallelSubsetEngine(self.nfa)
+        elif self.engine == "compact":
+            engine = CompactSubsetEngine(self.nfa, self.order)
+        else:
+            engine = BitsetSubsetEngine(self.nfa, self.order)
+        if profile is not None:
+            profile.add_time("index", time.perf_counter() - start_time)
+            profile.count("closure_calls", engine.index.closure_count)
+        engine.run(self.budget, profile)
+        self.subset_engine = engine
+        self.table_source = engine
+        self._view_pending = True
+        if self.budget is not None:
+            self.complete = engine.budget_exceeded is None
+            self.statistics = self.budget.get_statistics(engine.budget_exceeded, len(engine.subsets), engine.explored_count,
+                                                         engine.explored_count * engine.letter_count, engine.memory_bytes)
+
+    def construct_minimal_from_nfa(self):
+        '''
+        Builds the minimal DFA with Brzozowski's algorithm. States are named like the output of minimize().
+        :return: Void
+        '''
+        start_time = time.perf_counter()
+        self.table_source = brzozowski_minimize(self.nfa)
+        self._view_pending = True
+        if self.profile is not None:
+            self.profile.add_time("construction", time.perf_counter() - start_time)
+            self.profile.count("subsets_created", self.table_source.state_count())
+            self.profile.count("transitions_emitted", self.table_source.state_count() * len(self.table_source.alphabet))
+
+    def build_view(self):
+        '''
+        Fills states, delta_transition, initial_state and accepting_states from the transition table
+        the first time one of them is read. Does nothing for the tuple engine.
+        :return: Void
+        '''
+        if not self._view_pending:
+            return
+        self._view_pending = False
+        table_source = self.table_source
+        labels = [table_source.label(state_id) for state_id in range(table_source.state_count())]
+        targets = [(NULL_STATE,) if label == NULL_STATE else label for label in labels]
+        if self.symbol_classes is None:
+            letter_columns = list(enumerate(table_source.alphabet))
+        else:
+            letter_columns = list(zip(self.symbol_classes.columns, self.symbol_classes.alphabet))
+
+        self._states = set(labels)
+        self._state_order = labels
+        self._initial_state = labels[table_source.initial]
+        self._accepting_states = {labels[i] for i, accepting in enumerate(table_source.accepting) if accepting}
+        delta_transition = self._delta_transition
+        for state_id, label in enumerate(labels):
+            row = table_source.row(state_id)
+            for column, letter in letter_columns:
+                next_id = row[column]
+                # -1 marks the missing rows of a DFA whose construction stopped at its budget
+                if next_id >= 0:
+                    delta_transition[(label, letter)] = targets[next_id]
+
+    def expand_delta_transition(self):
+        '''
+        Copies the transitions the tuple engine built on class representatives to the other letters of their class
+        :return: Void
+        '''
+        delta_transition = self.delta_transition
+        classes = self.symbol_classes.classes
+        for label in self.state_order:
+            for letters in classes:
+                target = delta_transition.get((label, letters[0]))
+                if target is not None:
+                    for letter in letters[1:]:
+                        delta_transition[(label, letter)] = target
+
+    def update(self, edits):
+        '''
+        Brings the DFA up to date after its NFA was edited with NFA.add_transition, remove_transition and
+        set_accepting, instead of building it again. Edits that only change accepting states never explore:
+        the accepting flag of every subset is recomputed from the new accepting states. With the bitset
+        engine, letter transition edits only recompute the subsets holding an edited state and explore the
+        subsets that become reachable, see BitsetSubsetEngine.update_transitions. Anything else, such as
+        epsilon edits, other engines, remove_epsilons, trim or compress_alphabet with transition edits, rebuilds
+        the DFA with the settings it was built with. Either way the result equals DFA(nfa) on the edited NFA.
+        :param edits: edits returned by the NFA methods
+        :return: self
+        :raises ValueError: when the DFA was not built from an NFA, or its construction stopped at its budget
+        '''
+        if self.engine == "table":
+            raise ValueError("This DFA was made from a transition table and has no NFA to update from")
+        if not self.complete:
+            raise ValueError("The construction stopped at its " + self.statistics["exceeded"] + " budget, build it again instead")
+        transition_edits = [(edit[1], edit[2]) for edit in edits if edit[0] == "transition"]
+
+        # the DFA of a trimmed NFA is rebuilt, since any edit can change which NFA states are useful
+        incremental = not self.remove_epsilons and not self.trim
+
+        if not transition_edits and incremental and self.engine != "brzozowski":
+            if self.subset_engine is not None:
+                self.subset_engine.update_accepting()
+                self.reset_view()
+            else:
+                accepting_states = self.nfa.accepting_states
+                # read before the table is dropped, since a DFA from a table builds its view from it
+                state_order = self.state_order
+                self.table_source = None
+                self.accepting_states = {state for state in state_order if state != NULL_STATE
+                                         and not accepting_states.isdisjoint(state)}
+            return self
+
+        if (self.engine == "bitset" and self.subset_engine is not None and incremental
+                and self.symbol_classes is None and all(symbol != "epsilon" for _, symbol in transition_edits)):
+            # subsets renumbered by the update take their accepting flag from the current accepting states
+            self.subset_engine.index.update_accepting()
+            if self.subset_engine.update_transitions(transition_edits):
+                self.reset_view()
+                return self
+
+        DFA.__init__(self, self.source_nfa, self.engine, self.order, self.remove_epsilons, self.budget,
+                     compress_alphabet=self.symbol_classes is not None, trim=self.trim)
+        return self
+
+    def reset_view(self):
+        '''
+        Drops the tuple keyed view so it is built again from the transition table when next read
+        :return: Void
+        '''
+        self.states = set()
+        self.state_order = []
+        self.delta_transition = defaultdict(tuple)
+        self.initial_state = None
+        self.accepting_states = set()
+        self._view_pending = True
+
+    def get_transition_table(self):
+        '''
+        Gives the DFA as a TransitionTable. The bitset engine already has one; for the tuple engine it is
+        built from delta_transition, numbering states in discovery order. With symbol classes the table
+        is expanded to one column per letter.
+        :return: TransitionTable of this DFA
+        :raises ValueError: when the construction stopped at its budget, since the DFA is not complete
+        '''
+        table = self.get_class_transition_table()
+        if self.symbol_classes is not None:
+            return self.symbol_classes.expand_table(table)
+        return table
+
+    def get_class_transition_table(self):
+        '''
+        Like get_transition_table, but with symbol classes the table keeps one column per class, its
+        alphabet being the class representatives
+        :return: TransitionTable of this DFA
+        :raises ValueError: when the construction stopped at its budget, since the DFA is not complete
+        '''
+        if not self.complete:
+            raise ValueError("The construction stopped at its " + self.statistics["exceeded"] + " budget, the DFA is not complete")
+        if self.table_source is not None:
+            return self.table_source
+        letters = self.alphabet if self.symbol_classes is None else self.symbol_classes.representatives
+        if len(self.states) == 0:
+            return TransitionTable(letters)
+
+        labels = list(self.state_order)
+        id_of = {label: state_id for state_id, label in enumerate(labels)}
+        id_of[(NULL_STATE,)] = id_of.get(NULL_STATE)
+        table = array("l")
+        accepting = bytearray()
+        for label in labels:
+            for letter in letters:
+                table.append(id_of[self.delta_transition[(label, letter)]])
+            accepting.append(1 if label in self.accepting_states else 0)
+        self.table_source = TransitionTable(letters, table, accepting, id_of[self.initial_state], labels)
+        return self.table_source
+
+    def compile(self):
+        '''
+        Renumbers the states to 0..n-1 and the letters to 0..k-1 and packs the transitions into a dense
+        int32 NumPy matrix, see CompiledDFA. With symbol classes the matrix has one column per class.
+        :return: CompiledDFA of this DFA
+        '''
+        return CompiledDFA.from_transition_table(self.get_class_transition_table(), self.symbol_classes)
+
+    def minimize(self):
+        '''
+        Builds the minimal equivalent DFA with Hopcroft's algorithm. Its states are named 0..n-1 in
+        breadth first order, except the state accepting nothing, which is named "Null set".
+        :return: new DFA
+        '''
+        minimal_table = hopcroft_minimize(self.get_class_transition_table())
+        return DFA.from_transition_table(minimal_table, self.source_nfa, self.symbol_classes)
+
     def construct_from_nfa(self):
+        profile = self.profile
+        start_time = time.perf_counter()
         initial_epsilons = list(self.nfa.get_epsilon_closure(self.nfa.initial_state))
         initial_epsilons.sort()
         initial_state_closed = set(initial_epsilons)
+        if profile is not None:
+            profile.add_time("closure", time.perf_counter() - start_time)
+            profile.count("closure_calls")
         
         self.subset_construction_steps(initial_state_closed, True)
-        self.have_missing_dfa_transitions_go_to_null()
+        if self.complete:
+            start_time = time.perf_counter()
+            self.have_missing_dfa_transitions_go_to_null()
+            if profile is not None:
+                profile.add_time("null_transitions", time.perf_counter() - start_time)
         
     def subset_construction_steps(self, states, is_initial_state):
         '''
-        Walks through the NFA and updates DFA 5-tuple values
-        :param states:
-        :param is_initial_state:
-        :return:
+        Walks through the NFA and updates DFA 5-tuple values. Uses an explicit worklist instead of
+        recursion, so DFAs with more states than the recursion limit can be built.
+        :param states: set of NFA states to start from
+        :param is_initial_state: whether the starting set is the DFA's initial state
+        :return: Void
         '''
-        transition_letters = self.get_possible_inputs(states)
-
         states_tuple = tuple(sorted(states))
 
         if is_initial_state:
             self.initial_state = states_tuple
 
+        self.discover_state(states_tuple)
+        worklist = deque([states_tuple])
+        take = worklist.popleft if self.order == "bfs" else worklist.pop
+        budget = self.budget
+        profile = self.profile
+        explored_count = 0
+        memory_bytes = 8 * len(states_tuple) + TUPLE_STATE_BYTES
+        exceeded = None
+
+        while worklist:
+            if budget is not None:
+                exceeded = budget.exceeded(len(self.states), len(self.delta_transition), memory_bytes)
+                if exceeded is not None:
+                    break
+            states = take()
+            if profile is None:
+                transition_letters = self.get_possible_inputs(states)
+                transitionable_states = self.get_next_states_from_transitions(states, transition_letters)
+            else:
+                transition_letters, transitionable_states = self.expand_state_profiled(states)
+                start_time = time.perf_counter()
+            explored_count += 1
+            memory_bytes += TUPLE_TRANSITION_BYTES * len(transition_letters)
+
+            for next_state in transitionable_states:
+                if next_state not in self.states:
+                    self.discover_state(next_state)
+                    worklist.append(next_state)
+                    memory_bytes += 8 * len(next_state) + TUPLE_STATE_BYTES
+                elif profile is not None:
+                    profile.count("duplicate_hits")
+            if profile is not None:
+                profile.add_time("dedup", time.perf_counter() - start_time)
+
+        if budget is not None:
+            self.complete = exceeded is None
+            self.statistics = budget.get_statistics(exceeded, len(self.states), explored_count,
+                                                    len(self.delta_transition), memory_bytes)
+
+    def discover_state(self, states_tuple):
+        '''
+        Adds a newly found DFA state, remembering the order states were found in
+        :param states_tuple: sorted tuple of NFA states
+        :return: Void
+        '''
         self.states.add(states_tuple)
-        if any(state in self.nfa.accepting_states for state in states):
+        self.state_order.append(states_tuple)
+        if any(state in self.nfa.accepting_states for state in states_tuple):
             self.accepting_states.add(states_tuple)
+        if self.profile is not None:
+            self.profile.subset_created(states_tuple, len(states_tuple))
 
-        transitionable_states = self.get_next_states_from_transitions(states, transition_letters)
+    def expand_state_profiled(self, states):
+        '''
+        Does what the worklist loop does with a DFA state, finding its letters and successors, while
+        timing both phases and counting the transitions it emits
+        :param states: tuple of NFA states
+        :return: (set of letters with transitions, list of successor tuples)
+        '''
+        profile = self.profile
+        start_time = time.perf_counter()
+        transition_letters = self.get_possible_inputs(states)
+        profile.add_time("possible_inputs", time.perf_counter() - start_time)
 
-        #checked_nfa_states.add(state)
+        closure_time = profile.timers["closure"]
+        start_time = time.perf_counter()
+        transitionable_states = self.get_next_states_from_transitions(states, transition_letters)
+        # the closures are timed on their own inside the call
+        profile.add_time("next_states", time.perf_counter() - start_time - (profile.timers["closure"] - closure_time))
+        profile.count("transitions_emitted", len(transition_letters))
+        return transition_letters, transitionable_states
 
-        for next_state in transitionable_states:
-            if next_state is not None and next_state not in self.states:
-                self.subset_construction_steps(next_state, False)
-                
     def print_dfa_information(self):
         '''
         prints dfa information. Should be updated
@@ -73,34 +512,38 @@ class DFA:
     def get_next_states_from_transitions(self, states, transition_letters):
         #FIXME on the comment, figure out what the tuple of nfa states that makes a single dfa state is called
         '''
-        Given a set of NFA states, characters, returns set of tuples of reachable states.
+        Given a set of NFA states, characters, returns tuples of reachable states.
         :param states: set of NFA states
         :param transition_letters: Letters that lead to valid nfa transitions
-        :return: set of tuples of reachable states
+        :return: list of tuples of reachable states, in alphabet order and without duplicates
         '''
-        next_states = set()
+        next_states = []
+        start_state_tuple = tuple(sorted(states))
 
-        for letter in transition_letters:
-            states_possible_from_this_letter = set()
+        for letter in self.alphabet:
+            if letter not in transition_letters:
+                continue
+            transitionable_states_on_this_letter = set()
 
             for state in states:
-                transitionable_states_on_this_letter = self.nfa.delta_transition[tuple([state, letter])]
+                transitionable_states_on_this_letter.update(self.nfa.delta_transition[tuple([state, letter])])
 
-                for transitionable_state in transitionable_states_on_this_letter:
-                    epsilon_states = self.nfa.get_epsilon_closure(transitionable_state)
-                    #states_possible_from_this_letter.add(transitionable_state)
-                    states_possible_from_this_letter.update(epsilon_states)
+            if self.profile is None:
+                states_possible_from_this_letter = self.nfa.get_set_epsilon_closure(transitionable_states_on_this_letter)
+            else:
+                start_time = time.perf_counter()
+                states_possible_from_this_letter = self.nfa.get_set_epsilon_closure(transitionable_states_on_this_letter)
+                self.profile.add_time("closure", time.perf_counter() - start_time)
+                self.profile.count("closure_calls")
 
-
-            start_state_tuple = tuple(sorted(states))
-            #states_possible_from_this_letter = makeStateSetToTuple(states_possible_from_this_letter)
             end_state_tuple = tuple(sorted(states_possible_from_this_letter))
 
             state_letter_tuple = tuple([start_state_tuple, letter])
 
             self.delta_transition[state_letter_tuple] = end_state_tuple
 
-            next_states.add(end_state_tuple)
+            if end_state_tuple not in next_states:
+                next_states.append(end_state_tuple)
 
         return next_states
     
@@ -119,10 +562,15 @@ class DFA:
                         states_letters_needing_null.append([state, letter])
 
         if needNullState:
-            self.states.add("Null set")
+            self.states.add(NULL_STATE)
+            self.state_order.append(NULL_STATE)
 
             for letter in self.alphabet:
-                self.delta_transition[tuple(["Null set", letter])] = tuple(["Null set"])
+                self.delta_transition[tuple([NULL_STATE, letter])] = tuple([NULL_STATE])
 
             for element in states_letters_needing_null:
-                self.delta_transition[tuple([element[0], element[1]])] = tuple(["Null set"])
\ No newline at end of file
+                self.delta_transition[tuple([element[0], element[1]])] = tuple([NULL_STATE])
+
+            if self.profile is not None:
+                self.profile.subset_created(NULL_STATE, 0)
+                self.profile.count("transitions_emitted", len(self.alphabet) + len(states_letters_needing_null))
\ No newline at end of file
@@ -0,0 +1,201 @@
+import hashlib
+import os
+
+from binary_format import load_dfa, save_dfa
+from dfa import DFA
+
+DEFAULT_DIRECTORY = ".dfa_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# changes whenever the canonical form below changes, so old entries are never read with a new meaning
+HASH_VERSION = "nfa-v2"
+ENTRY_SUFFIX = ".dfa"
+
+
+def canonical_nfa_hash(nfa):
+    '''
+    Hashes an NFA so that two NFAs with the same states, alphabet, transitions, initial state and accepting
+    states hash alike, whatever order the sets and dicts were filled in. The alphabet is hashed in its own
+    order, which is the column order of the DFA, so a cached DFA always has the letters of the NFA it is
+    looked up for in the same order. Duplicate targets and empty target lists do not change the hash. States
+    are not renamed, so isomorphic NFAs can hash differently.
+    :param nfa: NFA to hash
+    :return: hex SHA-256 digest
+    '''
+    transitions = []
+    for (state, symbol), targets in nfa.delta_transition.items():
+        if len(targets) > 0:
+            transitions.append((state, canonical_key(symbol), sorted(set(targets), key=canonical_key)))
+    transitions.sort(key=lambda transition: (canonical_key(transition[0]), transition[1]))
+
+    canonical = (
+        HASH_VERSION,
+        sorted(nfa.states, key=canonical_key),
+        list(nfa.alphabet),
+        transitions,
+        nfa.initial_state,
+        sorted(nfa.accepting_states, key=canonical_key),
+    )
+    return hashlib.sha256(repr(canonical).encode()).hexdigest()
+
+
+def canonical_key(value):
+    '''
+    Sort key that orders ints before strings such as "epsilon", so mixed lists can be sorted
+    :param value: state or symbol
+    :return: sortable key
+    '''
+    return (isinstance(value, str), value)
+
+
+class DeterminizationCache:
+    '''
+    Keeps the DFAs of NFAs in a directory, one binary_format file per NFA named after its canonical hash,
+    so an NFA that was determinized before, in this process or an earlier one, is loaded instead of built.
+    When the files take more than max_bytes, the least recently used ones are deleted. Entries are written
+    to a temporary file and renamed into place, so processes can share one directory.
+    '''
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, engine="tuple", order="bfs"):
+        '''
+        :param directory: where the entries live, created when missing
+        :param max_bytes: total size of entries above which old entries are evicted
+        :param engine: engine used by DFA on a miss
+        :param order: exploration order used by DFA on a miss
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.engine = engine
+        self.order = order
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_entry_path(self, nfa):
+        '''
+        :param nfa: NFA to look up
+        :return: path of the entry for the NFA; the engine and order are part of the name
+        '''
+        name = canonical_nfa_hash(nfa) + "-" + self.engine + "-" + self.order + ENTRY_SUFFIX
+        return os.path.join(self.directory, name)
+
+    def get(self, nfa):
+        '''
+        :param nfa: NFA to look up
+        :return: CompiledDFA of the NFA mapped from its entry, or None on a miss. An entry that cannot be
+        read, such as an empty or truncated file left by a process that died while writing, is a miss and
+        is deleted.
+        '''
+        path = self.get_entry_path(nfa)
+        try:
+            compiled_dfa = load_dfa(path)
+            # the access time is not reliable on all file systems, so the modification time marks use
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, OSError):
+            self.misses += 1
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            return None
+        self.hits += 1
+        return compiled_dfa
+
+    def put(self, nfa, dfa):
+        '''
+        Stores the DFA of an NFA, then evicts old entries if the cache is over its size limit
+        :param nfa: NFA the DFA was built from
+        :param dfa: DFA or CompiledDFA
+        :return: Void
+        '''
+        path = self.get_entry_path(nfa)
+        temporary_path = path + "." + str(os.getpid()) + ".tmp"
+        save_dfa(dfa, temporary_path)
+        os.replace(temporary_path, path)
+        self.evict(path)
+
+    def determinize(self, nfa, budget=None, profile=None):
+        '''
+        Cached stand-in for DFA(nfa, engine, order, budget=budget, profile=profile)
+        :param nfa: NFA to determinize
+        :param budget: ConstructionBudget for a miss; partial DFAs are not stored
+        :param profile: ConstructionProfile for a miss; a hit runs no construction and records nothing
+        :return: DFA, built from the cached transition table on a hit. It keeps the engine and order of the
+        cache, so DFA.update works on it as on a miss and rebuilds it where the subset engine would be needed.
+        '''
+        compiled_dfa = self.get(nfa)
+        if compiled_dfa is not None:
+            dfa = DFA.from_transition_table(compiled_dfa.to_transition_table(), nfa)
+            dfa.engine = self.engine
+            dfa.order = self.order
+            return dfa
+        dfa = DFA(nfa, engine=self.engine, order=self.order, budget=budget, profile=profile)
+        if dfa.complete:
+            self.put(nfa, dfa)
+        return dfa
+
+    def get_entries(self):
+        '''
+        :return: list of (modification time, size in bytes, path) of the entries
+        '''
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    status = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, entry.path))
+        return entries
+
+    def size_in_bytes(self):
+        '''
+        :return: total size of the entries
+        '''
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self, keep_path=None):
+        '''
+        Deletes the least recently used entries until the cache fits in max_bytes
+        :param keep_path: entry that must stay, the one just written
+        :return: Void
+        '''
+        entries = sorted(self.get_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        '''
+        Deletes every entry
+        :return: Void
+        '''
+        for _, _, path in self.get_entries():
+            os.remove(path)
+
+    def get_statistics(self):
+        '''
+        :return: dict of cache counters
+        '''
+        entries = self.get_entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
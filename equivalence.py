@@ -0,0 +1,242 @@
+from collections import deque
+
+from compiled_dfa import CompiledDFA
+from nfa import NFA
+from subset_engine import NFABitIndex
+
+
+class SubsetView:
+    '''
+    An NFA seen as the DFA of its subsets, built only as far as a check walks it. States are bitmasks of
+    NFA states, as in BitsetSubsetEngine, and the empty mask is the sink letters outside the NFA's
+    alphabet lead to.
+    '''
+    def __init__(self, nfa, alphabet):
+        '''
+        :param nfa: NFA
+        :param alphabet: letters of the check, a superset of the NFA's
+        '''
+        self.index = NFABitIndex(nfa)
+        # an NFA without states has no initial state, and starts from the empty mask, which rejects everything
+        self.initial_mask = self.index.initial_mask() if len(nfa.states) > 0 else 0
+        letter_indexes = {letter: letter_index for letter_index, letter in enumerate(self.index.alphabet)}
+        self.letter_indexes = [letter_indexes.get(letter, -1) for letter in alphabet]
+
+    def initial(self):
+        return self.initial_mask
+
+    def step(self, mask, letter_position):
+        letter_index = self.letter_indexes[letter_position]
+        if letter_index < 0:
+            return 0
+        return self.index.step(mask, letter_index)
+
+    def is_accepting(self, mask):
+        return mask & self.index.accepting_mask != 0
+
+    def members(self, mask):
+        '''
+        :return: the single NFA states of a mask, as one bit masks
+        '''
+        while mask:
+            low_bit = mask & -mask
+            yield low_bit
+            mask ^= low_bit
+
+    def new_antichain(self):
+        return []
+
+    def add_to_antichain(self, antichain, mask):
+        '''
+        Adds a subset to a list of pairwise incomparable subsets, dropping the ones that contain it
+        :param antichain: list of masks
+        :param mask: subset to add
+        :return: whether it was added, which it is not when one of its subsets is already there
+        '''
+        for seen in antichain:
+            if seen & ~mask == 0:
+                return False
+        antichain[:] = [seen for seen in antichain if mask & ~seen != 0]
+        antichain.append(mask)
+        return True
+
+
+class TableView:
+    '''
+    A CompiledDFA with the same methods as SubsetView. States are ids, and one more id past the last
+    state is the sink letters outside the DFA's alphabet lead to.
+    '''
+    def __init__(self, compiled_dfa, alphabet):
+        '''
+        :param compiled_dfa: CompiledDFA
+        :param alphabet: letters of the check, a superset of the DFA's
+        '''
+        self.flat_transitions = compiled_dfa.get_flat_transitions()
+        self.accepting = compiled_dfa.accepting.tolist()
+        self.letter_count = compiled_dfa.letter_count
+        self.sink = compiled_dfa.state_count()
+        self.start = compiled_dfa.start if compiled_dfa.start >= 0 else self.sink
+        self.columns = [compiled_dfa.symbol_index.get(letter, -1) for letter in alphabet]
+
+    def initial(self):
+        return self.start
+
+    def step(self, state, letter_position):
+        column = self.columns[letter_position]
+        if state == self.sink or column < 0:
+            return self.sink
+        return self.flat_transitions[state * self.letter_count + column]
+
+    def is_accepting(self, state):
+        return state != self.sink and self.accepting[state]
+
+    def members(self, state):
+        return (state,)
+
+    def new_antichain(self):
+        return set()
+
+    def add_to_antichain(self, antichain, state):
+        '''
+        Subsets of a DFA are single states, so the antichain is the set of states seen
+        :return: whether the state was added
+        '''
+        if state in antichain:
+            return False
+        antichain.add(state)
+        return True
+
+
+def get_views(left, right):
+    '''
+    :param left: NFA, DFA or CompiledDFA
+    :param right: NFA, DFA or CompiledDFA
+    :return: (alphabet, view of left, view of right), over the letters of both alphabets
+    '''
+    automata = []
+    for automaton in (left, right):
+        if not isinstance(automaton, (NFA, CompiledDFA)):
+            automaton = automaton.compile()
+        automata.append(automaton)
+    alphabet = list(automata[0].alphabet)
+    known = set(alphabet)
+    alphabet += [letter for letter in automata[1].alphabet if letter not in known]
+    views = [SubsetView(automaton, alphabet) if isinstance(automaton, NFA) else TableView(automaton, alphabet)
+             for automaton in automata]
+    return alphabet, views[0], views[1]
+
+
+def get_word(alphabet, parents, position):
+    '''
+    :param alphabet: letters of the check
+    :param parents: list of (parent position, letter position) of every pair, (-1, -1) for the first ones
+    :param position: pair the word leads to
+    :return: list of letters leading to the pair
+    '''
+    word = []
+    while parents[position][0] >= 0:
+        position, letter_position = parents[position]
+        word.append(alphabet[letter_position])
+    word.reverse()
+    return word
+
+
+def find_counterexample(left, right):
+    '''
+    Checks two automata for language equivalence with Hopcroft and Karp's algorithm: pairs of states are
+    walked breadth first from the pair of initial states, and a union-find of the states of both tells
+    when a pair is already known to be equivalent, so every state is merged at most once. NFAs are
+    determinized on the fly and only as far as the walk goes, which stops at the first pair where one
+    side accepts and the other does not.
+    :param left: NFA, DFA or CompiledDFA
+    :param right: NFA, DFA or CompiledDFA, over the same alphabet or another one
+    :return: a word, as a list of letters, accepted by exactly one of them, or None when they are equivalent
+    '''
+    alphabet, left_view, right_view = get_views(left, right)
+    # left states are kept as even and right states as odd elements, so both sides share one union-find
+    parent = {}
+
+    def find(element):
+        root = element
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while element != root:
+            parent[element], element = root, parent[element]
+        return root
+
+    pairs = [(left_view.initial(), right_view.initial())]
+    parents = [(-1, -1)]
+    queue = deque([0])
+    parent[pairs[0][0] * 2] = pairs[0][1] * 2 + 1
+    while queue:
+        position = queue.popleft()
+        left_state, right_state = pairs[position]
+        if left_view.is_accepting(left_state) != right_view.is_accepting(right_state):
+            return get_word(alphabet, parents, position)
+        for letter_position in range(len(alphabet)):
+            next_left = left_view.step(left_state, letter_position)
+            next_right = right_view.step(right_state, letter_position)
+            left_root = find(next_left * 2)
+            right_root = find(next_right * 2 + 1)
+            if left_root != right_root:
+                parent[left_root] = right_root
+                pairs.append((next_left, next_right))
+                parents.append((position, letter_position))
+                queue.append(len(pairs) - 1)
+    return None
+
+
+def are_equivalent(left, right):
+    '''
+    :return: whether two NFAs, DFAs or CompiledDFAs accept the same language, see find_counterexample
+    '''
+    return find_counterexample(left, right) is None
+
+
+def find_inclusion_counterexample(small, large):
+    '''
+    Checks that every word small accepts is accepted by large, without determinizing small and only
+    determinizing large as far as needed. Pairs of one state of small and one subset of large are walked
+    breadth first; a pair whose small state accepts while its subset does not is a counterexample. A pair
+    is skipped when a pair with the same small state and a subset of its subset was seen, since every word
+    that leads the larger subset to reject leads the smaller one to reject as well. The pairs kept per
+    small state therefore form an antichain of incomparable subsets.
+    :param small: NFA, DFA or CompiledDFA
+    :param large: NFA, DFA or CompiledDFA
+    :return: a word, as a list of letters, that small accepts and large rejects, or None when there is none
+    '''
+    alphabet, small_view, large_view = get_views(small, large)
+    antichains = {}
+    pairs = []
+    parents = []
+    queue = deque()
+
+    def add(state, subset, parent_position, letter_position):
+        antichain = antichains.get(state)
+        if antichain is None:
+            antichain = antichains[state] = large_view.new_antichain()
+        if large_view.add_to_antichain(antichain, subset):
+            pairs.append((state, subset))
+            parents.append((parent_position, letter_position))
+            queue.append(len(pairs) - 1)
+
+    large_initial = large_view.initial()
+    for state in small_view.members(small_view.initial()):
+        add(state, large_initial, -1, -1)
+    while queue:
+        position = queue.popleft()
+        state, subset = pairs[position]
+        if small_view.is_accepting(state) and not large_view.is_accepting(subset):
+            return get_word(alphabet, parents, position)
+        for letter_position in range(len(alphabet)):
+            next_subset = large_view.step(subset, letter_position)
+            for next_state in small_view.members(small_view.step(state, letter_position)):
+                add(next_state, next_subset, position, letter_position)
+    return None
+
+
+def is_included(small, large):
+    '''
+    :return: whether every word small accepts is accepted by large, see find_inclusion_counterexample
+    '''
+    return find_inclusion_counterexample(small, large) is None
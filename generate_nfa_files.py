@@ -1,9 +1,15 @@
 import random
 import os
 
-def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3):
+import numpy as np
+
+from binary_format import save_nfa
+from compact_nfa import CompactNFA
+
+def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3, rng=random):
     """
     Generate an NFA with better connectivity to demonstrate exponential DFA growth.
+    Pass rng=random.Random(seed) to get the same NFA on every run.
     
     Key improvements:
     1. Scale transition count with state count
@@ -16,7 +22,7 @@ def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3):
     # Generate states
     states = list(range(1, n_states + 1))
     initial_state = states[0]
-    accepting_states = random.sample(states, k=max(1, n_states // 3))
+    accepting_states = rng.sample(states, k=max(1, n_states // 3))
 
     # Write basic NFA structure
     lines.append("states: " + ",".join(map(str, states)))
@@ -45,12 +51,12 @@ def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3):
     # IMPROVEMENT 2: Create a spanning tree of states to ensure connectivity
     # This guarantees all states are reachable from the initial state
     while unreached_states:
-        from_state = random.choice(list(reachable_states))
-        to_state = random.choice(list(unreached_states))
+        from_state = rng.choice(list(reachable_states))
+        to_state = rng.choice(list(unreached_states))
         
         # Randomly choose either a regular or epsilon transition
-        use_epsilon = random.random() < epsilon_density
-        symbol = "epsilon" if use_epsilon else random.choice(alphabet)
+        use_epsilon = rng.random() < epsilon_density
+        symbol = "epsilon" if use_epsilon else rng.choice(alphabet)
         
         transition_key = (from_state, symbol)
         if transition_key in transitions:
@@ -64,19 +70,19 @@ def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3):
     # IMPROVEMENT 3: Add additional transitions to create non-determinism
     # The number of additional transitions scales with the state count
     # This creates the potential for exponential behavior
-    additional_transitions = n_states + random.randint(n_states // 2, n_states)
+    additional_transitions = n_states + rng.randint(n_states // 2, n_states)
     
     for _ in range(additional_transitions):
-        from_state = random.choice(states)
+        from_state = rng.choice(states)
         
         # Decide how many target states (non-determinism factor)
         # More states = more potential for non-determinism
-        target_count = random.randint(1, min(3, max(1, n_states // 5)))
-        to_states = random.sample(states, k=target_count)
+        target_count = rng.randint(1, min(3, max(1, n_states // 5)))
+        to_states = rng.sample(states, k=target_count)
         
         # Choose between epsilon and regular transitions
-        use_epsilon = random.random() < epsilon_density
-        symbol = "epsilon" if use_epsilon else random.choice(alphabet)
+        use_epsilon = rng.random() < epsilon_density
+        symbol = "epsilon" if use_epsilon else rng.choice(alphabet)
         
         transition_key = (from_state, symbol)
         if transition_key in transitions:
@@ -86,18 +92,18 @@ def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3):
     
     # IMPROVEMENT 4: Add cycles to create more complex DFA behavior
     # Cycles significantly increase DFA state count
-    cycle_count = random.randint(1, max(1, n_states // 3))
+    cycle_count = rng.randint(1, max(1, n_states // 3))
     for _ in range(cycle_count):
-        cycle_length = random.randint(2, min(5, n_states))
-        cycle_states = random.sample(states, k=cycle_length)
+        cycle_length = rng.randint(2, min(5, n_states))
+        cycle_states = rng.sample(states, k=cycle_length)
         
         for i in range(cycle_length):
             from_state = cycle_states[i]
             to_state = cycle_states[(i + 1) % cycle_length]
             
             # Choose between epsilon and regular transitions
-            use_epsilon = random.random() < epsilon_density
-            symbol = "epsilon" if use_epsilon else random.choice(alphabet)
+            use_epsilon = rng.random() < epsilon_density
+            symbol = "epsilon" if use_epsilon else rng.choice(alphabet)
             
             transition_key = (from_state, symbol)
             if transition_key in transitions:
@@ -112,23 +118,128 @@ def generate_improved_nfa(n_states, alphabet=[0, 1], epsilon_density=0.3):
 
     return "\n".join(lines)
 
-# Create directory for improved generated NFAs
-output_dir = "improved_nfas"
-os.makedirs(output_dir, exist_ok=True)
+def generate_compact_nfa(n_states, alphabet=(0, 1), epsilon_density=0.3, nondeterminism=3, cycles=True, seed=None):
+    """
+    Vectorized version of generate_improved_nfa for large NFAs: the same spanning tree, extra
+    nondeterministic transitions and cycles, drawn in bulk with NumPy instead of one random.choice
+    at a time. The same seed gives the same NFA on every run. About 4.5 transitions are made per
+    state, so 2 * 10^5 states give roughly 10^6 transitions in a second or two.
 
-# Generate a sequence of NFAs with gradually increasing size
-# Focus on smaller sizes first to clearly see the pattern
-# We use fewer, more strategic sizes to see the exponential pattern clearly
+    :param n_states: number of states, named 1..n_states with 1 the initial state
+    :param alphabet: letters, ints
+    :param epsilon_density: chance that a transition is an epsilon transition
+    :param nondeterminism: most targets of one extra transition, also capped at n_states // 5
+    :param cycles: whether to add the short cycles of generate_improved_nfa
+    :param seed: seed of the NumPy generator, or None for a fresh one
+    :return: CompactNFA, see write_nfa_text and binary_format.save_nfa to write it
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = list(alphabet)
+    sources = []
+    targets = []
+    symbols = []
 
+    def pick_symbols(count):
+        # letters are 0..len(alphabet)-1, epsilon is len(alphabet)
+        picked = rng.integers(0, len(alphabet), size=count)
+        picked[rng.random(count) < epsilon_density] = len(alphabet)
+        return picked
 
+    # Spanning tree: states are reached in a random order, each from one reached before it, so every
+    # state is reachable from the initial state
+    reach_order = np.concatenate([[0], rng.permutation(np.arange(1, n_states))])
+    parents = reach_order[(rng.random(n_states - 1) * np.arange(1, n_states)).astype(np.int64)]
+    sources.append(parents)
+    targets.append(reach_order[1:])
+    symbols.append(pick_symbols(n_states - 1))
 
-for n in range(2,200):
-    # Variable epsilon density provides some randomness but keeps overall pattern
-    epsilon_density = random.uniform(0.3, 0.5)
-    
-    text = generate_improved_nfa(n, epsilon_density=epsilon_density)
-    
-    filepath = os.path.join(output_dir, f"nfa_{n}_states.txt")
-    with open(filepath, "w") as f:
-        f.write(text)
-    print(f"Generated {filepath}")
\ No newline at end of file
+    # Extra transitions, each from a random state to 1..max_targets random states on one symbol
+    extra_count = n_states + int(rng.integers(n_states // 2, n_states + 1))
+    max_targets = min(nondeterminism, max(1, n_states // 5))
+    target_counts = rng.integers(1, max_targets + 1, size=extra_count)
+    sources.append(np.repeat(rng.integers(0, n_states, size=extra_count), target_counts))
+    targets.append(rng.integers(0, n_states, size=int(target_counts.sum())))
+    symbols.append(np.repeat(pick_symbols(extra_count), target_counts))
+
+    # Cycles of 2 to 5 random states
+    if cycles and n_states >= 2:
+        cycle_count = int(rng.integers(1, max(1, n_states // 3) + 1))
+        lengths = rng.integers(2, min(5, n_states) + 1, size=cycle_count)
+        members = rng.integers(0, n_states, size=int(lengths.sum()))
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.arange(len(members))
+        following = np.where(positions + 1 - starts == np.repeat(lengths, lengths), starts, positions + 1)
+        sources.append(members)
+        targets.append(members[following])
+        symbols.append(pick_symbols(len(members)))
+
+    # Duplicate edges are dropped, as generate_improved_nfa does with its sets
+    symbol_count = len(alphabet) + 1
+    keys = np.unique((np.concatenate(sources) * symbol_count + np.concatenate(symbols)) * n_states + np.concatenate(targets))
+    edge_targets = keys % n_states
+    edge_symbols = keys // n_states % symbol_count
+    edge_sources = keys // n_states // symbol_count
+
+    if not np.any(edge_symbols == len(alphabet)):
+        symbol_count -= 1
+    chosen = [edge_symbols == j for j in range(symbol_count)]
+    accepting = np.sort(rng.choice(n_states, size=max(1, n_states // 3), replace=False))
+    return CompactNFA.from_edges(np.arange(1, n_states + 1, dtype=np.int64), alphabet + ["epsilon"][:symbol_count - len(alphabet)],
+                                 [edge_sources[mask] for mask in chosen], [edge_targets[mask] for mask in chosen], 0, accepting)
+
+def write_nfa_text(compact_nfa, file_path):
+    """
+    Writes a CompactNFA in the text format parse_nfa_file and load_compact_nfa read, one line per
+    state and symbol with transitions
+
+    :param compact_nfa: CompactNFA
+    :param file_path: where to write
+    """
+    names = [str(name) for name in compact_nfa.states.tolist()]
+    alphabet = [symbol for symbol in compact_nfa.symbols if symbol != "epsilon"]
+    with open(file_path, "w") as file:
+        file.write("states: " + ",".join(names) + "\n")
+        file.write("alphabet: " + ",".join(map(str, alphabet)) + "\n")
+        file.write("initial: " + (names[compact_nfa.initial] if compact_nfa.initial >= 0 else "") + "\n")
+        file.write("accepting: " + ",".join(names[state] for state in compact_nfa.accepting.tolist()))
+        for symbol, offsets, symbol_targets in zip(compact_nfa.symbols, compact_nfa.offsets, compact_nfa.targets):
+            offsets = offsets.tolist()
+            target_names = [names[target] for target in symbol_targets.tolist()]
+            prefix = "," + str(symbol) + " -> "
+            file.write("".join("\ntransition: " + names[state] + prefix + ",".join(target_names[offsets[state]:offsets[state + 1]])
+                               for state in range(len(names)) if offsets[state] < offsets[state + 1]))
+        file.write("\n")
+
+def write_generated_nfa(compact_nfa, file_path):
+    """
+    Writes a generated NFA, in the binary format when file_path ends in ".bin" and as text otherwise
+
+    :param compact_nfa: CompactNFA
+    :param file_path: where to write
+    """
+    if file_path.endswith(".bin"):
+        save_nfa(compact_nfa, file_path)
+    else:
+        write_nfa_text(compact_nfa, file_path)
+
+if __name__ == "__main__":
+    # Create directory for improved generated NFAs
+    output_dir = "improved_nfas"
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Generate a sequence of NFAs with gradually increasing size
+    # Focus on smaller sizes first to clearly see the pattern
+    # We use fewer, more strategic sizes to see the exponential pattern clearly
+
+
+
+    for n in range(2,200):
+        # Variable epsilon density provides some randomness but keeps overall pattern
+        epsilon_density = random.uniform(0.3, 0.5)
+
+        text = generate_improved_nfa(n, epsilon_density=epsilon_density)
+
+        filepath = os.path.join(output_dir, f"nfa_{n}_states.txt")
+        with open(filepath, "w") as f:
+            f.write(text)
+        print(f"Generated {filepath}")
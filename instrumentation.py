@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+COUNTERS = ("closure_calls", "subsets_created", "duplicate_hits", "transitions_emitted", "max_subset_size")
+
+
+class ConstructionProfile:
+    '''
+    Collects where the time of one DFA construction goes. Pass one to DFA(nfa, profile=...) to have the
+    engines time their phases and count what they do; without one the engines skip all of it.
+
+    Phases of the tuple engine are "closure" (epsilon closures), "possible_inputs", "next_states" (moving
+    over letters, without the closures), "dedup" (looking up and recording new subsets) and
+    "null_transitions" (the pass adding the "Null set" state). The bitset engine reports "index" (building
+    the bitmask index, closures included), "step" and "dedup"; the parallel engine "index" and "levels", and
+    the brzozowski engine a single "construction" phase.
+
+    An observer, when given, is called as observer(event, data) when a subset is created ("subset" with its
+    id and size) and when the construction ends ("finished" with the report).
+    '''
+    def __init__(self, observer=None):
+        '''
+        :param observer: callable taking (event name, dict), or None
+        '''
+        self.observer = observer
+        self.timers = defaultdict(float)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def add_time(self, phase, seconds):
+        '''
+        :param phase: name of the phase
+        :param seconds: time to add to it
+        :return: Void
+        '''
+        self.timers[phase] += seconds
+
+    def count(self, counter, amount=1):
+        '''
+        :param counter: one of COUNTERS
+        :param amount: how much to add
+        :return: Void
+        '''
+        self.counters[counter] += amount
+
+    def subset_created(self, subset_id, size):
+        '''
+        Counts a new subset, tracks the largest one and tells the observer
+        :param subset_id: id or name of the new DFA state
+        :param size: number of NFA states in it
+        :return: Void
+        '''
+        self.counters["subsets_created"] += 1
+        if size > self.counters["max_subset_size"]:
+            self.counters["max_subset_size"] = size
+        if self.observer is not None:
+            self.observer("subset", {"id": subset_id, "size": size})
+
+    def finish(self):
+        '''
+        Ends the construction and tells the observer
+        :return: the report
+        '''
+        report = self.get_report()
+        if self.observer is not None:
+            self.observer("finished", report)
+        return report
+
+    def get_report(self):
+        '''
+        :return: dict with "phases", seconds per phase, and "counters"
+        '''
+        return {"phases": dict(self.timers), "counters": dict(self.counters)}
+
@@ -0,0 +1,228 @@
+from array import array
+
+from subset_engine import NFABitIndex
+
+# Rough cost of one cached state besides its mask: dict entry, int objects and bookkeeping
+STATE_OVERHEAD_BYTES = 160
+TRANSITION_BYTES = 16
+
+
+class LazyDFA:
+    '''
+    Runs an NFA as a DFA whose states are only built when the input reaches them, in the style of RE2.
+    Subset states live in a fixed number of cache slots. When the cache is full, the CLOCK algorithm picks
+    a slot that was not used since the hand last passed it. Every slot carries a generation number, and a
+    cached transition is only followed when the generation it was recorded with still matches, so reusing
+    a slot never requires finding the transitions that point to it.
+
+    If the cache keeps missing during a run, building states costs more than it saves, and the rest of the
+    input is run directly on NFA state sets instead. accepts_many measures the same across its inputs, so
+    many short inputs that keep evicting each other fall back as well.
+    '''
+    def __init__(self, nfa, max_states=10000, max_memory_bytes=None, min_hit_rate=0.5):
+        '''
+        :param nfa: NFA to run
+        :param max_states: most subset states kept at once
+        :param max_memory_bytes: approximate limit on cache memory, lowers max_states when given
+        :param min_hit_rate: fraction of cache hits below which a run falls back to NFA simulation,
+        checked once the run has read as many letters as the cache has slots, and in accepts_many every
+        time the inputs together have made that many cache lookups
+        '''
+        self.index = NFABitIndex(nfa)
+        # an NFA without states has no initial state, and the empty mask rejects every input
+        self.initial_mask = self.index.initial_mask() if len(nfa.states) > 0 else 0
+        self.symbol_index = {letter: i for i, letter in enumerate(self.index.alphabet)}
+        self.letter_count = len(self.index.alphabet)
+        self.max_states = max(2, self.get_state_limit(max_states, max_memory_bytes))
+        self.min_hit_rate = min_hit_rate
+
+        self.slot_of_mask = {}
+        self.masks = []
+        self.accepting = bytearray()
+        self.generations = array("l")
+        self.referenced = bytearray()
+        self.targets = array("l")
+        self.target_generations = array("l")
+        self.hand = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fallbacks = 0
+
+    def get_state_limit(self, max_states, max_memory_bytes):
+        '''
+        :param max_states: state limit asked for
+        :param max_memory_bytes: memory limit asked for, or None
+        :return: number of cache slots that respects both limits
+        '''
+        if max_memory_bytes is None:
+            return max_states
+        bytes_per_state = len(self.index.order) // 8 + STATE_OVERHEAD_BYTES + TRANSITION_BYTES * self.letter_count
+        return min(max_states, max_memory_bytes // bytes_per_state)
+
+    def state_count(self):
+        '''
+        :return: number of subset states currently cached
+        '''
+        return len(self.slot_of_mask)
+
+    def get_slot(self, mask, protected=-1):
+        '''
+        Finds the cache slot of a subset, building the state if it is not cached
+        :param mask: bitmask of NFA states
+        :param protected: slot that must not be reused, the state the run is currently in
+        :return: slot id
+        '''
+        slot = self.slot_of_mask.get(mask)
+        if slot is not None:
+            return slot
+
+        if len(self.masks) < self.max_states:
+            slot = len(self.masks)
+            self.masks.append(mask)
+            self.accepting.append(0)
+            self.generations.append(0)
+            self.referenced.append(0)
+            self.targets.extend(array("l", [-1]) * self.letter_count)
+            self.target_generations.extend(array("l", [0]) * self.letter_count)
+        else:
+            slot = self.evict(protected)
+            self.masks[slot] = mask
+
+        self.slot_of_mask[mask] = slot
+        self.accepting[slot] = 1 if mask & self.index.accepting_mask else 0
+        self.referenced[slot] = 1
+        return slot
+
+    def evict(self, protected):
+        '''
+        Moves the CLOCK hand to the first slot that is not referenced, clearing reference bits on the way
+        :param protected: slot that must not be chosen
+        :return: the freed slot, with its transitions cleared and its generation increased
+        '''
+        referenced = self.referenced
+        while True:
+            slot = self.hand
+            self.hand = (self.hand + 1) % len(self.masks)
+            if slot == protected:
+                continue
+            if referenced[slot]:
+                referenced[slot] = 0
+                continue
+            break
+
+        del self.slot_of_mask[self.masks[slot]]
+        self.generations[slot] += 1
+        row_start = slot * self.letter_count
+        for position in range(row_start, row_start + self.letter_count):
+            self.targets[position] = -1
+        self.evictions += 1
+        return slot
+
+    def next_slot(self, slot, letter_index):
+        '''
+        Follows one transition, building it when it is not cached
+        :param slot: slot of the current state
+        :param letter_index: position of the letter in the alphabet
+        :return: slot of the next state
+        '''
+        position = slot * self.letter_count + letter_index
+        target = self.targets[position]
+        if target >= 0 and self.target_generations[position] == self.generations[target]:
+            self.hits += 1
+            self.referenced[target] = 1
+            return target
+
+        self.misses += 1
+        target = self.get_slot(self.index.step(self.masks[slot], letter_index), slot)
+        self.targets[position] = target
+        self.target_generations[position] = self.generations[target]
+        return target
+
+    def encode(self, word):
+        '''
+        :param word: iterable of letters
+        :return: list of letter indexes
+        '''
+        symbol_index = self.symbol_index
+        try:
+            return [symbol_index[letter] for letter in word]
+        except KeyError as error:
+            raise ValueError("Letter " + repr(error.args[0]) + " is not in the alphabet") from None
+
+    def accepts(self, word):
+        '''
+        Runs the lazy DFA over one input
+        :param word: iterable of letters
+        :return: whether the NFA accepts the input
+        '''
+        letters = self.encode(word)
+        slot = self.get_slot(self.initial_mask)
+        hits_before = self.hits
+        check_after = self.max_states
+
+        for position, letter_index in enumerate(letters):
+            slot = self.next_slot(slot, letter_index)
+            if position == check_after:
+                if self.hits - hits_before < self.min_hit_rate * (position + 1):
+                    self.fallbacks += 1
+                    return self.simulate(self.masks[slot], letters[position + 1:])
+                check_after *= 2
+        return bool(self.accepting[slot])
+
+    def simulate(self, mask, letters):
+        '''
+        Runs the rest of an input directly on NFA state sets, without touching the cache
+        :param mask: bitmask of the current NFA states
+        :param letters: remaining letter indexes
+        :return: whether the input is accepted
+        '''
+        step = self.index.step
+        for letter_index in letters:
+            if mask == 0:
+                return False
+            mask = step(mask, letter_index)
+        return bool(mask & self.index.accepting_mask)
+
+    def accepts_many(self, words):
+        '''
+        Runs the lazy DFA over many inputs. The hit rate is also measured over windows of the inputs, and
+        once a window that evicted states falls below min_hit_rate, the remaining inputs are simulated on
+        NFA state sets.
+        :param words: iterable of inputs
+        :return: list of bools, one per input, sharing one cache across the inputs
+        '''
+        results = []
+        simulating = False
+        window_hits = self.hits
+        window_lookups = self.hits + self.misses
+        window_evictions = self.evictions
+        for word in words:
+            if simulating:
+                results.append(self.simulate(self.initial_mask, self.encode(word)))
+                continue
+            results.append(self.accepts(word))
+            lookups = self.hits + self.misses - window_lookups
+            if lookups >= self.max_states:
+                # misses that only fill free slots are not thrashing
+                if self.evictions > window_evictions and self.hits - window_hits < self.min_hit_rate * lookups:
+                    self.fallbacks += 1
+                    simulating = True
+                window_hits = self.hits
+                window_lookups = self.hits + self.misses
+                window_evictions = self.evictions
+        return results
+
+    def get_statistics(self):
+        '''
+        :return: dict of cache counters
+        '''
+        return {
+            "cached_states": self.state_count(),
+            "max_states": self.max_states,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fallbacks": self.fallbacks,
+        }
@@ -44,6 +44,7 @@ def generate_automaton(n, output_dir):
 
     print(f"Automaton written to: {output_path}")
 
-# Generate automata for n from 2 to 10
-for n in range(2, 11):
-    generate_automaton(n, "max_nfa_output")
\ No newline at end of file
+if __name__ == "__main__":
+    # Generate automata for n from 2 to 10
+    for n in range(2, 11):
+        generate_automaton(n, "max_nfa_output")
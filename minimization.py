@@ -0,0 +1,238 @@
+from array import array
+from collections import defaultdict
+
+from nfa import NFA
+from subset_engine import BitsetSubsetEngine
+from transition_table import NULL_STATE, TransitionTable
+
+
+class RefinablePartition:
+    '''
+    Partition of the states 0..n-1 kept in flat arrays. The states of a block sit next to each other in
+    elements, between first[block] and end[block]. Marked states of a block are moved to its front, so a
+    block can be split in time proportional to the number of marked states.
+    '''
+    def __init__(self, state_count):
+        self.elements = array("l", range(state_count))
+        self.location = array("l", range(state_count))
+        self.block_of = array("l", [0]) * state_count
+        self.first = [0]
+        self.end = [state_count]
+        self.marked = [0]
+        self.touched = []
+
+    def block_count(self):
+        '''
+        :return: number of blocks
+        '''
+        return len(self.first)
+
+    def members(self, block):
+        '''
+        :param block: id of a block
+        :return: copy of the states in the block
+        '''
+        return self.elements[self.first[block]:self.end[block]]
+
+    def mark(self, state):
+        '''
+        Moves a state to the marked front part of its block. Marking a state twice does nothing.
+        :param state: state to mark
+        :return: Void
+        '''
+        block = self.block_of[state]
+        position = self.location[state]
+        marked_end = self.first[block] + self.marked[block]
+        if position < marked_end:
+            return
+        elements = self.elements
+        other = elements[marked_end]
+        elements[position] = other
+        self.location[other] = position
+        elements[marked_end] = state
+        self.location[state] = marked_end
+        if self.marked[block] == 0:
+            self.touched.append(block)
+        self.marked[block] += 1
+
+    def split_touched(self):
+        '''
+        Splits every block with marked states into its marked and unmarked parts. The smaller part
+        becomes the new block, so every state changes block at most log(n) times.
+        :return: list of (old block, new block) pairs
+        '''
+        splits = []
+        first = self.first
+        end = self.end
+        marked = self.marked
+        for block in self.touched:
+            marked_count = marked[block]
+            marked[block] = 0
+            if marked_count == end[block] - first[block]:
+                continue
+            new_block = len(first)
+            middle = first[block] + marked_count
+            if marked_count <= end[block] - middle:
+                first.append(first[block])
+                end.append(middle)
+                first[block] = middle
+            else:
+                first.append(middle)
+                end.append(end[block])
+                end[block] = middle
+            marked.append(0)
+            block_of = self.block_of
+            for position in range(first[new_block], end[new_block]):
+                block_of[self.elements[position]] = new_block
+            splits.append((block, new_block))
+        self.touched = []
+        return splits
+
+
+def hopcroft_minimize(transition_table):
+    '''
+    Merges equivalent states of a complete DFA with Hopcroft's partition refinement, which runs in
+    O(n * |alphabet| * log n). Every state is assumed to be reachable, which holds for subset construction.
+    :param transition_table: TransitionTable of the DFA
+    :return: TransitionTable of the minimal DFA. Its states are numbered in breadth first order from the
+    initial state and named by that number, except the state accepting nothing, named "Null set", see get_minimal_labels.
+    '''
+    state_count = transition_table.state_count()
+    letter_count = transition_table.letter_count
+    if state_count == 0:
+        return TransitionTable(transition_table.alphabet)
+
+    partition = RefinablePartition(state_count)
+    for state, accepting in enumerate(transition_table.accepting):
+        if accepting:
+            partition.mark(state)
+    splits = partition.split_touched()
+
+    # Only the smaller half of the accepting / non-accepting split is needed as a splitter
+    worklist = [(new_block, letter_index) for _, new_block in splits for letter_index in range(letter_count)]
+    if len(worklist) > 0:
+        offsets, sources = transition_table.build_inverse()
+
+    while worklist:
+        splitter, letter_index = worklist.pop()
+        letter_offsets = offsets[letter_index]
+        letter_sources = sources[letter_index]
+        for target in partition.members(splitter):
+            for position in range(letter_offsets[target], letter_offsets[target + 1]):
+                partition.mark(letter_sources[position])
+        for _, new_block in partition.split_touched():
+            for other_letter in range(letter_count):
+                worklist.append((new_block, other_letter))
+
+    return build_quotient(transition_table, partition)
+
+
+def build_quotient(transition_table, partition):
+    '''
+    Builds the DFA whose states are the blocks of a partition, numbered breadth first from the initial block
+    :param transition_table: TransitionTable the partition was computed on
+    :param partition: RefinablePartition compatible with the transitions
+    :return: TransitionTable of the quotient DFA
+    '''
+    block_of = partition.block_of
+    number_of_block = [-1] * partition.block_count()
+    representatives = []
+
+    initial_block = block_of[transition_table.initial]
+    number_of_block[initial_block] = 0
+    representatives.append(transition_table.initial)
+
+    table = array("l")
+    accepting = bytearray()
+    position = 0
+    while position < len(representatives):
+        representative = representatives[position]
+        for next_state in transition_table.row(representative):
+            next_block = block_of[next_state]
+            if number_of_block[next_block] == -1:
+                number_of_block[next_block] = len(representatives)
+                representatives.append(partition.elements[partition.first[next_block]])
+            table.append(number_of_block[next_block])
+        accepting.append(transition_table.accepting[representative])
+        position += 1
+
+    quotient = TransitionTable(transition_table.alphabet, table, accepting, 0)
+    quotient.labels = get_minimal_labels(quotient)
+    return quotient
+
+
+def get_minimal_labels(transition_table):
+    '''
+    Names the states of a minimal DFA by their number, except the state accepting nothing, if there is
+    one, which is named "Null set" like the sink of subset construction. A minimal DFA has at most one
+    such state, and it is the only rejecting state whose transitions all lead back to itself. Both
+    minimizations name their states this way, so they give the same table for the same language.
+    :param transition_table: TransitionTable of a minimal DFA
+    :return: list of labels, one per state
+    '''
+    labels = list(range(transition_table.state_count()))
+    for state_id in labels:
+        if not transition_table.accepting[state_id] and all(next_id == state_id for next_id in transition_table.row(state_id)):
+            labels[state_id] = NULL_STATE
+            break
+    return labels
+
+
+def reverse_nfa(nfa):
+    '''
+    Builds the NFA of the reversed language. States are renamed to 0..n-1 in sorted order. The reversed
+    NFA starts from every old accepting state at once, so it has no single initial state.
+    :param nfa: NFA to reverse
+    :return: (reversed NFA, list of its initial states)
+    '''
+    order = set(nfa.states)
+    for targets in nfa.delta_transition.values():
+        order.update(targets)
+    position = {state: i for i, state in enumerate(sorted(order))}
+
+    delta_transition = defaultdict(list)
+    for (state, symbol), targets in nfa.delta_transition.items():
+        for target in targets:
+            delta_transition[(position[target], symbol)].append(position[state])
+    initial_states = sorted(position[state] for state in nfa.accepting_states if state in position)
+
+    reversed_nfa = NFA(set(position.values()), delta_transition, None, {position[nfa.initial_state]}, list(nfa.alphabet))
+    return reversed_nfa, initial_states
+
+
+def reverse_transition_table(transition_table):
+    '''
+    Builds the NFA of the reversed language of a DFA, DFA state i becomes NFA state i
+    :param transition_table: TransitionTable of the DFA
+    :return: (reversed NFA, list of its initial states)
+    '''
+    state_count = transition_table.state_count()
+    alphabet = transition_table.alphabet
+    delta_transition = defaultdict(list)
+    for state_id in range(state_count):
+        for letter, next_id in zip(alphabet, transition_table.row(state_id)):
+            delta_transition[(next_id, letter)].append(state_id)
+    initial_states = [i for i in range(state_count) if transition_table.accepting[i]]
+
+    reversed_nfa = NFA(set(range(state_count)), delta_transition, None, {transition_table.initial}, list(alphabet))
+    return reversed_nfa, initial_states
+
+
+def brzozowski_minimize(nfa):
+    '''
+    Builds the minimal DFA of an NFA directly with Brzozowski's algorithm: reverse, determinize, reverse,
+    determinize. Determinizing the reverse of a DFA whose states are all reachable yields a minimal DFA,
+    so no refinement pass is needed.
+    :param nfa: NFA to determinize
+    :return: TransitionTable of the minimal DFA, named like the output of hopcroft_minimize
+    '''
+    if len(nfa.states) == 0:
+        return TransitionTable(nfa.alphabet)
+    reversed_nfa, initial_states = reverse_nfa(nfa)
+    reversed_dfa = BitsetSubsetEngine(reversed_nfa, initial_states=initial_states).run()
+    reversed_nfa, initial_states = reverse_transition_table(reversed_dfa)
+    minimal = BitsetSubsetEngine(reversed_nfa, initial_states=initial_states).run()
+
+    minimal_table = TransitionTable(minimal.alphabet, minimal.table, minimal.accepting, minimal.initial)
+    minimal_table.labels = get_minimal_labels(minimal_table)
+    return minimal_table
@@ -1,28 +1,295 @@
+from collections import defaultdict
+
+
+class EpsilonClosureIndex:
+    '''
+    Epsilon closures of every NFA state, computed once. The epsilon graph is split into strongly
+    connected components with Tarjan's algorithm; all states of a component share one closure, and
+    each component's closure is its own states plus the closures of the components it points to.
+    '''
+    def __init__(self, nfa):
+        self.epsilon_edges = defaultdict(list)
+        self.nodes = set(nfa.states)
+        for (state, symbol), targets in nfa.delta_transition.items():
+            if len(targets) == 0:
+                continue
+            self.nodes.add(state)
+            self.nodes.update(targets)
+            if symbol == "epsilon":
+                self.epsilon_edges[state].extend(targets)
+
+        # components are listed in reverse topological order: a component comes after every
+        # component it can reach through epsilon transitions
+        self.components = []
+        self.component_of = {}
+        self.closures = {}
+        self.find_components()
+
+    def find_components(self):
+        '''
+        Iterative Tarjan's algorithm over the epsilon graph, filling components, component_of and closures
+        :return: Void
+        '''
+        epsilon_edges = self.epsilon_edges
+        order_of = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+
+        for root in sorted(self.nodes):
+            if root in order_of:
+                continue
+            order_of[root] = lowlink[root] = len(order_of)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(epsilon_edges.get(root, ())))]
+
+            while work:
+                node, children = work[-1]
+                descended = False
+                for child in children:
+                    if child not in order_of:
+                        order_of[child] = lowlink[child] = len(order_of)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(epsilon_edges.get(child, ()))))
+                        descended = True
+                        break
+                    if child in on_stack and order_of[child] < lowlink[node]:
+                        lowlink[node] = order_of[child]
+                if descended:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == order_of[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    self.add_component(members)
+
+    def add_component(self, members):
+        '''
+        Records a finished component. Every component it reaches is already finished, so its closure is known.
+        :param members: NFA states of the component
+        :return: Void
+        '''
+        component = len(self.components)
+        self.components.append(tuple(sorted(members)))
+        closure = set(members)
+        for member in members:
+            self.component_of[member] = component
+        for member in members:
+            for target in self.epsilon_edges.get(member, ()):
+                if self.component_of[target] != component:
+                    closure.update(self.closures[target])
+        closure = frozenset(closure)
+        for member in members:
+            self.closures[member] = closure
+
+    def get_closure(self, state):
+        '''
+        :param state: NFA state
+        :return: frozenset of states reachable from state through epsilon transitions, including state
+        '''
+        closure = self.closures.get(state)
+        if closure is None:
+            return frozenset([state])
+        return closure
+
+
 class NFA:
+    __slots__ = ("states", "delta_transition", "initial_state", "accepting_states", "alphabet", "closure_index")
+
     def __init__(self, states, delta_transition, initial_state, accepting_states, alphabet):
             self.states = states
             self.delta_transition = delta_transition
             self.initial_state = initial_state
             self.accepting_states = accepting_states
             self.alphabet = alphabet
-            
+            self.closure_index = None
+
+    def get_closure_index(self):
+        '''
+        Builds the epsilon closure index the first time it is needed
+        :return: EpsilonClosureIndex of this NFA
+        '''
+        if self.closure_index is None:
+            self.closure_index = EpsilonClosureIndex(self)
+        return self.closure_index
+
+    def invalidate_closure_index(self):
+        '''
+        Drops the epsilon closure index. Call after changing delta_transition or states by hand.
+        :return: Void
+        '''
+        self.closure_index = None
+
+    def add_transition(self, state, symbol, target):
+        '''
+        Adds the transition from state to target on symbol, adding the states and the letter when they are new.
+        Epsilon edits and edits that add a state drop the epsilon closure index; other letter edits leave it valid.
+        :param state: source state
+        :param symbol: letter or "epsilon"
+        :param target: target state
+        :return: the edit, to pass to DFA.update
+        '''
+        targets = self.delta_transition.get((state, symbol))
+        if targets is None:
+            self.delta_transition[(state, symbol)] = [target]
+        elif target not in targets:
+            targets.append(target)
+        # the index has no component for a new state
+        if symbol == "epsilon" or state not in self.states or target not in self.states:
+            self.invalidate_closure_index()
+        self.states.add(state)
+        self.states.add(target)
+        if symbol != "epsilon" and symbol not in self.alphabet:
+            self.alphabet.append(symbol)
+        return ("transition", state, symbol)
+
+    def remove_transition(self, state, symbol, target):
+        '''
+        Removes the transition from state to target on symbol, if there is one. States and letters are kept.
+        :param state: source state
+        :param symbol: letter or "epsilon"
+        :param target: target state
+        :return: the edit, to pass to DFA.update
+        '''
+        targets = self.delta_transition.get((state, symbol))
+        if targets is not None and target in targets:
+            targets.remove(target)
+            if symbol == "epsilon":
+                self.invalidate_closure_index()
+        return ("transition", state, symbol)
+
+    def set_accepting(self, state, accepting=True):
+        '''
+        Makes a state accepting or not
+        :param state: state to change
+        :param accepting: whether the state accepts
+        :return: the edit, to pass to DFA.update
+        '''
+        if accepting:
+            self.accepting_states.add(state)
+        else:
+            self.accepting_states.discard(state)
+        return ("accepting", state)
+
     def get_epsilon_closure(self, state):
         '''
         Finds all states that can be achieved through epsilon transitions only. Includes the state given.
         :param state: The starting state
-        :return: set of states that can be achieved through epsilon transitions
-        '''
-        states = [state]
-        states_possible_through_epsilon = set()
-        states_possible_through_epsilon.add(state)
-        while len(states) > 0:
-            state_epsilon_tuple = tuple([states[0], "epsilon"])
-            states.pop(0)
-            epsilon_states = self.delta_transition[state_epsilon_tuple]
-
-            for epsilon_state in epsilon_states:
-                if epsilon_state not in states_possible_through_epsilon:
-                    states_possible_through_epsilon.add(epsilon_state)
-                    states.append(epsilon_state)
-
-        return states_possible_through_epsilon
\ No newline at end of file
+        :return: frozenset of states that can be achieved through epsilon transitions
+        '''
+        return self.get_closure_index().get_closure(state)
+
+    def get_set_epsilon_closure(self, states):
+        '''
+        Finds all states that can be achieved through epsilon transitions from any of the given states.
+        :param states: iterable of starting states
+        :return: frozenset of states that can be achieved through epsilon transitions, including the given states
+        '''
+        closure_index = self.get_closure_index()
+        closure = set()
+        seen_components = set()
+        for state in states:
+            component = closure_index.component_of.get(state)
+            if component is None:
+                closure.add(state)
+            elif component not in seen_components:
+                seen_components.add(component)
+                closure.update(closure_index.closures[state])
+        return frozenset(closure)
+
+    def remove_epsilon_transitions(self):
+        '''
+        Builds an equivalent NFA without epsilon transitions. Every strongly connected component of the
+        epsilon graph becomes a single state, named after its smallest member. A merged state moves on a
+        letter to the epsilon closure of everything its closure moves to, and accepts when its closure
+        contains an accepting state.
+        :return: new epsilon-free NFA
+        '''
+        closure_index = self.get_closure_index()
+        components = closure_index.components
+        component_of = closure_index.component_of
+        names = [members[0] for members in components]
+        accepting_states = set(self.accepting_states)
+
+        delta_transition = defaultdict(list)
+        new_accepting_states = set()
+        for component, members in enumerate(components):
+            name = names[component]
+            closure = closure_index.get_closure(members[0])
+            if not accepting_states.isdisjoint(closure):
+                new_accepting_states.add(name)
+            for letter in self.alphabet:
+                targets = set()
+                for state in closure:
+                    targets.update(self.delta_transition.get((state, letter), ()))
+                if len(targets) > 0:
+                    target_closure = self.get_set_epsilon_closure(targets)
+                    delta_transition[(name, letter)] = sorted({names[component_of[t]] for t in target_closure})
+
+        initial_state = self.initial_state
+        if initial_state in component_of:
+            initial_state = names[component_of[initial_state]]
+
+        return NFA(set(names), delta_transition, initial_state, new_accepting_states, list(self.alphabet))
+
+    def get_useful_states(self):
+        '''
+        Finds the states that can matter to the language: those reachable from the initial state, over
+        letters and epsilon transitions alike, and the reachable ones from which an accepting state can be
+        reached
+        :return: (set of reachable states, set of useful states)
+        '''
+        successors = defaultdict(list)
+        predecessors = defaultdict(list)
+        for (state, _), targets in self.delta_transition.items():
+            for target in targets:
+                successors[state].append(target)
+                predecessors[target].append(state)
+
+        reachable = {self.initial_state}
+        worklist = [self.initial_state]
+        while worklist:
+            for target in successors.get(worklist.pop(), ()):
+                if target not in reachable:
+                    reachable.add(target)
+                    worklist.append(target)
+
+        useful = reachable.intersection(self.accepting_states)
+        worklist = list(useful)
+        while worklist:
+            for source in predecessors.get(worklist.pop(), ()):
+                if source in reachable and source not in useful:
+                    useful.add(source)
+                    worklist.append(source)
+        return reachable, useful
+
+    def trim(self, useful_states=None):
+        '''
+        Builds an equivalent NFA holding only the useful states, so that subset construction never carries
+        states that cannot lead to acceptance. Transitions from and to the other states are dropped. The
+        initial state is always kept, without transitions when no input is accepted.
+        :param useful_states: the useful states when get_useful_states was already called, or None
+        :return: new NFA
+        '''
+        if useful_states is None:
+            useful_states = self.get_useful_states()[1]
+        delta_transition = defaultdict(list)
+        for (state, symbol), targets in self.delta_transition.items():
+            if state in useful_states:
+                kept_targets = [target for target in targets if target in useful_states]
+                if len(kept_targets) > 0:
+                    delta_transition[(state, symbol)] = kept_targets
+        return NFA(useful_states | {self.initial_state}, delta_transition, self.initial_state,
+                   {state for state in self.accepting_states if state in useful_states}, list(self.alphabet))
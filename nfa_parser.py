@@ -1,5 +1,22 @@
+import re
+import warnings
 from collections import defaultdict
 
+import numpy as np
+
+from compact_nfa import CompactNFA
+
+
+class NFAParseError(ValueError):
+    '''
+    Raised when an NFA file is malformed. Carries the file and the 1-based line number.
+    '''
+    def __init__(self, file_path, line_number, message):
+        self.file_path = file_path
+        self.line_number = line_number
+        ValueError.__init__(self, f"{file_path}:{line_number}: {message}")
+
+
 def parse_nfa_file(file_path):
     nfa_set_of_states = set()
     nfa_alphabet = []
@@ -30,14 +47,209 @@ def parse_nfa_file(file_path):
     return (nfa_set_of_states, nfa_alphabet, nfa_delta_transition,
             nfa_initial_state, nfa_accepting_states)
 
-# Example usage
-nfa_file = "sample_nfa.txt"
-(states, alphabet, transitions, initial, accepting) = parse_nfa_file(nfa_file)
-
-print("States:", states)
-print("Alphabet:", alphabet)
-print("Initial:", initial)
-print("Accepting:", accepting)
-print("Transitions:")
-for key, value in transitions.items():
-    print(f"  {key} -> {value}")
+
+def parse_int_list(text):
+    '''
+    :param text: comma separated ints, as bytes
+    :return: list of ints, empty for blank text
+    '''
+    if text.strip() == b"":
+        return []
+    return [int(token) for token in text.split(b",")]
+
+
+HEADER_KEYS = (b"states", b"alphabet", b"initial", b"accepting")
+# A header line, after leading white space, and any line that is not a transition line
+HEADER_PATTERN = re.compile(rb"^[^\S\n]*(" + b"|".join(HEADER_KEYS) + rb"):([^\n]*)", re.MULTILINE)
+OTHER_LINE_PATTERN = re.compile(rb"^(?![^\S\n]*transition:)[^\n]*", re.MULTILINE)
+
+# Markers the tokenizer puts in place of "->", line ends and "epsilon", so that a whole transition
+# section can be read by one NumPy number parse. State names and letters may not use these values.
+ARROW = np.iinfo(np.int64).min
+LINE_END = ARROW + 1
+EPSILON_ID = ARROW + 2
+
+
+def load_compact_nfa(file_path):
+    '''
+    Reads an NFA file into a CompactNFA. The file is read once and the few header lines are cut out.
+    All transition lines are then tokenized together: separators are swapped for marker numbers, one
+    NumPy parse turns the whole section into ints, and array operations split it into lines, so no
+    Python code runs per transition.
+    :param file_path: path of an NFA text file
+    :return: CompactNFA
+    :raises NFAParseError: on malformed lines, unknown symbols and unknown states
+    '''
+    with open(file_path, 'rb') as file:
+        data = file.read()
+
+    headers, body = split_headers(data)
+    for key in (b"states", b"alphabet"):
+        if key not in headers:
+            raise NFAParseError(file_path, 0, "missing '" + key.decode() + ":' line")
+    values = {}
+    for key, (line_number, value) in headers.items():
+        try:
+            values[key] = parse_int_list(value)
+        except ValueError as error:
+            raise NFAParseError(file_path, line_number, str(error)) from None
+
+    states = np.unique(np.array(values[b"states"], dtype=np.int64))
+    alphabet = values[b"alphabet"]
+    lines, sources, symbols, targets = tokenize_transitions(file_path, body)
+
+    symbol_list = list(alphabet)
+    if (symbols == EPSILON_ID).any():
+        symbol_list.append("epsilon")
+    symbol_ids = np.full(len(symbols), -1, dtype=np.int64)
+    symbol_ids[symbols == EPSILON_ID] = len(symbol_list) - 1
+    for j, letter in enumerate(alphabet):
+        symbol_ids[symbols == letter] = j
+    if (symbol_ids < 0).any():
+        position = int(np.flatnonzero(symbol_ids < 0)[0])
+        raise NFAParseError(file_path, int(lines[position]), "symbol " + str(int(symbols[position])) + " is not in the alphabet")
+
+    source_ids = to_state_ids(file_path, states, sources, lines)
+    target_ids = to_state_ids(file_path, states, targets, lines)
+    per_symbol_sources = [source_ids[symbol_ids == j] for j in range(len(symbol_list))]
+    per_symbol_targets = [target_ids[symbol_ids == j] for j in range(len(symbol_list))]
+
+    initial = -1
+    if len(values.get(b"initial", [])) > 0:
+        initial = int(to_state_ids(file_path, states, values[b"initial"][:1], [headers[b"initial"][0]])[0])
+    accepting_states = values.get(b"accepting", [])
+    accepting_lines = [headers.get(b"accepting", (0, b""))[0]] * len(accepting_states)
+    accepting = np.unique(to_state_ids(file_path, states, accepting_states, accepting_lines))
+    return CompactNFA.from_edges(states, symbol_list, per_symbol_sources, per_symbol_targets, initial, accepting)
+
+
+def split_headers(data):
+    '''
+    Finds the "states:", "alphabet:", "initial:" and "accepting:" lines, which may be indented like every
+    line parse_nfa_file strips. A key given twice keeps its last value. Every line that is not a
+    "transition:" line is blanked in the body, so headers, blank lines and anything else parse_nfa_file
+    skips are skipped here as well.
+    :param data: contents of an NFA file
+    :return: (dict of key to (line number, value), contents with the other lines blanked but line breaks kept)
+    '''
+    headers = {}
+    matches = list(HEADER_PATTERN.finditer(data))
+    for match in matches:
+        headers[match.group(1)] = (data.count(b"\n", 0, match.start()) + 1, match.group(2))
+
+    line_count = data.count(b"\n") + (0 if data.endswith(b"\n") else 1)
+    transition_line_count = data.count(b"\ntransition:") + data.startswith(b"transition:")
+    if transition_line_count + len(matches) < line_count:
+        return headers, OTHER_LINE_PATTERN.sub(b"", data)
+    # only headers and unindented transition lines, the usual case: blanking the headers is enough
+    pieces = []
+    previous_end = 0
+    for match in matches:
+        pieces.append(data[previous_end:match.start()])
+        previous_end = match.end()
+    pieces.append(data[previous_end:])
+    return headers, b"".join(pieces)
+
+
+def tokenize_transitions(file_path, body):
+    '''
+    Tokenizes every "transition: state,symbol -> target,target" line of a file body at once
+    :param file_path: file being parsed, for error messages
+    :param body: file contents with the header lines blanked out
+    :return: (line number, source name, symbol, target name) int64 arrays with one entry per edge;
+    epsilon symbols are EPSILON_ID
+    :raises NFAParseError: naming the first malformed line
+    '''
+    text = (body.replace(b"transition:", b" ")
+            .replace(b"->", b" %d " % ARROW)
+            .replace(b"epsilon", b" %d " % EPSILON_ID)
+            .replace(b",", b" ")
+            .replace(b"\n", b" %d " % LINE_END))
+    try:
+        # older NumPy versions warn and return what was read instead of raising
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            numbers = np.fromstring(text + b" %d" % LINE_END, dtype=np.int64, sep=" ")
+    except (ValueError, DeprecationWarning):
+        raise NFAParseError(file_path, find_unreadable_line(body), "expected 'transition: state,symbol -> targets'") from None
+
+    is_end = numbers == LINE_END
+    is_arrow = numbers == ARROW
+    # line index of every token, the end marker belongs to the line it closes
+    line_of = np.cumsum(is_end) - is_end
+    line_count = int(is_end.sum())
+    line_starts = np.concatenate(([0], np.flatnonzero(is_end) + 1))[:line_count]
+
+    token_counts = np.bincount(line_of[~is_end], minlength=line_count)
+    arrow_counts = np.bincount(line_of[is_arrow], minlength=line_count)
+    arrow_positions = np.full(line_count, -1, dtype=np.int64)
+    arrow_positions[line_of[is_arrow]] = np.flatnonzero(is_arrow)
+    malformed = (token_counts > 0) & ((arrow_counts != 1) | (arrow_positions - line_starts != 2) | (token_counts < 4))
+    if malformed.any():
+        line = int(np.flatnonzero(malformed)[0]) + 1
+        raise NFAParseError(file_path, line, "expected 'transition: state,symbol -> targets'")
+
+    token_arrows = arrow_positions[line_of]
+    is_target = ~is_end & (token_arrows >= 0) & (np.arange(len(numbers)) > token_arrows)
+    edge_lines = line_of[is_target]
+    edge_arrows = arrow_positions[edge_lines]
+    return edge_lines + 1, numbers[edge_arrows - 2], numbers[edge_arrows - 1], numbers[is_target]
+
+
+def find_unreadable_line(body):
+    '''
+    Looks for the first line holding a token that is not a number, line by line. Only used to report an error.
+    :param body: file contents with the header lines blanked out
+    :return: 1-based line number
+    '''
+    for line_number, line in enumerate(body.split(b"\n"), start=1):
+        tokens = line.replace(b"transition:", b" ").replace(b"->", b" ").replace(b",", b" ").split()
+        for token in tokens:
+            if token != b"epsilon" and not token.lstrip(b"+-").isdigit():
+                return line_number
+    return 0
+
+
+def to_state_ids(file_path, states, names, lines):
+    '''
+    Renumbers state names to positions in the sorted array of declared states
+    :param file_path: file being parsed, for error messages
+    :param states: sorted int64 array of declared state names
+    :param names: state names to renumber
+    :param lines: line number of every name
+    :return: int64 array of state ids
+    :raises NFAParseError: on the first name that was not declared
+    '''
+    names = np.asarray(names, dtype=np.int64)
+    if len(states) > 0 and 0 <= states[0] and states[-1] < 4 * len(states) + 1024:
+        # small non-negative names, the usual case, are renumbered with a lookup table
+        lookup = np.full(int(states[-1]) + 1, -1, dtype=np.int64)
+        lookup[states] = np.arange(len(states))
+        inside = (names >= 0) & (names < len(lookup))
+        ids = np.full(len(names), -1, dtype=np.int64)
+        ids[inside] = lookup[names[inside]]
+        unknown = ids < 0
+    elif len(states) > 0:
+        ids = np.searchsorted(states, names)
+        unknown = (ids >= len(states)) | (states[np.minimum(ids, len(states) - 1)] != names)
+    else:
+        ids = np.zeros(len(names), dtype=np.int64)
+        unknown = np.ones(len(names), dtype=bool)
+    if unknown.any():
+        position = int(np.flatnonzero(unknown)[0])
+        raise NFAParseError(file_path, lines[position], "state " + str(int(names[position])) + " is not in 'states:'")
+    return ids
+
+
+if __name__ == "__main__":
+    # Example usage
+    nfa_file = "sample_nfa.txt"
+    (states, alphabet, transitions, initial, accepting) = parse_nfa_file(nfa_file)
+
+    print("States:", states)
+    print("Alphabet:", alphabet)
+    print("Initial:", initial)
+    print("Accepting:", accepting)
+    print("Transitions:")
+    for key, value in transitions.items():
+        print(f"  {key} -> {value}")
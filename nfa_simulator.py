@@ -0,0 +1,82 @@
+from subset_engine import NFABitIndex
+
+
+class NFASimulator:
+    '''
+    Runs an NFA directly on input, Thompson style, without building a DFA. The set of active states is a
+    bitmask that moves over each letter with the precomputed successor masks of NFABitIndex, which already
+    include epsilon closures. A run stops as soon as no state is active.
+
+    It has the same accepts / accepts_many interface as CompiledDFA, so callers can pick simulation for a
+    few inputs and determinization when the DFA will be reused many times.
+    '''
+    def __init__(self, nfa):
+        self.index = NFABitIndex(nfa)
+        self.symbol_index = {letter: i for i, letter in enumerate(self.index.alphabet)}
+        self.initial_mask = self.index.initial_mask() if len(nfa.states) > 0 else 0
+
+    def encode(self, word):
+        '''
+        :param word: iterable of letters
+        :return: list of letter indexes
+        '''
+        symbol_index = self.symbol_index
+        try:
+            return [symbol_index[letter] for letter in word]
+        except KeyError as error:
+            raise ValueError("Letter " + repr(error.args[0]) + " is not in the alphabet") from None
+
+    def run(self, word):
+        '''
+        :param word: iterable of letters
+        :return: bitmask of the NFA states active after reading the word, 0 if the run died
+        '''
+        mask = self.initial_mask
+        step = self.index.step
+        for letter_index in self.encode(word):
+            if mask == 0:
+                return 0
+            mask = step(mask, letter_index)
+        return mask
+
+    def accepts(self, word):
+        '''
+        :param word: iterable of letters
+        :return: whether the NFA accepts the word
+        '''
+        return bool(self.run(word) & self.index.accepting_mask)
+
+    def accepts_many(self, words):
+        '''
+        Runs many inputs in lock step. Inputs that are in the same set of states share one step per
+        letter, and steps taken are remembered for the rest of the batch.
+        :param words: iterable of inputs
+        :return: list of bools, one per input
+        '''
+        encoded = [self.encode(word) for word in words]
+        results = [False] * len(encoded)
+        step = self.index.step
+        accepting_mask = self.index.accepting_mask
+        steps_taken = {}
+
+        # active maps a mask to the inputs currently in that set of states
+        active = {self.initial_mask: list(range(len(encoded)))} if self.initial_mask else {}
+        position = 0
+        while active:
+            next_active = {}
+            for mask, word_ids in active.items():
+                for word_id in word_ids:
+                    letters = encoded[word_id]
+                    if position == len(letters):
+                        results[word_id] = bool(mask & accepting_mask)
+                        continue
+                    key = (mask, letters[position])
+                    next_mask = steps_taken.get(key)
+                    if next_mask is None:
+                        next_mask = step(mask, letters[position])
+                        steps_taken[key] = next_mask
+                    if next_mask != 0:
+                        next_active.setdefault(next_mask, []).append(word_id)
+            active = next_active
+            position += 1
+        return results
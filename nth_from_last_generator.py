@@ -41,5 +41,6 @@ def generate_nfa_text(n, output_dir):
 
     print(f"NFA written to: {output_path}")
 
-for n in range(2, 10):  # Generate NFAs for n from 1 to 20
-    generate_nfa_text(n, "nfa_nth_from_last")
+if __name__ == "__main__":
+    for n in range(2, 10):  # Generate NFAs for n from 1 to 20
+        generate_nfa_text(n, "nfa_nth_from_last")
@@ -0,0 +1,265 @@
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dfa import DFA
+from instrumentation import ConstructionProfile
+from nfa import NFA
+from nfa_parser import parse_nfa_file
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where memory caps are skipped
+    resource = None
+
+# Order of the values in the tuples workers send back. Only these numbers cross the process boundary,
+# never the DFA itself.
+RESULT_FIELDS = (
+    "filename", "status", "nfa_states", "dfa_states", "dfa_transitions", "construction_time_sec",
+    "transition_density", "epsilon_density", "theoretical_max", "percentage_of_theoretical", "frontier_states",
+    "error", "profile",
+)
+STATUSES = ("ok", "exceeded budget", "timeout", "memory", "crashed", "error")
+
+
+class TaskTimeout(Exception):
+    '''
+    Raised inside a worker when a file takes longer than its time limit
+    '''
+    pass
+
+
+def analyze_nfa_file(file_path, cache=None, engine="tuple", budget=None, profile=False):
+    '''
+    Parses one NFA file, determinizes it and measures the result, as analyze_dfa_complexity reports it
+    :param file_path: NFA text file
+    :param cache: DeterminizationCache to go through, or None
+    :param engine: DFA engine used without a cache
+    :param budget: ConstructionBudget for the construction, or None. A construction that reaches it gets
+    the status "exceeded budget" and the counts of the partial DFA.
+    :param profile: whether to record a ConstructionProfile of the construction. Its report, phase timings
+    and counters, is the "profile" field, which is None otherwise.
+    :return: dict with the RESULT_FIELDS, plus "cache_hit"
+    '''
+    nfa_tuple = parse_nfa_file(file_path)
+    nfa = NFA(nfa_tuple[0], nfa_tuple[2], nfa_tuple[3], nfa_tuple[4], nfa_tuple[1])
+
+    # Count total transitions and epsilon transitions
+    total_transitions = 0
+    epsilon_transitions = 0
+    for key, value in nfa_tuple[2].items():
+        if key[1] == "epsilon":
+            epsilon_transitions += len(value)
+        total_transitions += len(value)
+    transition_density = total_transitions / len(nfa_tuple[0])
+    epsilon_density = epsilon_transitions / total_transitions if total_transitions > 0 else 0
+
+    construction_profile = ConstructionProfile() if profile else None
+    start_time = time.time()
+    hits_before = cache.hits if cache is not None else 0
+    if cache is not None:
+        dfa = cache.determinize(nfa, budget, construction_profile)
+    else:
+        dfa = DFA(nfa, engine=engine, budget=budget, profile=construction_profile)
+    elapsed_time = time.time() - start_time
+
+    num_dfa_states, num_dfa_transitions = count_dfa(dfa)
+    theoretical_max = 2 ** len(nfa_tuple[0])
+    return {
+        "filename": os.path.basename(file_path),
+        "status": "ok" if dfa.complete else "exceeded budget",
+        "nfa_states": len(nfa_tuple[0]),
+        "dfa_states": num_dfa_states,
+        "dfa_transitions": num_dfa_transitions,
+        "construction_time_sec": elapsed_time,
+        "transition_density": transition_density,
+        "epsilon_density": epsilon_density,
+        "theoretical_max": theoretical_max,
+        "percentage_of_theoretical": (num_dfa_states / theoretical_max) * 100 if theoretical_max > 0 else 0,
+        "frontier_states": dfa.statistics["frontier"] if dfa.statistics is not None else 0,
+        "error": None if dfa.complete else "stopped at the " + dfa.statistics["exceeded"] + " budget",
+        "profile": construction_profile.get_report() if construction_profile is not None else None,
+        "cache_hit": cache is not None and cache.hits > hits_before,
+    }
+
+
+def count_dfa(dfa):
+    '''
+    :param dfa: DFA
+    :return: (number of states, number of transitions), read from the transition table when there is one
+    so the tuple keyed view of the bitset engine is not built just to be counted
+    '''
+    if not dfa.complete:
+        return dfa.statistics["states"], dfa.statistics["transitions"]
+    if dfa.table_source is not None and dfa._view_pending:
+        state_count = dfa.table_source.state_count()
+        return state_count, state_count * len(dfa.alphabet)
+    return len(dfa.states), len(dfa.delta_transition)
+
+
+def set_memory_limit(memory_limit_bytes):
+    '''
+    Worker initializer. Caps the address space of the worker at its current size plus memory_limit_bytes,
+    so an NFA that explodes raises MemoryError in its own task instead of taking the machine down.
+    :param memory_limit_bytes: extra bytes a worker may map, or None for no cap
+    :return: Void
+    '''
+    if memory_limit_bytes is None or resource is None:
+        return
+    current = 0
+    try:
+        with open("/proc/self/statm") as file:
+            current = int(file.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    limit = current + memory_limit_bytes
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def raise_timeout(signal_number, frame):
+    '''
+    SIGALRM handler of the workers
+    '''
+    raise TaskTimeout()
+
+
+def run_task(file_path, timeout, engine, budget, profile=False):
+    '''
+    Worker side of analyze_corpus: analyzes one file under a time limit and packs the outcome
+    :param file_path: NFA text file
+    :param timeout: seconds the file may take, or None
+    :param engine: DFA engine
+    :param budget: ConstructionBudget or None
+    :param profile: whether to record the profile of the construction
+    :return: tuple of values in RESULT_FIELDS order
+    '''
+    use_alarm = timeout is not None and hasattr(signal, "setitimer")
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start_time = time.time()
+    try:
+        result = analyze_nfa_file(file_path, engine=engine, budget=budget, profile=profile)
+    except TaskTimeout:
+        result = failed_result(file_path, "timeout", time.time() - start_time, "took longer than " + str(timeout) + "s")
+    except MemoryError:
+        result = failed_result(file_path, "memory", time.time() - start_time, "ran out of memory")
+    except Exception as error:
+        result = failed_result(file_path, "error", time.time() - start_time, repr(error))
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+    return tuple(result.get(field) for field in RESULT_FIELDS)
+
+
+def failed_result(file_path, status, elapsed_time, message):
+    '''
+    :return: result dict of a file that could not be analyzed
+    '''
+    return {"filename": os.path.basename(file_path), "status": status, "construction_time_sec": elapsed_time, "error": message}
+
+
+def analyze_corpus(file_paths, workers=None, timeout=60, memory_limit_bytes=2 * 1024 ** 3, engine="bitset", budget=None,
+                   profile=False):
+    '''
+    Analyzes many NFA files in a pool of processes. Each file is parsed, determinized and measured in a
+    worker, and only the numbers come back. A file that runs past its timeout or memory cap gets a
+    "timeout" or "memory" status and the rest of the corpus carries on. A worker that dies, for example
+    killed by the operating system running out of memory, breaks the whole pool; the files it left
+    unfinished are then run again in a new pool, and only the file that kills a worker on its own gets
+    the "crashed" status.
+    :param file_paths: NFA text files
+    :param workers: number of processes, all cores when None
+    :param timeout: seconds each file may take, or None
+    :param memory_limit_bytes: memory each worker may use on top of what it holds at start, or None
+    :param engine: DFA engine used by the workers
+    :param budget: ConstructionBudget for every construction; unlike timeout and the memory cap it stops a
+    construction cleanly, and the file is reported with the counts of its partial DFA
+    :param profile: whether each result carries the profile report of its construction
+    :return: list of result dicts in the order of file_paths
+    '''
+    file_paths = list(file_paths)
+    results = [None] * len(file_paths)
+    task_options = (timeout, engine, budget, profile)
+    pending = list(range(len(file_paths)))
+    while pending:
+        unfinished = run_in_pool(file_paths, pending, results, workers, memory_limit_bytes, task_options)
+        if not unfinished:
+            break
+        # Any of the files that were running may have killed the pool. The first unfinished one is run
+        # alone: if it breaks a pool of its own it is the culprit, otherwise it is done. Either way every
+        # round finishes at least one file.
+        suspect = unfinished[0]
+        if run_in_pool(file_paths, [suspect], results, 1, memory_limit_bytes, task_options):
+            results[suspect] = failed_result(file_paths[suspect], "crashed", None, "the worker process died")
+        pending = unfinished[1:]
+    return results
+
+
+def run_in_pool(file_paths, positions, results, workers, memory_limit_bytes, task_options):
+    '''
+    Runs run_task on some of the files in a new pool of processes and stores the results of the ones
+    that finish
+    :param file_paths: NFA text files
+    :param positions: positions in file_paths of the files to run
+    :param results: list of results to fill in, indexed like file_paths
+    :param workers: number of processes, all cores when None
+    :param memory_limit_bytes: memory each worker may use on top of what it holds at start, or None
+    :param task_options: (timeout, engine, budget, profile), passed on to run_task
+    :return: positions of the files left unfinished because the pool broke, in order
+    '''
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_memory_limit, initargs=(memory_limit_bytes,)) as executor:
+        futures = [executor.submit(run_task, file_paths[position], *task_options) for position in positions]
+        for position, future in zip(positions, futures):
+            try:
+                results[position] = dict(zip(RESULT_FIELDS, future.result()))
+            except BrokenProcessPool:
+                unfinished.append(position)
+    return unfinished
+
+
+def analyze_folder(nfa_folder_path, output_path=None, **options):
+    '''
+    Runs analyze_corpus over the .txt files of a folder, in file name order
+    :param nfa_folder_path: folder of NFA text files
+    :param output_path: JSON file to write the results to, or None
+    :param options: passed on to analyze_corpus
+    :return: list of result dicts
+    '''
+    file_paths = [os.path.join(nfa_folder_path, filename)
+                  for filename in sorted(os.listdir(nfa_folder_path)) if filename.endswith(".txt")]
+    results = analyze_corpus(file_paths, **options)
+    if output_path is not None:
+        write_results(results, output_path)
+    return results
+
+
+def write_results(results, output_path):
+    '''
+    Writes results as JSON, one object per file with the RESULT_FIELDS in order
+    :param results: list of result dicts
+    :param output_path: where to write
+    :return: Void
+    '''
+    with open(output_path, 'w') as file:
+        json.dump([{field: result.get(field) for field in RESULT_FIELDS} for result in results], file, indent=1)
+
+
+if __name__ == "__main__":
+    import sys
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else "generated_nfas"
+    output = sys.argv[2] if len(sys.argv) > 2 else "parallel_results.json"
+    start = time.time()
+    corpus_results = analyze_folder(folder, output)
+    counts = {status: sum(1 for result in corpus_results if result["status"] == status) for status in STATUSES}
+    print(f"Analyzed {len(corpus_results)} files in {time.time() - start:.2f}s: {counts}, written to {output}")
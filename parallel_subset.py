@@ -0,0 +1,327 @@
+import multiprocessing
+import os
+import time
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from construction_budget import BITSET_STATE_BYTES, BITSET_TRANSITION_BYTES
+from subset_engine import BitsetSubsetEngine
+
+# Levels with fewer transitions than this are expanded by the parent, since handing them to the
+# workers costs more than it saves
+PARALLEL_LEVEL_MIN_TRANSITIONS = 4096
+
+
+class ParallelSubsetEngine(BitsetSubsetEngine):
+    '''
+    Breadth first subset construction that expands each level of the search across worker processes.
+
+    Subsets are bitmasks of NFA states as in BitsetSubsetEngine. The subsets of a level are written as
+    rows of 64-bit words into shared memory; each worker expands a slice of the rows on every letter and
+    writes the successor rows back. Known subsets are kept in a dedup table split into one shard per worker,
+    by hash of the mask, so each worker only looks up the successors that fall into its own shard. The parent
+    then numbers the new subsets of the level in (source state, letter) order, the order in which the
+    sequential breadth first engine meets them, so the DFA is the same, ids included, for any number of
+    workers.
+
+    Small levels, such as the first few, are expanded by the parent with the same sharded table, and the
+    shards move to the workers when the first level big enough to split comes up.
+    '''
+    def __init__(self, nfa, workers=None, initial_states=None):
+        '''
+        :param nfa: NFA to determinize
+        :param workers: number of worker processes, all cores when None
+        :param initial_states: NFA states to start from instead of nfa.initial_state
+        '''
+        BitsetSubsetEngine.__init__(self, nfa, "bfs", initial_states)
+        self.worker_count = max(1, workers if workers is not None else (os.cpu_count() or 1))
+        self.words = max(1, (len(self.index.order) + 63) // 64)
+        self.shards = [{} for _ in range(self.worker_count)]
+        self.null_id = None
+        self.connections = []
+        self.processes = []
+
+    def add_subset(self, mask):
+        '''
+        Gives a newly discovered subset the next free id, recording it in its shard
+        :param mask: bitmask of NFA states
+        :return: id of the subset
+        '''
+        subset_id = len(self.subsets)
+        self.shards[hash(mask) % self.worker_count][mask] = subset_id
+        self.append_subset(mask)
+        return subset_id
+
+    def run(self, budget=None, profile=None):
+        '''
+        Explores every reachable subset one breadth first level at a time
+        :param budget: ConstructionBudget, checked before each subset the parent expands and before each
+        level the workers expand, so a worker level can take the construction past max_states
+        :param profile: ConstructionProfile, or None. The levels are timed as a whole, and the subsets are
+        reported to it once the run is over, since most of them are found in the workers.
+        :return: self
+        '''
+        start_time = time.perf_counter()
+        letter_count = self.letter_count
+        self.initial = self.add_subset(self.initial_mask)
+        level_start = 0
+        try:
+            while level_start < len(self.subsets) and self.budget_exceeded is None:
+                level_end = len(self.subsets)
+                if self.processes or (level_end - level_start) * letter_count >= PARALLEL_LEVEL_MIN_TRANSITIONS:
+                    if budget is not None:
+                        self.budget_exceeded = budget.exceeded(level_end, level_start * letter_count, self.memory_bytes)
+                        if self.budget_exceeded is not None:
+                            break
+                    self.expand_level_in_workers(level_start, level_end)
+                    self.explored_count = level_end
+                else:
+                    self.expand_level(level_start, level_end, budget)
+                level_start = level_end
+        finally:
+            self.stop_workers()
+        # rows of subsets left unexpanded by a budget
+        self.table.extend(array("l", [-1]) * (len(self.subsets) * letter_count - len(self.table)))
+        if profile is not None:
+            profile.add_time("levels", time.perf_counter() - start_time)
+            for subset_id, mask in enumerate(self.subsets):
+                profile.subset_created(subset_id, mask.bit_count())
+            transition_count = self.explored_count * letter_count
+            profile.count("transitions_emitted", transition_count)
+            # every transition that did not discover a subset found a known one
+            profile.count("duplicate_hits", transition_count - (len(self.subsets) - 1))
+        return self
+
+    def expand_level(self, level_start, level_end, budget=None):
+        '''
+        Expands the subsets with ids level_start..level_end-1 in this process
+        :param budget: ConstructionBudget or None
+        :return: Void
+        '''
+        step = self.index.step
+        shards = self.shards
+        worker_count = self.worker_count
+        table = self.table
+        for subset_id in range(level_start, level_end):
+            if budget is not None:
+                self.budget_exceeded = budget.exceeded(len(self.subsets), subset_id * self.letter_count, self.memory_bytes)
+                if self.budget_exceeded is not None:
+                    return
+            mask = self.subsets[subset_id]
+            for letter_index in range(self.letter_count):
+                next_mask = step(mask, letter_index)
+                next_id = shards[hash(next_mask) % worker_count].get(next_mask)
+                if next_id is None:
+                    next_id = self.add_subset(next_mask)
+                table.append(next_id)
+            self.explored_count = subset_id + 1
+
+    def expand_level_in_workers(self, level_start, level_end):
+        '''
+        Expands the subsets with ids level_start..level_end-1 across the workers: every worker expands a
+        slice of the level, then every worker looks up the successors of its shard, then the parent numbers
+        the new subsets and tells each worker the ids of the ones in its shard.
+        :return: Void
+        '''
+        if not self.processes:
+            self.start_workers()
+        level_size = level_end - level_start
+        successor_count = level_size * self.letter_count
+        row_bytes = self.words * 8
+        buffers = [
+            shared_memory.SharedMemory(create=True, size=max(1, level_size * row_bytes)),
+            shared_memory.SharedMemory(create=True, size=max(1, successor_count * row_bytes)),
+            shared_memory.SharedMemory(create=True, size=max(1, successor_count * 4)),
+            shared_memory.SharedMemory(create=True, size=max(1, successor_count * 8)),
+        ]
+        frontier = buffers[0].buf
+        try:
+            for position, subset_id in enumerate(range(level_start, level_end)):
+                frontier[position * row_bytes:(position + 1) * row_bytes] = self.subsets[subset_id].to_bytes(row_bytes, "little")
+            names = [buffer.name for buffer in buffers]
+
+            bounds = np.linspace(0, level_size, self.worker_count + 1).astype(np.int64).tolist()
+            for worker, connection in enumerate(self.connections):
+                connection.send(("expand", names, level_size, bounds[worker], bounds[worker + 1]))
+            self.receive_all()
+
+            for connection in self.connections:
+                connection.send(("dedup", names, level_size))
+            new_positions = [np.frombuffer(reply, dtype=np.int64) for reply in self.receive_all()]
+
+            # new subsets are numbered in order of where they were first met in the level
+            all_new = np.sort(np.concatenate(new_positions))
+            for connection, positions in zip(self.connections, new_positions):
+                ids = level_end + np.searchsorted(all_new, positions)
+                connection.send(("assign", ids.tobytes()))
+
+            targets = np.ndarray(successor_count, dtype=np.int64, buffer=buffers[3].buf).copy()
+            repeated = targets < 0
+            targets[repeated] = level_end + np.searchsorted(all_new, -targets[repeated] - 1)
+            self.table.frombytes(targets.astype(np.dtype(self.table.typecode)).tobytes())
+
+            successors = bytes(buffers[1].buf[:successor_count * row_bytes])
+            for position in all_new.tolist():
+                self.append_subset(int.from_bytes(successors[position * row_bytes:(position + 1) * row_bytes], "little"))
+            self.receive_all()
+        finally:
+            del frontier
+            for buffer in buffers:
+                buffer.close()
+                buffer.unlink()
+
+    def append_subset(self, mask):
+        '''
+        Records a subset the workers already put in their shards
+        :param mask: bitmask of NFA states
+        :return: Void
+        '''
+        if mask == 0:
+            self.null_id = len(self.subsets)
+        self.subsets.append(mask)
+        self.accepting.append(1 if mask & self.index.accepting_mask else 0)
+        self.memory_bytes += (mask.bit_length() + 7) // 8 + BITSET_STATE_BYTES + BITSET_TRANSITION_BYTES * self.letter_count
+
+    def start_workers(self):
+        '''
+        Starts one worker per shard and hands it its part of the dedup table
+        :return: Void
+        '''
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        forked = context.get_start_method() == "fork"
+        if forked:
+            # forked workers then report the blocks they open to the parent's tracker, which forgets
+            # them when the parent unlinks them, instead of to trackers of their own
+            resource_tracker.ensure_running()
+        for worker in range(self.worker_count):
+            parent_end, worker_end = context.Pipe()
+            process = context.Process(target=run_worker, args=(worker_end, self.index, worker, self.worker_count,
+                                                               self.words, self.shards[worker], forked), daemon=True)
+            process.start()
+            worker_end.close()
+            self.connections.append(parent_end)
+            self.processes.append(process)
+        self.shards = None
+
+    def receive_all(self):
+        '''
+        :return: list of the replies of every worker, in worker order
+        '''
+        replies = [connection.recv() for connection in self.connections]
+        for reply in replies:
+            if isinstance(reply, BaseException):
+                raise reply
+        return replies
+
+    def stop_workers(self):
+        '''
+        :return: Void
+        '''
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def null_state(self):
+        '''
+        :return: id of the empty subset, or None when it was never reached
+        '''
+        return self.null_id
+
+
+def attach(name, forked):
+    '''
+    Opens a shared memory block created by the parent
+    :param name: name of the block
+    :param forked: whether the worker was forked, and so shares the parent's resource tracker
+    :return: SharedMemory
+    '''
+    buffer = shared_memory.SharedMemory(name=name)
+    if not forked:
+        # the parent unlinks the block; a spawned worker's own tracker would otherwise try again at exit
+        resource_tracker.unregister(buffer._name, "shared_memory")
+    return buffer
+
+
+def run_worker(connection, index, shard, shard_count, words, table, forked):
+    '''
+    Main loop of a worker process. Answers "expand", "dedup" and "assign" requests until it receives None.
+    :param connection: pipe to the parent
+    :param index: NFABitIndex of the NFA
+    :param shard: which shard of the dedup table this worker owns
+    :param shard_count: number of shards
+    :param words: number of 64-bit words per subset row
+    :param table: this worker's shard, mask to subset id
+    :param forked: whether the worker was forked
+    :return: Void
+    '''
+    row_bytes = words * 8
+    letter_count = len(index.alphabet)
+    pending = []
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        try:
+            command = message[0]
+            if command == "expand":
+                _, names, level_size, low, high = message
+                buffers = [attach(name, forked) for name in names[:3]]
+                frontier, successors, shards = buffers[0].buf, buffers[1].buf, buffers[2].buf.cast("i")
+                for position in range(low, high):
+                    mask = int.from_bytes(frontier[position * row_bytes:(position + 1) * row_bytes], "little")
+                    for letter_index in range(letter_count):
+                        next_mask = index.step(mask, letter_index)
+                        slot = position * letter_count + letter_index
+                        successors[slot * row_bytes:(slot + 1) * row_bytes] = next_mask.to_bytes(row_bytes, "little")
+                        shards[slot] = hash(next_mask) % shard_count
+                del frontier, successors, shards
+                for buffer in buffers:
+                    buffer.close()
+                connection.send(True)
+
+            elif command == "dedup":
+                _, names, level_size = message
+                buffers = [attach(name, forked) for name in names[1:]]
+                successor_count = level_size * letter_count
+                shards = np.ndarray(successor_count, dtype=np.int32, buffer=buffers[1].buf)
+                targets = np.ndarray(successor_count, dtype=np.int64, buffer=buffers[2].buf)
+                positions = np.flatnonzero(shards == shard)
+                successors = buffers[0].buf
+                first_seen = {}
+                new_positions = []
+                pending = []
+                for position in positions.tolist():
+                    mask = int.from_bytes(successors[position * row_bytes:(position + 1) * row_bytes], "little")
+                    subset_id = table.get(mask)
+                    if subset_id is not None:
+                        targets[position] = subset_id
+                        continue
+                    first = first_seen.get(mask)
+                    if first is None:
+                        first = first_seen[mask] = position
+                        new_positions.append(position)
+                        pending.append(mask)
+                    # resolved by the parent once the new subsets are numbered
+                    targets[position] = -first - 1
+                del shards, targets, successors
+                for buffer in buffers:
+                    buffer.close()
+                connection.send(np.array(new_positions, dtype=np.int64).tobytes())
+
+            elif command == "assign":
+                ids = np.frombuffer(message[1], dtype=np.int64).tolist()
+                for mask, subset_id in zip(pending, ids):
+                    table[mask] = subset_id
+                pending = []
+                connection.send(True)
+        except Exception as error:
+            connection.send(error)
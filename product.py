@@ -0,0 +1,470 @@
+import numpy as np
+
+from compiled_dfa import CompiledDFA
+from transition_table import NULL_STATE
+
+# Slots of the id table are doubled once more than this fraction of them is used
+MAX_LOAD = 0.5
+# Fibonacci hashing multiplier, 2**64 divided by the golden ratio
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+UINT64_MASK = (1 << 64) - 1
+# Levels with at most this many pairs are expanded one pair at a time, where NumPy's per call cost would dominate
+SMALL_LEVEL = 16
+# Name of the state accepting every input that minimize=True merges pairs into, next to the "Null set" sink
+UNIVERSAL_STATE = "Universal set"
+
+OPERATIONS = {
+    "intersection": lambda left, right: left & right,
+    "union": lambda left, right: left | right,
+    "difference": lambda left, right: left & ~right,
+    "symmetric_difference": lambda left, right: left ^ right,
+}
+
+# What is known of the language of an operand state: anything, nothing, or every input
+OTHER, EMPTY, FULL = 0, 1, 2
+
+
+class PairInterner:
+    '''
+    Gives every distinct pair of states (left, right) a dense integer id, like SubsetInterner does for
+    subsets. A pair is stored once, as the int64 key left * right_count + right at its id, and the ids sit
+    in an open addressing hash table of int64 slots. Both are NumPy arrays and whole batches of pairs are
+    looked up and added at once, with a few array operations per probing round instead of a dict lookup
+    per pair, at 8 bytes per pair plus the slots.
+    '''
+    def __init__(self, right_count):
+        '''
+        :param right_count: number of states of the right operand
+        '''
+        self.right_count = right_count
+        self.keys = np.empty(64, dtype=np.int64)
+        self.slots = np.full(128, -1, dtype=np.int64)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def slot_positions(self, keys, slot_count):
+        '''
+        :param keys: int64 array of pair keys
+        :param slot_count: size of the id table, a power of two
+        :return: home slot of every key
+        '''
+        shift = np.uint64(65 - slot_count.bit_length())
+        return ((keys.astype(np.uint64) * HASH_MULTIPLIER) >> shift).astype(np.int64)
+
+    def lookup(self, keys):
+        '''
+        :param keys: int64 array of pair keys
+        :return: int64 array holding the id of every key, or -1 for keys never added
+        '''
+        slots = self.slots
+        size_mask = len(slots) - 1
+        ids = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        positions = self.slot_positions(keys, len(slots))
+        while pending.size > 0:
+            slot_ids = slots[positions]
+            occupied = slot_ids >= 0
+            hit = occupied.copy()
+            hit[occupied] = self.keys[slot_ids[occupied]] == keys[pending[occupied]]
+            ids[pending[hit]] = slot_ids[hit]
+            probing = occupied & ~hit
+            pending = pending[probing]
+            positions = (positions[probing] + 1) & size_mask
+        return ids
+
+    def add(self, keys):
+        '''
+        :param keys: int64 array of distinct keys that were never added
+        :return: their new ids, numbered in the order of keys
+        '''
+        ids = np.arange(self.count, self.count + len(keys))
+        if self.count + len(keys) > len(self.keys):
+            grown = np.empty(max(2 * len(self.keys), self.count + len(keys)), dtype=np.int64)
+            grown[:self.count] = self.keys[:self.count]
+            self.keys = grown
+        self.keys[ids] = keys
+        self.count += len(keys)
+        if self.count > MAX_LOAD * len(self.slots):
+            slot_count = len(self.slots)
+            while self.count > MAX_LOAD * slot_count:
+                slot_count *= 2
+            self.slots = np.full(slot_count, -1, dtype=np.int64)
+            self.place(np.arange(self.count))
+        else:
+            self.place(ids)
+        return ids
+
+    def place(self, ids):
+        '''
+        Puts ids in the first free slot from the home slot of their key. Ids probing the same free slot in
+        one round are ordered by their position in ids, the first one takes it and the others move on.
+        :param ids: int64 array of ids missing from the id table
+        :return: Void
+        '''
+        slots = self.slots
+        size_mask = len(slots) - 1
+        positions = self.slot_positions(self.keys[ids], len(slots))
+        while ids.size > 0:
+            free = np.flatnonzero(slots[positions] < 0)
+            taken_positions, first = np.unique(positions[free], return_index=True)
+            winners = free[first]
+            slots[taken_positions] = ids[winners]
+            waiting = np.ones(ids.size, dtype=bool)
+            waiting[winners] = False
+            ids = ids[waiting]
+            positions = (positions[waiting] + 1) & size_mask
+
+    def intern_key(self, key):
+        '''
+        One key version of intern, for small batches
+        :param key: pair key, a Python int
+        :return: id of the key
+        '''
+        slots = self.slots
+        size_mask = len(slots) - 1
+        position = ((key * int(HASH_MULTIPLIER)) & UINT64_MASK) >> (65 - len(slots).bit_length())
+        while True:
+            pair_id = int(slots[position])
+            if pair_id < 0:
+                break
+            if self.keys[pair_id] == key:
+                return pair_id
+            position = (position + 1) & size_mask
+
+        pair_id = self.count
+        if pair_id == len(self.keys):
+            self.keys = np.concatenate((self.keys, np.empty(len(self.keys), dtype=np.int64)))
+        self.keys[pair_id] = key
+        self.count += 1
+        if self.count > MAX_LOAD * len(slots):
+            self.slots = np.full(2 * len(slots), -1, dtype=np.int64)
+            self.place(np.arange(self.count))
+        else:
+            slots[position] = pair_id
+        return pair_id
+
+    def intern(self, keys):
+        '''
+        :param keys: int64 array of pair keys, possibly repeated
+        :return: int64 array with the id of every key. New keys get ids in the order they first appear.
+        '''
+        unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        unique_ids = self.lookup(unique_keys)
+        new = np.flatnonzero(unique_ids < 0)
+        if new.size > 0:
+            new = new[np.argsort(first_index[new], kind="stable")]
+            unique_ids[new] = self.add(unique_keys[new])
+        return unique_ids[inverse.ravel()]
+
+    def size_in_bytes(self):
+        '''
+        :return: bytes held by the keys and the id table
+        '''
+        return self.keys.nbytes + self.slots.nbytes
+
+
+class ProductConstruction:
+    '''
+    On the fly product of two CompiledDFAs. Only pairs reachable from the pair of start states are built,
+    breadth first and one level at a time: the next pairs of a whole level are computed with NumPy
+    indexing on the operands' matrices and interned in a PairInterner in one batch, so the Python overhead
+    is per level rather than per pair.
+
+    Letters of one alphabet missing from the other lead that operand to a sink. The product has one column
+    per distinct pair of operand columns, so operands compiled with symbol classes give a product with
+    classes too.
+
+    With collapse, pairs whose language is known to be empty, because the operation rejects whatever the
+    operands do from there, are merged into a single "Null set" state as they are found, and pairs whose
+    language is every input into one "Universal set" state. An operand state is known to accept nothing
+    when it cannot reach an accepting state, and everything when it cannot reach a rejecting one. This
+    keeps, for instance, an intersection from exploring the pairs of one operand's sink with every state
+    of the other.
+    '''
+    def __init__(self, left, right, operation, collapse=False):
+        '''
+        :param left: CompiledDFA
+        :param right: CompiledDFA
+        :param operation: one of OPERATIONS
+        :param collapse: whether to merge pairs with an empty or universal language while exploring
+        '''
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown operation " + repr(operation) + ", expected one of " + str(tuple(OPERATIONS)))
+        self.left = left
+        self.right = right
+        self.operation = operation
+        self.collapse = collapse
+        known = set(left.alphabet)
+        self.alphabet = list(left.alphabet) + [letter for letter in right.alphabet if letter not in known]
+        self.left_transitions, self.left_accepting, self.left_start, left_columns = extend_operand(left, self.alphabet)
+        self.right_transitions, self.right_accepting, self.right_start, right_columns = extend_operand(right, self.alphabet)
+
+        # one product column per distinct pair of operand columns, in order of the first letter reading it
+        joint_columns = {}
+        self.columns = [joint_columns.setdefault(pair, len(joint_columns)) for pair in zip(left_columns, right_columns)]
+        self.left_columns = np.array([pair[0] for pair in joint_columns], dtype=np.int64)
+        self.right_columns = np.array([pair[1] for pair in joint_columns], dtype=np.int64)
+
+        self.right_count = len(self.right_accepting)
+        pair_count = len(self.left_accepting) * self.right_count
+        self.empty_key = pair_count
+        self.universal_key = pair_count + 1
+        self.pairs = PairInterner(self.right_count)
+        self.level_count = 0
+        # with collapse, what the operation makes of two kinds of states and the kind of every operand state
+        self.outcome = None
+        self.left_kinds = None
+        self.right_kinds = None
+
+    def run(self):
+        '''
+        :return: CompiledDFA of the product. State 0 is the pair of start states, and the states are numbered
+        in breadth first order; their labels are the pairs of operand labels.
+        '''
+        combine = OPERATIONS[self.operation]
+        right_count = self.right_count
+        left_transitions = self.left_transitions
+        right_transitions = self.right_transitions
+        left_columns = self.left_columns
+        right_columns = self.right_columns
+        pairs = self.pairs
+        if self.collapse:
+            self.outcome = collapse_outcomes(combine)
+            self.left_kinds = language_kinds(left_transitions, self.left_accepting)
+            self.right_kinds = language_kinds(right_transitions, self.right_accepting)
+
+        pairs.intern(self.collapse_keys(np.array([self.left_start * right_count + self.right_start], dtype=np.int64)))
+        rows = []
+        explored = 0
+        while explored < len(pairs):
+            frontier_keys = pairs.keys[explored:len(pairs)]
+            explored = len(pairs)
+            self.level_count += 1
+            if len(frontier_keys) <= SMALL_LEVEL:
+                rows.append(self.expand_small(frontier_keys.tolist()))
+                continue
+            special = frontier_keys >= self.empty_key
+            lefts = np.where(special, 0, frontier_keys // right_count)
+            rights = np.where(special, 0, frontier_keys % right_count)
+            next_keys = self.collapse_keys(left_transitions[lefts[:, None], left_columns].astype(np.int64) * right_count
+                                           + right_transitions[rights[:, None], right_columns])
+            # the merged states only loop on themselves
+            next_keys[special] = frontier_keys[special, None]
+            rows.append(pairs.intern(next_keys.ravel()).astype(np.int32).reshape(next_keys.shape))
+
+        keys = pairs.keys[:len(pairs)]
+        special = keys >= self.empty_key
+        accepting = combine(self.left_accepting[np.where(special, 0, keys // right_count)],
+                            self.right_accepting[np.where(special, 0, keys % right_count)])
+        accepting[special] = keys[special] == self.universal_key
+        transitions = np.concatenate(rows)
+        columns = None if self.columns == list(range(len(self.alphabet))) else self.columns
+        return CompiledDFA(self.alphabet, transitions, accepting, 0, label_source=self, columns=columns)
+
+    def expand_small(self, frontier_keys):
+        '''
+        Expands the pairs of a small level one at a time, handing out the same ids as the batched path
+        :param frontier_keys: keys of the level, as Python ints
+        :return: int32 array of the rows of the level
+        '''
+        right_count = self.right_count
+        intern_key = self.pairs.intern_key
+        column_count = len(self.left_columns)
+        row_ids = []
+        for key in frontier_keys:
+            if key >= self.empty_key:
+                row_ids.extend([intern_key(key)] * column_count)
+                continue
+            next_lefts = self.left_transitions[key // right_count, self.left_columns].tolist()
+            next_rights = self.right_transitions[key % right_count, self.right_columns].tolist()
+            for next_left, next_right in zip(next_lefts, next_rights):
+                next_key = next_left * right_count + next_right
+                if self.outcome is not None:
+                    kind = self.outcome[self.left_kinds[next_left], self.right_kinds[next_right]]
+                    if kind == EMPTY:
+                        next_key = self.empty_key
+                    elif kind == FULL:
+                        next_key = self.universal_key
+                row_ids.append(intern_key(next_key))
+        return np.array(row_ids, dtype=np.int32).reshape(len(frontier_keys), column_count)
+
+    def collapse_keys(self, keys):
+        '''
+        :param keys: int64 array of pair keys, none of them merged ones
+        :return: keys with the pairs of empty and universal language replaced by the merged keys, or keys
+        itself without collapse
+        '''
+        if self.outcome is None:
+            return keys
+        kinds = self.outcome[self.left_kinds[keys // self.right_count], self.right_kinds[keys % self.right_count]]
+        keys = np.where(kinds == EMPTY, self.empty_key, keys)
+        return np.where(kinds == FULL, self.universal_key, keys)
+
+    def label(self, state_id):
+        '''
+        :param state_id: id of a product state
+        :return: (left label, right label), or the name of a merged state. Operand states added as sinks
+        for missing letters are named "Null set".
+        '''
+        key = int(self.pairs.keys[state_id])
+        if key == self.empty_key:
+            return NULL_STATE
+        if key == self.universal_key:
+            return UNIVERSAL_STATE
+        return (operand_label(self.left, key // self.right_count), operand_label(self.right, key % self.right_count))
+
+
+def operand_label(compiled_dfa, state_id):
+    '''
+    :return: label of a state of an operand, "Null set" for the sink extend_operand adds
+    '''
+    if state_id >= compiled_dfa.state_count():
+        return NULL_STATE
+    return compiled_dfa.label(state_id)
+
+
+def extend_operand(compiled_dfa, alphabet):
+    '''
+    Makes an operand complete over a larger alphabet. When letters are missing, or the DFA has no states,
+    a rejecting sink state and a column leading every state to it are added.
+    :param compiled_dfa: CompiledDFA
+    :param alphabet: letters of the product, a superset of the operand's
+    :return: (transitions, accepting, start, column read by every letter of alphabet)
+    '''
+    symbol_index = compiled_dfa.symbol_index
+    transitions = compiled_dfa.transitions
+    if compiled_dfa.start >= 0 and all(letter in symbol_index for letter in alphabet):
+        return transitions, compiled_dfa.accepting, compiled_dfa.start, [symbol_index[letter] for letter in alphabet]
+
+    state_count, letter_count = transitions.shape
+    extended = np.full((state_count + 1, letter_count + 1), state_count, dtype=np.int32)
+    extended[:state_count, :letter_count] = transitions
+    accepting = np.append(compiled_dfa.accepting, False)
+    start = compiled_dfa.start if compiled_dfa.start >= 0 else state_count
+    return extended, accepting, start, [symbol_index.get(letter, letter_count) for letter in alphabet]
+
+
+def reaching(transitions, marked):
+    '''
+    Backward breadth first search, one level at a time over the transitions grouped by target
+    :param transitions: 2-D transition matrix of a complete DFA
+    :param marked: bool array of target states
+    :return: bool array of the states from which a marked state can be reached
+    '''
+    state_count, letter_count = transitions.shape
+    targets = transitions.ravel()
+    order = np.argsort(targets, kind="stable")
+    sources = order // letter_count
+    offsets = np.searchsorted(targets[order], np.arange(state_count + 1))
+
+    reached = marked.copy()
+    frontier = np.flatnonzero(reached)
+    while frontier.size > 0:
+        starts = offsets[frontier]
+        lengths = offsets[frontier + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        frontier = np.unique(sources[positions])
+        frontier = frontier[~reached[frontier]]
+        reached[frontier] = True
+    return reached
+
+
+def language_kinds(transitions, accepting):
+    '''
+    :return: int8 array holding EMPTY for states accepting nothing, FULL for states accepting every input
+    and OTHER for the rest
+    '''
+    kinds = np.full(len(accepting), OTHER, dtype=np.int8)
+    kinds[~reaching(transitions, accepting)] = EMPTY
+    kinds[~reaching(transitions, ~accepting)] = FULL
+    return kinds
+
+
+def collapse_outcomes(combine):
+    '''
+    :param combine: function of OPERATIONS
+    :return: 3 x 3 int8 array, at [left kind, right kind] EMPTY or FULL when the operation rejects or accepts
+    whatever two states of those kinds accept, and OTHER otherwise
+    '''
+    values = {OTHER: (False, True), EMPTY: (False,), FULL: (True,)}
+    outcome = np.full((3, 3), OTHER, dtype=np.int8)
+    for left_kind, left_values in values.items():
+        for right_kind, right_values in values.items():
+            results = {bool(combine(np.bool_(left), np.bool_(right))) for left in left_values for right in right_values}
+            if results == {False}:
+                outcome[left_kind, right_kind] = EMPTY
+            elif results == {True}:
+                outcome[left_kind, right_kind] = FULL
+    return outcome
+
+
+def as_compiled(dfa):
+    '''
+    :param dfa: DFA or CompiledDFA
+    :return: the CompiledDFA of dfa
+    '''
+    if isinstance(dfa, CompiledDFA):
+        return dfa
+    return dfa.compile()
+
+
+def product(left, right, operation, minimize=False):
+    '''
+    Combines two DFAs with the product construction, see ProductConstruction
+    :param left: DFA or CompiledDFA
+    :param right: DFA or CompiledDFA, over the same alphabet or another one
+    :param operation: "intersection", "union", "difference" (left but not right) or "symmetric_difference"
+    :param minimize: whether to merge pairs of empty and universal language while exploring and to
+    minimize the product with Hopcroft's algorithm at the end
+    :return: CompiledDFA over the letters of both alphabets
+    '''
+    construction = ProductConstruction(as_compiled(left), as_compiled(right), operation, collapse=minimize)
+    result = construction.run()
+    if minimize:
+        return result.minimize()
+    return result
+
+
+def intersection(left, right, minimize=False):
+    '''
+    :return: CompiledDFA accepting the inputs both DFAs accept, see product
+    '''
+    return product(left, right, "intersection", minimize)
+
+
+def union(left, right, minimize=False):
+    '''
+    :return: CompiledDFA accepting the inputs either DFA accepts, see product
+    '''
+    return product(left, right, "union", minimize)
+
+
+def difference(left, right, minimize=False):
+    '''
+    :return: CompiledDFA accepting the inputs left accepts and right rejects, see product
+    '''
+    return product(left, right, "difference", minimize)
+
+
+def symmetric_difference(left, right, minimize=False):
+    '''
+    :return: CompiledDFA accepting the inputs exactly one of the DFAs accepts, see product
+    '''
+    return product(left, right, "symmetric_difference", minimize)
+
+
+def complement(dfa):
+    '''
+    :param dfa: DFA or CompiledDFA
+    :return: CompiledDFA accepting the inputs over its alphabet that dfa rejects. Only the accepting flags
+    change; a DFA without states becomes a single accepting state.
+    '''
+    compiled_dfa = as_compiled(dfa)
+    if compiled_dfa.start < 0:
+        transitions = np.zeros((1, 1 if compiled_dfa.columns is not None else len(compiled_dfa.alphabet)), dtype=np.int32)
+        columns = None if compiled_dfa.columns is None else [0] * len(compiled_dfa.alphabet)
+        return CompiledDFA(compiled_dfa.alphabet, transitions, np.ones(1, dtype=bool), 0, [UNIVERSAL_STATE], columns=columns)
+    return CompiledDFA(compiled_dfa.alphabet, compiled_dfa.transitions, ~compiled_dfa.accepting, compiled_dfa.start,
+                       compiled_dfa.labels, compiled_dfa.label_source, compiled_dfa.columns)
@@ -0,0 +1,470 @@
+import time
+from array import array
+from collections import deque
+
+import numpy as np
+
+from construction_budget import BITSET_STATE_BYTES, BITSET_TRANSITION_BYTES
+from transition_table import NULL_STATE, TransitionTable
+
+ORDERS = ("bfs", "dfs")
+
+# Above this many NFA states the per-byte lookup tables cost more to build than they save
+BYTE_TABLE_STATE_LIMIT = 1 << 14
+
+
+class NFABitIndex:
+    '''
+    Gives every NFA state a bit position so that a set of NFA states can be stored as a single int.
+    For every letter it precomputes the successor mask of each state: the states reachable by reading
+    that letter and then following epsilon transitions. Python ints have no size limit, so NFAs with
+    more than 64 states need no special handling.
+    '''
+    def __init__(self, nfa):
+        self.nfa = nfa
+        self.alphabet = list(nfa.alphabet)
+        self.order = self.get_state_order()
+        self.positions = {state: i for i, state in enumerate(self.order)}
+
+        self.closure_masks = self.get_closure_masks()
+        self.accepting_mask = self.to_mask(s for s in nfa.accepting_states if s in self.positions)
+        self.successor_masks = [self.get_successor_masks(letter) for letter in self.alphabet]
+        self.byte_tables = None
+        if len(self.order) <= BYTE_TABLE_STATE_LIMIT:
+            self.byte_tables = [self.get_byte_tables(masks) for masks in self.successor_masks]
+
+    def get_state_order(self):
+        '''
+        Sorts every state that appears in the NFA, including transition targets missing from nfa.states
+        :return: list of states, bit i of a mask stands for the i-th state
+        '''
+        states = set(self.nfa.states)
+        for targets in self.nfa.delta_transition.values():
+            states.update(targets)
+        return sorted(states)
+
+    def get_closure_masks(self):
+        '''
+        Converts the NFA's epsilon closure index to masks, once per epsilon component, counting the
+        closures it computes in closure_count
+        :return: list of closure masks indexed by bit position
+        '''
+        closure_index = self.nfa.get_closure_index()
+        component_masks = {}
+        masks = []
+        self.closure_count = 0
+        for state in self.order:
+            component = closure_index.component_of.get(state)
+            mask = component_masks.get(component)
+            if mask is None:
+                mask = self.to_mask(closure_index.get_closure(state))
+                self.closure_count += 1
+                if component is not None:
+                    component_masks[component] = mask
+            masks.append(mask)
+        return masks
+
+    def to_mask(self, states):
+        '''
+        Packs NFA states into a bitmask
+        :param states: iterable of NFA states
+        :return: int with the bit of every given state set
+        '''
+        mask = 0
+        positions = self.positions
+        for state in states:
+            mask |= 1 << positions[state]
+        return mask
+
+    def to_states(self, mask):
+        '''
+        Unpacks a bitmask into the sorted tuple of NFA states it stands for
+        :param mask: bitmask of NFA states
+        :return: tuple of NFA states in sorted order
+        '''
+        order = self.order
+        states = []
+        while mask:
+            low_bit = mask & -mask
+            states.append(order[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return tuple(states)
+
+    def get_successor_masks(self, letter):
+        '''
+        For a single letter, finds the epsilon closed set of states each NFA state can move to
+        :param letter: letter of the alphabet
+        :return: list of masks indexed by bit position
+        '''
+        delta = self.nfa.delta_transition
+        closure_masks = self.closure_masks
+        positions = self.positions
+        masks = []
+        for state in self.order:
+            mask = 0
+            for target in delta.get((state, letter), ()):
+                mask |= closure_masks[positions[target]]
+            masks.append(mask)
+        return masks
+
+    def get_byte_tables(self, masks):
+        '''
+        Splits the states into groups of eight and stores the union of successor masks for
+        every one of the 256 possible bytes of each group, so a step costs one lookup per byte
+        instead of one per set bit.
+        :param masks: successor masks of one letter
+        :return: list of 256-entry lists, one per group of eight states
+        '''
+        return [self.get_byte_table(masks, start) for start in range(0, len(masks), 8)]
+
+    def get_byte_table(self, masks, start):
+        '''
+        :param masks: successor masks of one letter
+        :param start: bit position of the first state of the group
+        :return: 256-entry list of the unions of the group's successor masks
+        '''
+        group = masks[start:start + 8]
+        group += [0] * (8 - len(group))
+        table = [0] * 256
+        for byte in range(1, 256):
+            low_bit = byte & -byte
+            table[byte] = table[byte ^ low_bit] | group[low_bit.bit_length() - 1]
+        return table
+
+    def update_transition(self, state, letter_index):
+        '''
+        Recomputes the successor mask of one state on one letter after its NFA transitions changed, along
+        with the byte table of its group. Only valid for letter edits between states the index already has.
+        :param state: NFA state whose transitions changed
+        :param letter_index: position of the letter in the alphabet
+        :return: Void
+        '''
+        position = self.positions[state]
+        masks = self.successor_masks[letter_index]
+        mask = 0
+        for target in self.nfa.delta_transition.get((state, self.alphabet[letter_index]), ()):
+            mask |= self.closure_masks[self.positions[target]]
+        masks[position] = mask
+        if self.byte_tables is not None:
+            start = position - position % 8
+            self.byte_tables[letter_index][start // 8] = self.get_byte_table(masks, start)
+
+    def update_accepting(self):
+        '''
+        Recomputes accepting_mask after the NFA's accepting states changed
+        :return: Void
+        '''
+        self.accepting_mask = self.to_mask(s for s in self.nfa.accepting_states if s in self.positions)
+
+    def initial_mask(self):
+        '''
+        :return: mask of the epsilon closure of the NFA's initial state
+        '''
+        return self.closure_masks[self.positions[self.nfa.initial_state]]
+
+    def step(self, mask, letter_index):
+        '''
+        Moves a set of NFA states over one letter, including the epsilon closure of the result
+        :param mask: bitmask of the current NFA states
+        :param letter_index: position of the letter in the alphabet
+        :return: bitmask of the next NFA states
+        '''
+        result = 0
+        if self.byte_tables is not None:
+            tables = self.byte_tables[letter_index]
+            group = 0
+            while mask:
+                byte = mask & 255
+                if byte:
+                    result |= tables[group][byte]
+                mask >>= 8
+                group += 1
+            return result
+
+        masks = self.successor_masks[letter_index]
+        while mask:
+            low_bit = mask & -mask
+            result |= masks[low_bit.bit_length() - 1]
+            mask ^= low_bit
+        return result
+
+
+class BitsetSubsetEngine(TransitionTable):
+    '''
+    Subset construction where every DFA state is a bitmask of NFA states and gets a dense integer id.
+    The empty mask plays the role of the "Null set" state, so the transition table is always complete.
+    '''
+    def __init__(self, nfa, order="bfs", initial_states=None):
+        '''
+        :param nfa: NFA to determinize
+        :param order: "bfs" or "dfs", the order in which discovered subsets are expanded
+        :param initial_states: NFA states to start from instead of nfa.initial_state, for automata
+        with several initial states
+        '''
+        if order not in ORDERS:
+            raise ValueError("Unknown order " + repr(order) + ", expected one of " + str(ORDERS))
+        self.index = NFABitIndex(nfa)
+        TransitionTable.__init__(self, self.index.alphabet)
+        self.order = order
+        self.subsets = []
+        self.ids = {}
+        self.explored_count = 0
+        self.memory_bytes = 0
+        self.budget_exceeded = None
+        if initial_states is None:
+            self.initial_mask = self.index.initial_mask()
+        else:
+            self.initial_mask = self.index.to_mask(nfa.get_set_epsilon_closure(initial_states))
+
+    def add_subset(self, mask):
+        '''
+        Gives a newly discovered subset the next free id and an empty row in the table
+        :param mask: bitmask of NFA states
+        :return: id of the subset
+        '''
+        subset_id = len(self.subsets)
+        self.ids[mask] = subset_id
+        self.subsets.append(mask)
+        self.accepting.append(1 if mask & self.index.accepting_mask else 0)
+        self.table.extend(self._blank_row)
+        self.memory_bytes += (mask.bit_length() + 7) // 8 + BITSET_STATE_BYTES + BITSET_TRANSITION_BYTES * self.letter_count
+        return subset_id
+
+    def run(self, budget=None, profile=None):
+        '''
+        Explores every subset reachable from the initial state with an explicit worklist, so the number
+        of subsets is not limited by the recursion depth. Ids are handed out in discovery order, which only
+        depends on the NFA and the exploration order: "bfs" expands the oldest subset first, "dfs" the newest.
+        :param budget: ConstructionBudget, checked before each subset is expanded. When a limit is reached
+        the run stops, budget_exceeded names the limit, and the rows of unexpanded subsets stay -1.
+        :param profile: ConstructionProfile, or None. With one the run goes through run_profiled instead,
+        so the loop below carries no profiling code.
+        :return: self
+        '''
+        if profile is not None:
+            return self.run_profiled(budget, profile)
+        index = self.index
+        ids = self.ids
+        subsets = self.subsets
+        table = self.table
+        letter_count = self.letter_count
+        self._blank_row = array("l", [-1]) * letter_count
+
+        self.initial = self.add_subset(self.initial_mask)
+        worklist = deque([self.initial])
+        take = worklist.popleft if self.order == "bfs" else worklist.pop
+        while worklist:
+            if budget is not None:
+                self.budget_exceeded = budget.exceeded(len(subsets), self.explored_count * letter_count, self.memory_bytes)
+                if self.budget_exceeded is not None:
+                    break
+            subset_id = take()
+            mask = subsets[subset_id]
+            row_start = subset_id * letter_count
+            for letter_index in range(letter_count):
+                next_mask = index.step(mask, letter_index)
+                next_id = ids.get(next_mask)
+                if next_id is None:
+                    next_id = self.add_subset(next_mask)
+                    worklist.append(next_id)
+                table[row_start + letter_index] = next_id
+            self.explored_count += 1
+        return self
+
+    def run_profiled(self, budget, profile):
+        '''
+        Same exploration as run, timing the "step" and "dedup" phases of every transition and reporting
+        every new subset to the profile
+        :param budget: ConstructionBudget or None
+        :param profile: ConstructionProfile
+        :return: self
+        '''
+        index = self.index
+        ids = self.ids
+        subsets = self.subsets
+        table = self.table
+        letter_count = self.letter_count
+        perf_counter = time.perf_counter
+        self._blank_row = array("l", [-1]) * letter_count
+
+        self.initial = self.add_subset(self.initial_mask)
+        profile.subset_created(self.initial, self.initial_mask.bit_count())
+        worklist = deque([self.initial])
+        take = worklist.popleft if self.order == "bfs" else worklist.pop
+        step_time = 0.0
+        dedup_time = 0.0
+        duplicate_hits = 0
+        while worklist:
+            if budget is not None:
+                self.budget_exceeded = budget.exceeded(len(subsets), self.explored_count * letter_count, self.memory_bytes)
+                if self.budget_exceeded is not None:
+                    break
+            subset_id = take()
+            mask = subsets[subset_id]
+            row_start = subset_id * letter_count
+            for letter_index in range(letter_count):
+                start_time = perf_counter()
+                next_mask = index.step(mask, letter_index)
+                middle_time = perf_counter()
+                next_id = ids.get(next_mask)
+                if next_id is None:
+                    next_id = self.add_subset(next_mask)
+                    worklist.append(next_id)
+                    profile.subset_created(next_id, next_mask.bit_count())
+                else:
+                    duplicate_hits += 1
+                table[row_start + letter_index] = next_id
+                dedup_time += perf_counter() - middle_time
+                step_time += middle_time - start_time
+            self.explored_count += 1
+        profile.add_time("step", step_time)
+        profile.add_time("dedup", dedup_time)
+        profile.count("duplicate_hits", duplicate_hits)
+        profile.count("transitions_emitted", self.explored_count * letter_count)
+        return self
+
+    def update_accepting(self):
+        '''
+        Recomputes which subsets accept after the NFA's accepting states changed, without exploring anything
+        :return: Void
+        '''
+        self.index.update_accepting()
+        accepting_mask = self.index.accepting_mask
+        self.accepting = bytearray(1 if mask & accepting_mask else 0 for mask in self.subsets)
+
+    def update_transitions(self, edits):
+        '''
+        Brings a finished construction up to date after letter transitions of the NFA changed. Only the rows of
+        subsets holding an edited state are recomputed, and only on the edited letters; subsets they now
+        reach for the first time are explored as usual. The states are then renumbered as a fresh run would
+        number them, dropping subsets that are no longer reachable.
+        :param edits: iterable of (NFA state, letter) whose transitions changed
+        :return: whether the update was done. False when an edit is an epsilon edit, or involves a state or
+        letter the construction did not know, which the index cannot absorb; the engine is then unchanged.
+        '''
+        index = self.index
+        positions = index.positions
+        letter_of = {letter: letter_index for letter_index, letter in enumerate(index.alphabet)}
+        changed = {}
+        for state, letter in edits:
+            if state not in positions or letter not in letter_of:
+                return False
+            if any(target not in positions for target in index.nfa.delta_transition.get((state, letter), ())):
+                return False
+            changed[letter_of[letter]] = changed.get(letter_of[letter], 0) | 1 << positions[state]
+        for letter_index, edited_mask in changed.items():
+            for position in range(edited_mask.bit_length()):
+                if edited_mask >> position & 1:
+                    index.update_transition(index.order[position], letter_index)
+
+        ids = self.ids
+        table = self.table
+        letter_count = self.letter_count
+        worklist = []
+        for subset_id, mask in enumerate(self.subsets):
+            for letter_index, edited_mask in changed.items():
+                if mask & edited_mask:
+                    next_mask = index.step(mask, letter_index)
+                    next_id = ids.get(next_mask)
+                    if next_id is None:
+                        next_id = self.add_subset(next_mask)
+                        worklist.append(next_id)
+                    table[subset_id * letter_count + letter_index] = next_id
+        while worklist:
+            subset_id = worklist.pop()
+            mask = self.subsets[subset_id]
+            for letter_index in range(letter_count):
+                next_mask = index.step(mask, letter_index)
+                next_id = ids.get(next_mask)
+                if next_id is None:
+                    next_id = self.add_subset(next_mask)
+                    worklist.append(next_id)
+                table[subset_id * letter_count + letter_index] = next_id
+        self.renumber()
+        return True
+
+    def renumber(self):
+        '''
+        Walks the transition table from the initial state the way run explores subsets, in the same order,
+        renumbers the reachable subsets in the order the walk meets them, dropping the others, and
+        recomputes the accepting flags
+        :return: Void
+        '''
+        letter_count = self.letter_count
+        old_count = len(self.subsets)
+        typecode = np.dtype(self.table.typecode)
+        table = np.frombuffer(self.table, dtype=typecode).reshape(old_count, letter_count)
+        found = self.walk_breadth_first(table) if self.order == "bfs" else self.walk_depth_first(table)
+
+        if len(found) != old_count or np.any(found != np.arange(old_count)):
+            new_id = np.full(old_count, -1, dtype=np.int64)
+            new_id[found] = np.arange(len(found))
+            old_subsets = self.subsets
+            self.subsets = [old_subsets[old_id] for old_id in found.tolist()]
+            self.ids = dict(zip(self.subsets, range(len(self.subsets))))
+            self.table = array(self.table.typecode)
+            self.table.frombytes(new_id[table[found]].astype(typecode).tobytes())
+            self.initial = 0
+            self.explored_count = len(found)
+            self.memory_bytes = sum((mask.bit_length() + 7) // 8 for mask in self.subsets) + len(found) * (
+                BITSET_STATE_BYTES + BITSET_TRANSITION_BYTES * letter_count)
+        accepting_mask = self.index.accepting_mask
+        self.accepting = bytearray(1 if mask & accepting_mask else 0 for mask in self.subsets)
+
+    def walk_breadth_first(self, table):
+        '''
+        Breadth first order of the subsets reachable from the initial state, one NumPy step per level. Within a
+        level, subsets come in the order of their first appearance among the targets of the previous level,
+        which is the order run discovers them in.
+        :param table: transition table as a NumPy matrix
+        :return: int64 array of subset ids in walk order
+        '''
+        seen = np.zeros(len(table), dtype=bool)
+        frontier = np.array([self.initial], dtype=np.int64)
+        seen[frontier] = True
+        levels = [frontier]
+        while True:
+            targets = table[frontier].ravel()
+            targets = targets[~seen[targets]]
+            if len(targets) == 0:
+                break
+            unique_targets, first_positions = np.unique(targets, return_index=True)
+            frontier = unique_targets[np.argsort(first_positions)].astype(np.int64)
+            seen[frontier] = True
+            levels.append(frontier)
+        return np.concatenate(levels)
+
+    def walk_depth_first(self, table):
+        '''
+        Depth first order of the subsets reachable from the initial state, following run's worklist
+        :param table: transition table as a NumPy matrix
+        :return: int64 array of subset ids in walk order
+        '''
+        rows = table.tolist()
+        seen = bytearray(len(rows))
+        seen[self.initial] = 1
+        found = [self.initial]
+        pending = [self.initial]
+        while pending:
+            for next_id in rows[pending.pop()]:
+                if not seen[next_id]:
+                    seen[next_id] = 1
+                    found.append(next_id)
+                    pending.append(next_id)
+        return np.array(found, dtype=np.int64)
+
+    def label(self, subset_id):
+        '''
+        :param subset_id: id of a DFA state
+        :return: the tuple of NFA states used by DFA.states, or "Null set" for the empty subset
+        '''
+        mask = self.subsets[subset_id]
+        if mask == 0:
+            return NULL_STATE
+        return self.index.to_states(mask)
+
+    def null_state(self):
+        '''
+        :return: id of the empty subset, or None when it was never reached
+        '''
+        return self.ids.get(0)
@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+import numpy as np
+
+from nfa import NFA
+from transition_table import TransitionTable
+
+
+class SymbolClasses:
+    '''
+    Partition of an alphabet into classes of letters that every transition of an NFA treats alike: two
+    letters share a class when each state moves to the same targets on both. Subset construction only has
+    to follow one letter per class, the representative, so its cost and the width of its transition table
+    grow with the number of classes instead of the size of the alphabet. Letters with no transitions at
+    all form one class, which is what makes byte and larger alphabets cheap when an NFA only uses a few.
+    '''
+    def __init__(self, alphabet, classes):
+        '''
+        :param alphabet: the letters, in order
+        :param classes: list of lists of letters, in order of their first letter in the alphabet
+        '''
+        self.alphabet = list(alphabet)
+        self.classes = classes
+        self.representatives = [letters[0] for letters in classes]
+        self.class_of = {letter: class_id for class_id, letters in enumerate(classes) for letter in letters}
+        # class of the letter at every position of the alphabet, the column it reads in a class table
+        self.columns = [self.class_of[letter] for letter in self.alphabet]
+
+    @classmethod
+    def from_nfa(cls, nfa):
+        '''
+        Groups the letters of an NFA by the transitions they have, in one pass over the transitions
+        :param nfa: NFA
+        :return: SymbolClasses of nfa.alphabet
+        '''
+        moves = defaultdict(list)
+        for (state, symbol), targets in nfa.delta_transition.items():
+            if symbol != "epsilon" and len(targets) > 0:
+                moves[symbol].append((state, frozenset(targets)))
+
+        class_of_signature = {}
+        classes = []
+        for letter in nfa.alphabet:
+            signature = frozenset(moves.get(letter, ()))
+            class_id = class_of_signature.get(signature)
+            if class_id is None:
+                class_id = class_of_signature[signature] = len(classes)
+                classes.append([])
+            classes[class_id].append(letter)
+        return cls(nfa.alphabet, classes)
+
+    def class_count(self):
+        '''
+        :return: number of classes
+        '''
+        return len(self.classes)
+
+    def compress_nfa(self, nfa):
+        '''
+        :param nfa: NFA the classes were made from
+        :return: NFA with the same states whose alphabet is the representatives, keeping only their
+        transitions and the epsilon transitions
+        '''
+        kept = set(self.representatives)
+        kept.add("epsilon")
+        delta_transition = defaultdict(list)
+        for (state, symbol), targets in nfa.delta_transition.items():
+            if symbol in kept and len(targets) > 0:
+                delta_transition[(state, symbol)] = targets
+        return NFA(nfa.states, delta_transition, nfa.initial_state, nfa.accepting_states, list(self.representatives))
+
+    def expand_table(self, transition_table):
+        '''
+        :param transition_table: TransitionTable with one column per class
+        :return: TransitionTable over the full alphabet, with one column per letter
+        '''
+        table = np.frombuffer(transition_table.table, dtype=np.dtype(transition_table.table.typecode))
+        expanded = TransitionTable(self.alphabet, accepting=bytearray(transition_table.accepting),
+                                   initial=transition_table.initial, labels=transition_table.labels)
+        if transition_table.labels is None and transition_table.state_count() > 0:
+            expanded.labels = [transition_table.label(state_id) for state_id in range(transition_table.state_count())]
+        expanded.table.frombytes(table.reshape(-1, transition_table.letter_count)[:, self.columns].tobytes())
+        return expanded
@@ -247,5 +247,989 @@ class TestingSuite(unittest.TestCase):
             expected_accepting_states
         )
 
+    def build_example_nfa(self):
+        """
+        The NFA from test_nfa_example, shared by the engine tests.
+        """
+        nfa_delta_transition = defaultdict(list)
+        nfa_delta_transition[(1, 0)] = [2]
+        nfa_delta_transition[(1, "epsilon")] = [3]
+        nfa_delta_transition[(2, 1)] = [2, 4]
+        nfa_delta_transition[(3, "epsilon")] = [2]
+        nfa_delta_transition[(3, 0)] = [4]
+        nfa_delta_transition[(4, 0)] = [3]
+
+        return NFA({1, 2, 3, 4}, nfa_delta_transition, 1, {3, 4}, [0, 1])
+
+    def test_bitset_engine_matches_tuple_engine(self):
+        """
+        The bitset engine builds the same tuple keyed view as the tuple engine, but only when it is read.
+        """
+        expected = DFA(self.build_example_nfa())
+        dfa = DFA(self.build_example_nfa(), engine="bitset")
+
+        self.assertEqual(len(dfa.subset_engine.subsets), 5)
+        self.assertTrue(dfa._view_pending)
+
+        self.check_dfa_against_expected(
+            dfa,
+            expected.states,
+            expected.initial_state,
+            dict(expected.delta_transition),
+            expected.accepting_states
+        )
+
+    def build_nth_from_last_nfa(self, n):
+        """
+        NFA accepting strings whose n-th symbol from the end is 1, its DFA has 2^n states.
+        """
+        nfa_delta_transition = defaultdict(list)
+        nfa_delta_transition[(0, 0)] = [0]
+        nfa_delta_transition[(0, 1)] = [0, 1]
+        for i in range(1, n):
+            nfa_delta_transition[(i, 0)] = [i + 1]
+            nfa_delta_transition[(i, 1)] = [i + 1]
+
+        return NFA(set(range(n + 1)), nfa_delta_transition, 0, {n}, [0, 1])
+
+    def test_worklist_handles_more_states_than_recursion_limit(self):
+        """
+        Both engines and both exploration orders reach all 2^11 subsets without recursing.
+        """
+        for engine in ("tuple", "bitset"):
+            for order in ("bfs", "dfs"):
+                dfa = DFA(self.build_nth_from_last_nfa(11), engine=engine, order=order)
+                self.assertEqual(len(dfa.states), 2 ** 11)
+                self.assertEqual(len(dfa.state_order), 2 ** 11)
+                self.assertEqual(dfa.state_order[0], (0,))
+
+        first = DFA(self.build_nth_from_last_nfa(6), engine="bitset", order="dfs")
+        second = DFA(self.build_nth_from_last_nfa(6), engine="bitset", order="dfs")
+        self.assertEqual(first.state_order, second.state_order)
+
+    def test_epsilon_closure_index(self):
+        """
+        States on an epsilon cycle share one closure, and set closures union the member closures.
+        """
+        nfa_delta_transition = defaultdict(list)
+        nfa_delta_transition[(1, "epsilon")] = [2]
+        nfa_delta_transition[(2, "epsilon")] = [3]
+        nfa_delta_transition[(3, "epsilon")] = [1, 4]
+        nfa_delta_transition[(4, 0)] = [5]
+        nfa_delta_transition[(5, "epsilon")] = [6]
+
+        nfa = NFA({1, 2, 3, 4, 5, 6}, nfa_delta_transition, 1, {6}, [0])
+
+        self.assertEqual(nfa.get_epsilon_closure(2), {1, 2, 3, 4})
+        self.assertIs(nfa.get_epsilon_closure(1), nfa.get_epsilon_closure(3))
+        self.assertEqual(nfa.get_epsilon_closure(4), {4})
+        self.assertEqual(nfa.get_set_epsilon_closure([4, 5]), {4, 5, 6})
+        self.assertEqual(len(nfa.get_closure_index().components), 4)
+
+    def run_dfa(self, dfa, word):
+        """
+        Follows the tuple keyed delta_transition of a DFA over a word and reports acceptance.
+        """
+        state = dfa.initial_state
+        for letter in word:
+            state = dfa.delta_transition[(state, letter)]
+            if state == ("Null set",):
+                return False
+        return state in dfa.accepting_states
+
+    def all_words(self, alphabet, max_length):
+        """
+        Every word over the alphabet up to the given length.
+        """
+        words = [()]
+        for word in words:
+            if len(word) < max_length:
+                words.extend(word + (letter,) for letter in alphabet)
+        return words
+
+    def test_remove_epsilon_transitions(self):
+        """
+        The epsilon-free NFA has no epsilon transitions and its DFA accepts the same words.
+        """
+        nfa = self.build_example_nfa()
+        epsilon_free = nfa.remove_epsilon_transitions()
+
+        self.assertFalse(any(symbol == "epsilon" for (_, symbol) in epsilon_free.delta_transition))
+        self.assertEqual(epsilon_free.accepting_states, {1, 3, 4})
+
+        expected = DFA(self.build_example_nfa())
+        for engine in ("tuple", "bitset"):
+            dfa = DFA(self.build_example_nfa(), engine=engine, remove_epsilons=True)
+            self.assertLessEqual(len(dfa.states), len(expected.states) + 1)
+            for word in self.all_words([0, 1], 6):
+                self.assertEqual(self.run_dfa(dfa, word), self.run_dfa(expected, word), word)
+
+    def test_hopcroft_minimization(self):
+        """
+        Equivalent subsets are merged, the sink keeps its name, and the language does not change.
+        """
+        nfa_delta_transition = defaultdict(list)
+        nfa_delta_transition[(1, 0)] = [2]
+        nfa_delta_transition[(1, 1)] = [1]
+        nfa_delta_transition[(2, 0)] = [1]
+        nfa_delta_transition[(2, 1)] = [2]
+        nfa = NFA({1, 2}, nfa_delta_transition, 1, {1, 2}, [0, 1])
+
+        for engine in ("tuple", "bitset"):
+            minimal = DFA(nfa, engine=engine).minimize()
+            self.check_dfa_against_expected(
+                minimal,
+                {0},
+                0,
+                {(0, 0): 0, (0, 1): 0},
+                {0}
+            )
+
+        for engine in ("tuple", "bitset"):
+            dfa = DFA(self.build_example_nfa(), engine=engine)
+            minimal = dfa.minimize()
+            self.assertIn("Null set", minimal.states)
+            self.assertEqual(len(minimal.states), 5)
+            for word in self.all_words([0, 1], 6):
+                self.assertEqual(self.run_dfa(minimal, word), self.run_dfa(dfa, word), word)
+
+    def test_brzozowski_engine_builds_minimal_dfa(self):
+        """
+        Brzozowski's construction gives a DFA of the same size and language as subset construction plus Hopcroft.
+        """
+        expected = DFA(self.build_example_nfa(), engine="bitset").minimize()
+        dfa = DFA(self.build_example_nfa(), engine="brzozowski")
+
+        self.assertEqual(len(dfa.states), len(expected.states))
+        self.assertIn("Null set", dfa.states)
+        for word in self.all_words([0, 1], 6):
+            self.assertEqual(self.run_dfa(dfa, word), self.run_dfa(expected, word), word)
+
+        dfa = DFA(self.build_nth_from_last_nfa(5), engine="brzozowski")
+        self.assertEqual(len(dfa.states), 2 ** 5)
+
+    def test_minimizations_name_states_alike(self):
+        """
+        Hopcroft and Brzozowski give the same table, names included, also for an empty language whose subset
+        DFA never reaches the null set and for a trap state that is not the null set.
+        """
+        from minimization import brzozowski_minimize, hopcroft_minimize
+
+        empty_transitions = defaultdict(list)
+        empty_transitions[(0, 0)] = [0]
+        empty_transitions[(0, 1)] = [1]
+        empty_transitions[(1, 0)] = [0]
+        trap_transitions = defaultdict(list)
+        trap_transitions[(0, 0)] = [1]
+        trap_transitions[(0, 1)] = [2]
+        trap_transitions[(2, 0)] = [2]
+        trap_transitions[(2, 1)] = [2]
+        nfas = [
+            lambda: NFA({0, 1}, empty_transitions, 0, set(), [0, 1]),
+            lambda: NFA({0, 1, 2}, trap_transitions, 0, {1}, [0, 1]),
+            self.build_example_nfa,
+        ]
+        for build_nfa in nfas:
+            hopcroft = hopcroft_minimize(DFA(build_nfa(), engine="bitset").get_transition_table())
+            brzozowski = brzozowski_minimize(build_nfa())
+            self.assertEqual(list(brzozowski.table), list(hopcroft.table))
+            self.assertEqual(brzozowski.accepting, hopcroft.accepting)
+            self.assertEqual(brzozowski.labels, hopcroft.labels)
+        self.assertEqual(brzozowski_minimize(nfas[0]()).labels, ["Null set"])
+
+    def test_compile_to_dense_table(self):
+        """
+        The compiled form keeps the transitions of the tuple keyed view and converts back without loss.
+        """
+        for engine in ("tuple", "bitset"):
+            dfa = DFA(self.build_example_nfa(), engine=engine)
+            compiled = dfa.compile()
+
+            self.assertEqual(compiled.transitions.shape, (5, 2))
+            self.assertEqual(str(compiled.transitions.dtype), "int32")
+            self.assertEqual(compiled.label(compiled.start), dfa.initial_state)
+            for state_id in range(compiled.state_count()):
+                label = compiled.label(state_id)
+                self.assertEqual(bool(compiled.accepting[state_id]), label in dfa.accepting_states)
+                for letter in dfa.alphabet:
+                    next_label = compiled.label(compiled.transitions[state_id, compiled.symbol_index[letter]])
+                    expected = dfa.delta_transition[(label, letter)]
+                    self.assertEqual(next_label, "Null set" if expected == ("Null set",) else expected)
+
+            round_trip = DFA.from_transition_table(compiled.to_transition_table())
+            self.assertEqual(dict(round_trip.delta_transition), dict(dfa.delta_transition))
+            self.assertEqual(compiled.minimize().state_count(), 5)
+
+    def test_compiled_matching(self):
+        """
+        Single, batched and streamed matching agree with the tuple keyed view for every input form.
+        """
+        import numpy as np
+
+        dfa = DFA(self.build_example_nfa(), engine="bitset")
+        compiled = dfa.compile()
+        words = self.all_words([0, 1], 6)
+        expected = [self.run_dfa(dfa, word) for word in words]
+
+        self.assertEqual([compiled.accepts(word) for word in words], expected)
+        self.assertEqual(list(compiled.accepts_many(words)), expected)
+
+        six_letter_words = [word for word in words if len(word) == 6]
+        six_letter_expected = [self.run_dfa(dfa, word) for word in six_letter_words]
+        batch = np.array(six_letter_words, dtype=np.uint8)
+        self.assertEqual(list(compiled.accepts_many(batch)), six_letter_expected)
+        self.assertEqual(list(compiled.accepts_many(batch.tobytes(), length=6)), six_letter_expected)
+
+        for word, accepted in zip(six_letter_words, six_letter_expected):
+            self.assertEqual(compiled.accepts(bytes(word)), accepted)
+            self.assertEqual(compiled.accepts("".join(map(str, word))), accepted)
+            stream = compiled.stream()
+            stream.feed(word[:2]).feed(np.array(word[2:], dtype=np.uint8))
+            self.assertEqual(stream.accepts(), accepted)
+
+        with self.assertRaises(ValueError):
+            compiled.accepts(bytes([0, 2]))
+
+    def test_match_stream_after_dead_state(self):
+        """
+        A stream that reached a dead state still counts the letters fed and rejects letters outside the alphabet.
+        """
+        import numpy as np
+
+        nfa_delta_transition = defaultdict(list)
+        nfa_delta_transition[(0, 0)] = [1]
+        compiled = DFA(NFA({0, 1}, nfa_delta_transition, 0, {1}, [0, 1])).compile()
+
+        stream = compiled.stream().feed([1])
+        self.assertTrue(stream.dead[stream.state])
+        stream.feed([0, 1, 0])
+        self.assertEqual(stream.letters_read, 4)
+        self.assertFalse(stream.accepts())
+
+        with self.assertRaises(ValueError) as live_context:
+            compiled.stream().feed(bytes([2]))
+        with self.assertRaises(ValueError) as dead_context:
+            stream.feed(bytes([2]))
+        self.assertEqual(str(dead_context.exception), str(live_context.exception))
+        self.assertEqual(stream.letters_read, 4)
+
+        # a chunk that dies early is counted whole and leaves the run in the dead state
+        stream = compiled.stream().feed([1] + [0] * 1000)
+        self.assertEqual(stream.letters_read, 1001)
+        self.assertTrue(stream.dead[stream.state])
+
+        # letters outside the alphabet raise ValueError, whatever the form of the input
+        for word in [[5], "x", "02", bytes([2]), np.array([7])]:
+            with self.assertRaises(ValueError):
+                compiled.accepts(word)
+            with self.assertRaises(ValueError):
+                compiled.stream().feed(word)
+
+    def test_lazy_dfa_with_bounded_cache(self):
+        """
+        The lazy DFA agrees with the full DFA when its cache is far smaller than the DFA, and falls back
+        to NFA simulation when the cache thrashes.
+        """
+        from lazy_dfa import LazyDFA
+
+        expected = DFA(self.build_nth_from_last_nfa(6), engine="bitset").compile()
+        words = self.all_words([0, 1], 9)
+
+        lazy_dfa = LazyDFA(self.build_nth_from_last_nfa(6), max_states=4)
+        self.assertEqual(lazy_dfa.accepts_many(words), [expected.accepts(word) for word in words])
+
+        statistics = lazy_dfa.get_statistics()
+        self.assertLessEqual(statistics["cached_states"], 4)
+        self.assertGreater(statistics["evictions"], 0)
+        self.assertGreater(statistics["fallbacks"], 0)
+
+        lazy_dfa = LazyDFA(self.build_nth_from_last_nfa(6))
+        lazy_dfa.accepts_many(words)
+        self.assertEqual(lazy_dfa.get_statistics()["evictions"], 0)
+        self.assertEqual(lazy_dfa.state_count(), 2 ** 6)
+
+        # inputs shorter than the cache never check the hit rate on their own, accepts_many checks across them
+        short_words = [word for word in self.all_words([0, 1], 4) if len(word) == 4] * 10
+        lazy_dfa = LazyDFA(self.build_nth_from_last_nfa(6), max_states=4)
+        self.assertEqual(lazy_dfa.accepts_many(short_words), [expected.accepts(word) for word in short_words])
+        self.assertEqual(lazy_dfa.get_statistics()["fallbacks"], 1)
+        self.assertLess(lazy_dfa.hits + lazy_dfa.misses, 4 * len(short_words))
+
+    def test_lazy_dfa_without_states(self):
+        """
+        A lazy DFA of an NFA with no states and no initial state rejects every input, like NFASimulator.
+        """
+        from lazy_dfa import LazyDFA
+        from nfa_simulator import NFASimulator
+
+        empty_nfa = NFA(set(), defaultdict(list), None, set(), [0, 1])
+        words = self.all_words([0, 1], 3)
+        lazy_dfa = LazyDFA(empty_nfa, max_states=2)
+        self.assertEqual(lazy_dfa.accepts_many(words), [False] * len(words))
+        self.assertEqual(lazy_dfa.accepts_many(words), NFASimulator(empty_nfa).accepts_many(words))
+
+    def test_nfa_simulation(self):
+        """
+        Direct NFA simulation, one input at a time and batched, agrees with the DFA.
+        """
+        from nfa_simulator import NFASimulator
+
+        dfa = DFA(self.build_example_nfa())
+        simulator = NFASimulator(self.build_example_nfa())
+        words = self.all_words([0, 1], 7)
+        expected = [self.run_dfa(dfa, word) for word in words]
+
+        self.assertEqual([simulator.accepts(word) for word in words], expected)
+        self.assertEqual(simulator.accepts_many(words), expected)
+        self.assertEqual(simulator.run([0, 0, 0, 1, 0]), 0)
+
+    def test_load_compact_nfa(self):
+        """
+        The array parser reads the same NFA as parse_nfa_file and reports the line of a bad transition.
+        """
+        import os
+        import tempfile
+        from nfa_parser import NFAParseError, load_compact_nfa, parse_nfa_file
+
+        compact_nfa = load_compact_nfa("sample_nfa.txt")
+        states, alphabet, transitions, initial, accepting = parse_nfa_file("sample_nfa.txt")
+        nfa = compact_nfa.to_nfa()
+        self.assertEqual(nfa.states, states)
+        self.assertEqual(nfa.alphabet, alphabet)
+        self.assertEqual(nfa.initial_state, initial)
+        self.assertEqual(nfa.accepting_states, accepting)
+        self.assertEqual({key: sorted(value) for key, value in nfa.delta_transition.items()},
+                         {key: sorted(value) for key, value in transitions.items() if value})
+
+        for text, line_number in [("states: 1,2\nalphabet: 0\ntransition: 1,0 -> 2\ntransition: 2,0 -> 3\n", 4),
+                                  ("states: 1\nalphabet: 0\n\ntransition: 1,x -> 1\n", 4)]:
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+                file.write(text)
+            try:
+                with self.assertRaises(NFAParseError) as context:
+                    load_compact_nfa(file.name)
+                self.assertEqual(context.exception.line_number, line_number)
+            finally:
+                os.remove(file.name)
+
+    def test_load_compact_nfa_skips_other_lines(self):
+        """
+        Indented headers, blank lines and comments between transitions are skipped by both loaders alike.
+        """
+        import os
+        import tempfile
+        from nfa_parser import load_compact_nfa, parse_nfa_file
+
+        text = ("  states: 1,2,3\n"
+                "\talphabet: 0,1\n"
+                " initial: 1\n"
+                "accepting: 3\n"
+                "\n"
+                "transition: 1,0 -> 2\n"
+                "# loops back to the start\n"
+                "  transition: 2,1 -> 1,3\n"
+                "\n"
+                "transition: 3,epsilon -> 1\n")
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+            file.write(text)
+        try:
+            nfa = load_compact_nfa(file.name).to_nfa()
+            states, alphabet, transitions, initial, accepting = parse_nfa_file(file.name)
+        finally:
+            os.remove(file.name)
+        self.assertEqual(nfa.states, states)
+        self.assertEqual(nfa.alphabet, alphabet)
+        self.assertEqual(nfa.initial_state, initial)
+        self.assertEqual(nfa.accepting_states, accepting)
+        self.assertEqual({key: sorted(value) for key, value in nfa.delta_transition.items()},
+                         {key: sorted(value) for key, value in transitions.items() if value})
+
+    def test_binary_format_round_trip(self):
+        """
+        NFAs and DFAs written in the binary format load back unchanged, as views of the mapped file.
+        """
+        import os
+        import tempfile
+        from binary_format import BinaryFormatError, load_dfa, load_nfa, save_dfa, save_nfa
+
+        nfa = self.build_example_nfa()
+        dfa = DFA(self.build_example_nfa()).compile()
+        with tempfile.TemporaryDirectory() as directory:
+            nfa_path = os.path.join(directory, "example.nfa")
+            dfa_path = os.path.join(directory, "example.dfa")
+            save_nfa(nfa, nfa_path)
+            save_dfa(dfa, dfa_path)
+
+            loaded_nfa = load_nfa(nfa_path).to_nfa()
+            self.assertEqual(loaded_nfa.accepting_states, nfa.accepting_states)
+            self.assertEqual(loaded_nfa.initial_state, nfa.initial_state)
+            self.assertEqual({key: sorted(value) for key, value in loaded_nfa.delta_transition.items()},
+                             {key: sorted(value) for key, value in nfa.delta_transition.items() if value})
+
+            loaded_dfa = load_dfa(dfa_path)
+            self.assertFalse(loaded_dfa.transitions.flags.writeable)
+            self.assertEqual(loaded_dfa.transitions.tolist(), dfa.transitions.tolist())
+            words = self.all_words([0, 1], 6)
+            self.assertEqual(loaded_dfa.accepts_many(words).tolist(), dfa.accepts_many(words).tolist())
+
+            with self.assertRaises(BinaryFormatError):
+                load_nfa(dfa_path)
+
+    def test_determinization_cache(self):
+        """
+        The cache hashes NFAs independently of ordering, serves repeated NFAs from disk and evicts by size.
+        """
+        import tempfile
+        from dfa_cache import DeterminizationCache, canonical_nfa_hash
+
+        nfa = self.build_example_nfa()
+        reordered_delta_transition = defaultdict(list)
+        for key in reversed(list(nfa.delta_transition)):
+            reordered_delta_transition[key] = list(reversed(nfa.delta_transition[key]))
+        reordered_delta_transition[(4, 1)] = []
+        reordered = NFA({4, 3, 2, 1}, reordered_delta_transition, 1, {4, 3}, [0, 1])
+        self.assertEqual(canonical_nfa_hash(nfa), canonical_nfa_hash(reordered))
+        # the alphabet order is the column order of the DFA, so it is part of the hash
+        swapped_alphabet = NFA({1, 2, 3, 4}, reordered_delta_transition, 1, {3, 4}, [1, 0])
+        self.assertNotEqual(canonical_nfa_hash(nfa), canonical_nfa_hash(swapped_alphabet))
+        self.assertNotEqual(canonical_nfa_hash(nfa), canonical_nfa_hash(self.build_nth_from_last_nfa(2)))
+
+        expected = DFA(self.build_example_nfa())
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DeterminizationCache(directory)
+            cache.determinize(nfa)
+            dfa = cache.determinize(reordered)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertEqual(dfa.states, expected.states)
+            self.assertEqual(dict(dfa.delta_transition), dict(expected.delta_transition))
+            self.assertEqual(dfa.initial_state, expected.initial_state)
+            self.assertEqual(dfa.accepting_states, expected.accepting_states)
+
+            small_cache = DeterminizationCache(directory, max_bytes=cache.size_in_bytes())
+            small_cache.determinize(self.build_nth_from_last_nfa(3))
+            statistics = small_cache.get_statistics()
+            self.assertEqual((statistics["entries"], statistics["evictions"]), (1, 1))
+            self.assertIsNone(small_cache.get(nfa))
+
+    def test_determinization_cache_unreadable_entry(self):
+        """
+        An empty or truncated entry is a miss that deletes the entry, and the next lookup builds it again.
+        """
+        import os
+        import tempfile
+        from dfa_cache import DeterminizationCache
+
+        nfa = self.build_example_nfa()
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DeterminizationCache(directory)
+            cache.determinize(nfa)
+            path = cache.get_entry_path(nfa)
+            with open(path, "rb") as file:
+                contents = file.read()
+            for damaged in [b"", contents[:40], contents[:len(contents) // 2]]:
+                with open(path, "wb") as file:
+                    file.write(damaged)
+                misses = cache.misses
+                self.assertIsNone(cache.get(nfa))
+                self.assertEqual(cache.misses, misses + 1)
+                self.assertFalse(os.path.exists(path))
+                dfa = cache.determinize(nfa)
+                self.assertEqual(dfa.states, DFA(nfa).states)
+                self.assertTrue(os.path.exists(path))
+
+    def test_determinization_cache_hit_updates_like_miss(self):
+        """
+        A DFA served from the cache keeps its engine and is brought up to date by DFA.update like a built one.
+        """
+        import tempfile
+        from dfa_cache import DeterminizationCache
+
+        for engine in ["tuple", "bitset", "compact", "brzozowski"]:
+            with tempfile.TemporaryDirectory() as directory:
+                cache = DeterminizationCache(directory, engine=engine)
+                missed_nfa = self.build_example_nfa()
+                hit_nfa = self.build_example_nfa()
+                missed = cache.determinize(missed_nfa)
+                hit = cache.determinize(hit_nfa)
+                self.assertEqual((cache.hits, cache.misses), (1, 1))
+                self.assertEqual(hit.engine, engine)
+
+                for edit_round in [lambda nfa: [nfa.set_accepting(2)],
+                                   lambda nfa: [nfa.add_transition(4, 1, 1), nfa.remove_transition(2, 1, 4)]]:
+                    missed.update(edit_round(missed_nfa))
+                    hit.update(edit_round(hit_nfa))
+                    self.assertEqual(hit.states, missed.states)
+                    self.assertEqual(dict(hit.delta_transition), dict(missed.delta_transition))
+                    self.assertEqual(hit.initial_state, missed.initial_state)
+                    self.assertEqual(hit.accepting_states, missed.accepting_states)
+
+    def test_parallel_corpus_analysis(self):
+        """
+        The parallel driver keeps input order and stops files that run past their timeout.
+        """
+        import os
+        import tempfile
+        from parallel_analysis import analyze_corpus, analyze_nfa_file
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = []
+            for n in [3, 20, 2]:
+                lines = ["states: " + ",".join(str(state) for state in range(n + 1)), "alphabet: 0,1",
+                         "initial: 0", "accepting: " + str(n), "transition: 0,0 -> 0", "transition: 0,1 -> 0,1"]
+                for state in range(1, n):
+                    lines += [f"transition: {state},0 -> {state + 1}", f"transition: {state},1 -> {state + 1}"]
+                file_paths.append(os.path.join(directory, f"nth_{n}.txt"))
+                with open(file_paths[-1], "w") as file:
+                    file.write("\n".join(lines) + "\n")
+
+            results = analyze_corpus(file_paths, workers=2, timeout=0.3)
+            self.assertEqual([result["filename"] for result in results], ["nth_3.txt", "nth_20.txt", "nth_2.txt"])
+            self.assertEqual([result["status"] for result in results], ["ok", "timeout", "ok"])
+            self.assertEqual([results[0]["dfa_states"], results[2]["dfa_states"]], [8, 4])
+            self.assertEqual(results[0]["dfa_transitions"], analyze_nfa_file(file_paths[0])["dfa_transitions"])
+
+    def test_parallel_analysis_survives_dead_worker(self):
+        """
+        A worker that dies only fails its own file: the files left unfinished by the broken pool are run
+        again in a new one.
+        """
+        import multiprocessing
+        import os
+        import tempfile
+        from unittest import mock
+        import parallel_analysis
+
+        if multiprocessing.get_start_method() != "fork":
+            self.skipTest("the workers only see the patched analysis when they are forked")
+        analyze_nfa_file = parallel_analysis.analyze_nfa_file
+
+        def analyze_or_die(file_path, *args, **kwargs):
+            if "crash" in os.path.basename(file_path):
+                os._exit(1)
+            return analyze_nfa_file(file_path, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = []
+            for name in ["a", "b", "crash", "c", "d", "e"]:
+                file_paths.append(os.path.join(directory, name + ".txt"))
+                with open(file_paths[-1], "w") as file:
+                    file.write("states: 0,1\nalphabet: 0\ninitial: 0\naccepting: 1\ntransition: 0,0 -> 1\n")
+            with mock.patch.object(parallel_analysis, "analyze_nfa_file", analyze_or_die):
+                results = parallel_analysis.analyze_corpus(file_paths, workers=2, timeout=None, memory_limit_bytes=None)
+        self.assertEqual([result["status"] for result in results], ["ok", "ok", "crashed", "ok", "ok", "ok"])
+        self.assertEqual(results[2]["filename"], "crash.txt")
+        self.assertEqual(results[5]["dfa_states"], 3)
+
+    def test_parallel_subset_construction(self):
+        """
+        Expanding levels in worker processes numbers the states exactly like the sequential bitset engine.
+        """
+        import parallel_subset
+        from subset_engine import BitsetSubsetEngine
+
+        expected = BitsetSubsetEngine(self.build_nth_from_last_nfa(6)).run()
+        threshold = parallel_subset.PARALLEL_LEVEL_MIN_TRANSITIONS
+        parallel_subset.PARALLEL_LEVEL_MIN_TRANSITIONS = 4
+        try:
+            for workers in [1, 3]:
+                engine = parallel_subset.ParallelSubsetEngine(self.build_nth_from_last_nfa(6), workers=workers).run()
+                self.assertEqual(engine.table, expected.table)
+                self.assertEqual(engine.subsets, expected.subsets)
+                self.assertEqual(engine.accepting, expected.accepting)
+            dfa = DFA(self.build_example_nfa(), engine="parallel")
+        finally:
+            parallel_subset.PARALLEL_LEVEL_MIN_TRANSITIONS = threshold
+
+        bitset_dfa = DFA(self.build_example_nfa(), engine="bitset")
+        self.assertEqual(dfa.state_order, bitset_dfa.state_order)
+        self.assertEqual(dict(dfa.delta_transition), dict(bitset_dfa.delta_transition))
+        with self.assertRaises(ValueError):
+            DFA(self.build_example_nfa(), engine="parallel", order="dfs")
+
+    def test_construction_budget(self):
+        """
+        A construction that reaches its budget stops with a partial DFA and says why; one within it is unchanged.
+        """
+        from construction_budget import ConstructionBudget
+
+        for engine in ["tuple", "bitset"]:
+            dfa = DFA(self.build_nth_from_last_nfa(12), engine=engine, budget=ConstructionBudget(max_states=100))
+            self.assertFalse(dfa.complete)
+            self.assertEqual(dfa.statistics["exceeded"], "states")
+            self.assertEqual(dfa.statistics["states"], 100)
+            self.assertEqual(dfa.statistics["explored"] + dfa.statistics["frontier"], 100)
+            self.assertEqual(len(dfa.states), 100)
+            with self.assertRaises(ValueError):
+                dfa.compile()
+
+            budget = ConstructionBudget(max_states=100, max_transitions=1000, deadline_seconds=60, max_memory_bytes=10 ** 8)
+            dfa = DFA(self.build_example_nfa(), engine=engine, budget=budget)
+            self.assertTrue(dfa.complete)
+            self.assertIsNone(dfa.statistics["exceeded"])
+            self.assertEqual(dfa.states, DFA(self.build_example_nfa(), engine=engine).states)
+
+        dfa = DFA(self.build_nth_from_last_nfa(30), engine="bitset", budget=ConstructionBudget(deadline_seconds=0.05))
+        self.assertEqual(dfa.statistics["exceeded"], "deadline")
+        dfa = DFA(self.build_nth_from_last_nfa(30), engine="bitset", budget=ConstructionBudget(max_memory_bytes=10 ** 5))
+        self.assertEqual(dfa.statistics["exceeded"], "memory")
+
+    def test_benchmark_suite(self):
+        """
+        Benchmark inputs are the same on every run, and a comparison flags slower or changed cases.
+        """
+        import json
+        import os
+        import tempfile
+        from benchmarks import compare_benchmarks, generate_family_files
+
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            first_files = generate_family_files(first, quick=True)
+            second_files = generate_family_files(second, quick=True)
+            self.assertEqual([family for family, _ in first_files], [family for family, _ in second_files])
+            for (_, first_path), (_, second_path) in zip(first_files, second_files):
+                with open(first_path) as first_file, open(second_path) as second_file:
+                    self.assertEqual(first_file.read(), second_file.read())
+
+            result = {"family": "nth_from_last", "name": "n3", "engine": "bitset", "median_sec": 0.01, "dfa_states": 16}
+            paths = [os.path.join(first, name) for name in ["baseline.json", "same.json", "slower.json"]]
+            for path, change in zip(paths, [{}, {"median_sec": 0.011}, {"median_sec": 0.02, "dfa_states": 17}]):
+                with open(path, "w") as file:
+                    json.dump({"results": [dict(result, **change)]}, file)
+            self.assertEqual(compare_benchmarks(paths[0], paths[1]), [])
+            regressions = compare_benchmarks(paths[0], paths[2])
+            self.assertEqual(len(regressions), 1)
+            self.assertEqual(regressions[0]["ratio"], 2.0)
+
+    def test_construction_profile(self):
+        """
+        A profile counts the same subsets and transitions whichever engine builds the DFA, and its observer
+        hears of every subset.
+        """
+        from instrumentation import ConstructionProfile
+
+        reports = {}
+        for engine in ["tuple", "bitset", "brzozowski"]:
+            events = []
+            profile = ConstructionProfile(observer=lambda event, data: events.append(event))
+            dfa = DFA(self.build_nth_from_last_nfa(6), engine=engine, profile=profile)
+            report = profile.get_report()
+            self.assertEqual(report["counters"]["subsets_created"], len(dfa.states))
+            self.assertEqual(report["counters"]["transitions_emitted"], len(dfa.delta_transition))
+            self.assertEqual(events.count("subset"), 0 if engine == "brzozowski" else len(dfa.states))
+            self.assertEqual(events[-1], "finished")
+            self.assertTrue(all(seconds >= 0 for seconds in report["phases"].values()))
+            reports[engine] = report
+
+        # the tuple engine closes every successor set, the bitset engine every epsilon component once
+        self.assertEqual(reports["tuple"]["counters"]["closure_calls"], 1 + 2 * 64)
+        self.assertEqual(reports["bitset"]["counters"]["closure_calls"], 7)
+        for counter in ["subsets_created", "duplicate_hits", "transitions_emitted", "max_subset_size"]:
+            self.assertEqual(reports["tuple"]["counters"][counter], reports["bitset"]["counters"][counter])
+        self.assertEqual(reports["tuple"]["counters"]["max_subset_size"], 7)
+        self.assertEqual(reports["tuple"]["counters"]["duplicate_hits"], 2 * 64 - 63)
+        self.assertEqual(set(reports["tuple"]["phases"]), {"closure", "possible_inputs", "next_states", "dedup", "null_transitions"})
+        self.assertEqual(set(reports["bitset"]["phases"]), {"index", "step", "dedup"})
+        self.assertIsNone(DFA(self.build_nth_from_last_nfa(6)).profile)
+
+    def test_seeded_compact_generator(self):
+        """
+        The vectorized generator gives the same NFA for the same seed, reaches every state, and its text
+        and binary files load back to the same arrays.
+        """
+        import os
+        import tempfile
+        import numpy as np
+        from binary_format import load_nfa
+        from generate_nfa_files import generate_compact_nfa, write_generated_nfa
+        from nfa_parser import load_compact_nfa
+
+        generated = generate_compact_nfa(300, epsilon_density=0.4, seed=7)
+        again = generate_compact_nfa(300, epsilon_density=0.4, seed=7)
+        other = generate_compact_nfa(300, epsilon_density=0.4, seed=8)
+        self.assertTrue(all(np.array_equal(first, second) for first, second in zip(generated.targets, again.targets)))
+        self.assertFalse(all(np.array_equal(first, second) for first, second in zip(generated.targets, other.targets)))
+
+        nfa = generated.to_nfa()
+        reached = set(nfa.get_epsilon_closure(nfa.initial_state))
+        frontier = list(reached)
+        while frontier:
+            state = frontier.pop()
+            for letter in nfa.alphabet + ["epsilon"]:
+                for target in nfa.delta_transition.get((state, letter), []):
+                    if target not in reached:
+                        reached.add(target)
+                        frontier.append(target)
+        self.assertEqual(reached, nfa.states)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, load in [("nfa.txt", load_compact_nfa), ("nfa.bin", load_nfa)]:
+                path = os.path.join(directory, name)
+                write_generated_nfa(generated, path)
+                loaded = load(path)
+                self.assertEqual(loaded.symbols, generated.symbols)
+                self.assertTrue(np.array_equal(loaded.states, generated.states))
+                self.assertTrue(np.array_equal(loaded.accepting, generated.accepting))
+                for first, second in zip(loaded.offsets + loaded.targets, generated.offsets + generated.targets):
+                    self.assertTrue(np.array_equal(first, second))
+
+    def test_symbol_classes(self):
+        """
+        Letters the NFA treats alike share a class, and a DFA built on classes equals the one built on letters.
+        """
+        import numpy as np
+        from symbol_classes import SymbolClasses
+
+        nfa_delta_transition = defaultdict(list)
+        for letter in range(256):
+            nfa_delta_transition[(0, letter)] = [0]
+        nfa_delta_transition[(0, 97)] = [0, 1]
+        nfa_delta_transition[(0, 98)] = [0, 1]
+        nfa_delta_transition[(1, 99)] = [2]
+        nfa_delta_transition[(2, "epsilon")] = [3]
+        nfa = NFA({0, 1, 2, 3}, nfa_delta_transition, 0, {3}, list(range(256)))
+
+        symbol_classes = SymbolClasses.from_nfa(nfa)
+        self.assertEqual(symbol_classes.class_count(), 3)
+        self.assertEqual(symbol_classes.class_of[97], symbol_classes.class_of[98])
+        self.assertEqual(symbol_classes.class_of[0], symbol_classes.class_of[255])
+
+        words = np.frombuffer(b"xxacxyzzbcbbaccbacxx", dtype=np.uint8).reshape(5, 4)
+        for engine in ["tuple", "bitset", "brzozowski"]:
+            plain = DFA(nfa, engine=engine)
+            compressed = DFA(nfa, engine=engine, compress_alphabet=True)
+            self.assertEqual(compressed.states, plain.states)
+            self.assertEqual(dict(compressed.delta_transition), dict(plain.delta_transition))
+            self.assertEqual(compressed.get_transition_table().table, plain.get_transition_table().table)
+
+            compiled = compressed.compile()
+            self.assertEqual(compiled.transitions.shape[1], 3)
+            self.assertEqual(compiled.accepts_many(words).tolist(), plain.compile().accepts_many(words).tolist())
+            self.assertEqual(compiled.minimize().accepts_many(words).tolist(), [True, False, False, False, False])
+            self.assertEqual(len(compressed.minimize().states), len(plain.minimize().states))
+
+    def test_compact_engine(self):
+        """
+        The compact engine numbers and names states like the bitset engine, its sink is an integer id, and
+        its classes carry no per-object dict.
+        """
+        from compact_subset import CompactSubsetEngine, SubsetInterner
+
+        interner = SubsetInterner(70)
+        masks = [0, 1, 1 << 69, (1 << 70) - 1] + list(range(2, 100))
+        ids = [interner.intern(mask) for mask in masks]
+        self.assertEqual(ids, [(i, True) for i in range(len(masks))])
+        self.assertEqual([interner.intern(mask) for mask in masks], [(i, False) for i in range(len(masks))])
+        self.assertEqual([interner.mask(i) for i in range(len(masks))], masks)
+        self.assertIsNone(interner.get(1 << 71))
+
+        nfas = [self.build_example_nfa(), self.build_nth_from_last_nfa(7)]
+        for nfa in nfas:
+            for order in ["bfs", "dfs"]:
+                bitset = DFA(nfa, engine="bitset", order=order)
+                compact = DFA(nfa, engine="compact", order=order)
+                self.assertEqual(compact.get_transition_table().table, bitset.get_transition_table().table)
+                self.assertEqual(compact.state_order, bitset.state_order)
+                self.assertEqual(dict(compact.delta_transition), dict(bitset.delta_transition))
+                self.assertEqual(compact.accepting_states, bitset.accepting_states)
+
+        engine = DFA(self.build_example_nfa(), engine="compact").subset_engine
+        self.assertIsInstance(engine.sink, int)
+        self.assertEqual(engine.label(engine.sink), "Null set")
+        for instance in [engine, engine.subsets, DFA(self.build_example_nfa()), self.build_example_nfa()]:
+            self.assertFalse(hasattr(instance, "__dict__"))
+
+    def test_incremental_update(self):
+        """
+        Updating a DFA after NFA edits gives the DFA a fresh construction would, for every engine.
+        """
+        def copy_nfa(nfa):
+            delta_transition = defaultdict(list)
+            for key, targets in nfa.delta_transition.items():
+                delta_transition[key] = list(targets)
+            return NFA(set(nfa.states), delta_transition, nfa.initial_state, set(nfa.accepting_states), list(nfa.alphabet))
+
+        edit_rounds = [
+            lambda nfa: [nfa.set_accepting(2), nfa.set_accepting(5, False)],
+            lambda nfa: [nfa.add_transition(3, 0, 1), nfa.remove_transition(0, 1, 1)],
+            lambda nfa: [nfa.add_transition(4, 1, 0), nfa.set_accepting(3)],
+            lambda nfa: [nfa.add_transition(2, "epsilon", 5)],
+            lambda nfa: [nfa.remove_transition(2, "epsilon", 5), nfa.add_transition(5, 2, 0)],
+        ]
+        for engine in ["tuple", "bitset", "compact"]:
+            for order in ["bfs", "dfs"]:
+                nfa = self.build_nth_from_last_nfa(5)
+                dfa = DFA(nfa, engine=engine, order=order)
+                for edit_round in edit_rounds:
+                    self.assertIs(dfa.update(edit_round(nfa)), dfa)
+                    rebuilt = DFA(copy_nfa(nfa), engine=engine, order=order)
+                    self.assertEqual(dfa.state_order, rebuilt.state_order)
+                    self.assertEqual(dict(dfa.delta_transition), dict(rebuilt.delta_transition))
+                    self.assertEqual(dfa.accepting_states, rebuilt.accepting_states)
+        self.assertIn(2, nfa.alphabet)
+
+        # accepting edits reuse the explored subsets, letter edits keep the engine and renumber it
+        nfa = self.build_nth_from_last_nfa(6)
+        dfa = DFA(nfa, engine="bitset")
+        subset_engine = dfa.subset_engine
+        dfa.update([nfa.set_accepting(1), nfa.add_transition(4, 0, 2)])
+        self.assertIs(dfa.subset_engine, subset_engine)
+        self.assertEqual(dfa.get_transition_table().table, DFA(copy_nfa(nfa), engine="bitset").get_transition_table().table)
+        with self.assertRaises(ValueError):
+            dfa.minimize().update([nfa.set_accepting(2)])
+
+        # a letter edit that adds a state drops the epsilon closure index, which has no component for it
+        nfa = self.build_example_nfa()
+        dfa = DFA(nfa, remove_epsilons=True)
+        dfa.update([nfa.add_transition(4, 1, 5), nfa.set_accepting(5)])
+        rebuilt = DFA(copy_nfa(nfa), remove_epsilons=True)
+        self.assertEqual(dfa.states, rebuilt.states)
+        self.assertEqual(dict(dfa.delta_transition), dict(rebuilt.delta_transition))
+        self.assertEqual(dfa.accepting_states, rebuilt.accepting_states)
+        self.assertIn(5, nfa.remove_epsilon_transitions().states)
+
+    def test_product_operations(self):
+        """
+        Products of compiled DFAs accept what the boolean operation of the operands accepts, also across
+        alphabets, and minimizing them merges what the operation makes empty or universal.
+        """
+        import itertools
+        from product import complement, intersection, product, symmetric_difference, union
+
+        third = DFA(self.build_nth_from_last_nfa(3)).compile()
+        second = DFA(self.build_nth_from_last_nfa(2), engine="bitset")
+        operations = {
+            "intersection": lambda left, right: left and right,
+            "union": lambda left, right: left or right,
+            "difference": lambda left, right: left and not right,
+            "symmetric_difference": lambda left, right: left != right,
+        }
+        for operation, expected in operations.items():
+            combined = product(third, second, operation)
+            minimal = product(third, second, operation, minimize=True)
+            self.assertEqual(minimal.state_count(), combined.minimize().state_count())
+            for length in range(7):
+                for word in itertools.product([0, 1], repeat=length):
+                    accepted = expected(length >= 3 and word[-3] == 1, length >= 2 and word[-2] == 1)
+                    self.assertEqual(combined.accepts(word), accepted)
+                    self.assertEqual(minimal.accepts(word), accepted)
+        self.assertEqual(product(third, second, "intersection").label(0), ((0,), (0,)))
+        with self.assertRaises(ValueError):
+            product(third, second, "implication")
+
+        # an operand over fewer letters rejects every word holding the others
+        delta_transition = defaultdict(list)
+        delta_transition[(0, 2)] = [0]
+        delta_transition[(0, 0)] = [1]
+        only_twos = DFA(NFA({0, 1}, delta_transition, 0, {0}, [2, 0]))
+        combined = union(third, only_twos)
+        self.assertEqual(combined.alphabet, [0, 1, 2])
+        self.assertTrue(combined.accepts([2, 2]))
+        self.assertTrue(combined.accepts([1, 0, 0]))
+        self.assertFalse(combined.accepts([1, 2, 0]))
+        self.assertFalse(intersection(third, only_twos).accepts([1, 0, 0]))
+
+        self.assertEqual(intersection(third, complement(third), minimize=True).state_count(), 1)
+        everything = union(third, complement(third), minimize=True)
+        self.assertEqual(everything.state_count(), 1)
+        self.assertTrue(everything.accepts([0, 1, 0]))
+        self.assertEqual(symmetric_difference(third, third, minimize=True).state_count(), 1)
+
+    def test_language_equivalence(self):
+        """
+        Equivalence and inclusion are checked on languages, whatever the engine, numbering or minimization,
+        and a failed check returns a word that tells the automata apart.
+        """
+        from equivalence import are_equivalent, find_counterexample, find_inclusion_counterexample, is_included
+
+        nfa = self.build_nth_from_last_nfa(6)
+        for engine in ("tuple", "bitset", "brzozowski", "compact"):
+            for order in ("bfs", "dfs"):
+                dfa = DFA(nfa, engine=engine, order=order)
+                self.assertTrue(are_equivalent(nfa, dfa))
+                self.assertTrue(are_equivalent(dfa.minimize(), dfa.compile()))
+
+        # the 6th symbol from the end being 1 is no more the 5th than the other way round
+        fifth = self.build_nth_from_last_nfa(5)
+        word = find_counterexample(nfa, DFA(fifth).compile())
+        self.assertNotEqual(len(word) >= 6 and word[-6] == 1, len(word) >= 5 and word[-5] == 1)
+        self.assertFalse(is_included(nfa, fifth))
+        word = find_inclusion_counterexample(fifth, nfa)
+        self.assertTrue(word[-5] == 1 and (len(word) < 6 or word[-6] == 0))
+
+        # accepting the 5th from the end as well only adds words, which the antichain finds without
+        # determinizing either NFA
+        either = self.build_nth_from_last_nfa(20)
+        either.delta_transition[(0, 1)].append(16)
+        self.assertTrue(is_included(self.build_nth_from_last_nfa(20), either))
+        self.assertTrue(is_included(self.build_nth_from_last_nfa(5), either))
+        self.assertEqual(find_inclusion_counterexample(either, self.build_nth_from_last_nfa(20)), [1, 0, 0, 0, 0])
+
+        # letters outside an alphabet are rejected by its automaton
+        delta_transition = defaultdict(list)
+        delta_transition[(0, 2)] = [0]
+        twos = NFA({0}, delta_transition, 0, {0}, [2])
+        self.assertEqual(find_counterexample(twos, DFA(twos).compile()), None)
+        self.assertEqual(find_counterexample(fifth, twos), [])
+        self.assertFalse(is_included(twos, fifth))
+
+        # an NFA without states or initial state accepts nothing
+        empty_nfa = NFA(set(), defaultdict(list), None, set(), [0, 1])
+        nothing_delta_transition = defaultdict(list)
+        nothing_delta_transition[(0, 0)] = [0]
+        nothing = NFA({0}, nothing_delta_transition, 0, set(), [0, 1])
+        self.assertTrue(are_equivalent(empty_nfa, nothing))
+        self.assertTrue(are_equivalent(empty_nfa, DFA(empty_nfa).compile()))
+        self.assertTrue(is_included(empty_nfa, fifth))
+        self.assertEqual(find_counterexample(empty_nfa, twos), [])
+        word = find_inclusion_counterexample(fifth, empty_nfa)
+        self.assertTrue(len(word) >= 5 and word[-5] == 1)
+
+    def test_trimmed_determinization(self):
+        """
+        Trimming drops unreachable states and states that cannot reach acceptance, so subsets no longer
+        carry them, without changing the language.
+        """
+        from equivalence import are_equivalent
+
+        def build_nfa_with_dead_chain():
+            # the nth from last NFA for n = 6, plus a cycle counting letters modulo 3 that never accepts,
+            # with an epsilon exit, and one unreachable state
+            nfa = self.build_nth_from_last_nfa(6)
+            nfa.add_transition(0, 1, 10)
+            for state in range(10, 13):
+                nfa.add_transition(state, 0, 10 + (state - 9) % 3)
+                nfa.add_transition(state, 1, 10 + (state - 9) % 3)
+            nfa.add_transition(12, "epsilon", 13)
+            nfa.add_transition(20, 0, 0)
+            return nfa
+
+        nfa = build_nfa_with_dead_chain()
+        reachable, useful = nfa.get_useful_states()
+        self.assertEqual(reachable, set(range(7)) | {10, 11, 12, 13})
+        self.assertEqual(useful, set(range(7)))
+        self.assertEqual(nfa.trim().states, set(range(7)))
+
+        untrimmed = DFA(nfa, engine="bitset")
+        for engine in ("tuple", "bitset", "compact", "brzozowski"):
+            trimmed = DFA(build_nfa_with_dead_chain(), engine=engine, trim=True)
+            self.assertTrue(are_equivalent(untrimmed, trimmed))
+            self.assertEqual(trimmed.trim_statistics,
+                             {"nfa_states": 12, "unreachable_states": 1, "dead_states": 4, "kept_states": 7})
+        self.assertEqual(len(DFA(nfa, trim=True).states), 2 ** 6)
+        self.assertGreater(len(untrimmed.states), 2 ** 6)
+
+        # nothing accepted: only the initial state is kept
+        nfa = build_nfa_with_dead_chain()
+        nfa.set_accepting(6, False)
+        dfa = DFA(nfa, trim=True)
+        self.assertEqual(dfa.accepting_states, set())
+        self.assertEqual(len(dfa.states), 2)
+
+        # updates rebuild from the edited NFA, where other states may have become useful
+        edit = nfa.set_accepting(13)
+        dfa.update([edit])
+        self.assertTrue(are_equivalent(nfa, dfa))
+        self.assertEqual(dfa.trim_statistics, {"nfa_states": 12, "unreachable_states": 1, "dead_states": 6, "kept_states": 5})
+
 if __name__ == "__main__":
     unittest.main()
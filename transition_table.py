@@ -0,0 +1,80 @@
+from array import array
+
+NULL_STATE = "Null set"
+
+
+class TransitionTable:
+    '''
+    A complete DFA with states numbered 0..n-1 and letters numbered by their position in the alphabet.
+    Transitions are kept in one flat array: the target of state i on letter j is table[i * len(alphabet) + j].
+    '''
+    __slots__ = ("alphabet", "letter_count", "table", "accepting", "initial", "labels")
+
+    def __init__(self, alphabet, table=None, accepting=None, initial=None, labels=None):
+        self.alphabet = list(alphabet)
+        self.letter_count = len(self.alphabet)
+        self.table = table if table is not None else array("l")
+        self.accepting = accepting if accepting is not None else bytearray()
+        self.initial = initial
+        self.labels = labels
+
+    def state_count(self):
+        '''
+        :return: number of DFA states
+        '''
+        return len(self.accepting)
+
+    def row(self, state_id):
+        '''
+        :param state_id: id of a DFA state
+        :return: ids of the next state on every letter, in alphabet order
+        '''
+        row_start = state_id * self.letter_count
+        return self.table[row_start:row_start + self.letter_count]
+
+    def label(self, state_id):
+        '''
+        :param state_id: id of a DFA state
+        :return: the name the state has in DFA.states
+        '''
+        if self.labels is None:
+            return state_id
+        return self.labels[state_id]
+
+    def null_state(self):
+        '''
+        :return: id of the "Null set" sink, or None when the DFA has no sink
+        '''
+        if self.labels is None:
+            return None
+        for state_id, label in enumerate(self.labels):
+            if label == NULL_STATE:
+                return state_id
+        return None
+
+    def build_inverse(self):
+        '''
+        Groups the transitions by letter and target, CSR style: the states moving to t on letter j are
+        sources[j][offsets[j][t]:offsets[j][t + 1]].
+        :return: (offsets, sources), one array per letter in each
+        '''
+        state_count = self.state_count()
+        letter_count = self.letter_count
+        table = self.table
+        all_offsets = []
+        all_sources = []
+        for letter_index in range(letter_count):
+            targets = table[letter_index::letter_count]
+            offsets = array("l", [0]) * (state_count + 1)
+            for target in targets:
+                offsets[target + 1] += 1
+            for state_id in range(state_count):
+                offsets[state_id + 1] += offsets[state_id]
+            fill = offsets[:state_count]
+            sources = array("l", [0]) * state_count
+            for source, target in enumerate(targets):
+                sources[fill[target]] = source
+                fill[target] += 1
+            all_offsets.append(offsets)
+            all_sources.append(sources)
+        return all_offsets, all_sources